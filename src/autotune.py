@@ -0,0 +1,185 @@
+import time
+import random
+import itertools
+import numpy as np
+import chromadb
+from rich.console import Console
+from rich.table import Table
+from src.config import settings, AutotuneConfig, HNSWConfig, update_config_section
+from src.vector_backends import VectorBackend, create_backend, hnsw_metadata
+from src.profiling import current_rss_mb
+
+console = Console()
+BATCH_SIZE = 5000
+
+
+def estimate_hnsw_mb(count: int, dim: int, m: int) -> float:
+    # Vectors plus level-0 links (2*M) and the sparse upper layers (~M/ln M per node)
+    links = 2 * m + m / max(np.log(m), 1.0)
+    return count * (dim * 4 + links * 4 + 16) / (1024 * 1024)
+
+
+def sample_embeddings(backend: VectorBackend, sample_size: int, seed: int = 42) -> np.ndarray:
+    """Reservoir-sample stored chunk embeddings without holding the whole collection."""
+    rng = random.Random(seed)
+    reservoir = []
+    for i, node in enumerate(backend.iter_nodes(with_embeddings=True)):
+        if len(reservoir) < sample_size:
+            reservoir.append(node.embedding)
+        else:
+            j = rng.randint(0, i)
+            if j < sample_size:
+                reservoir[j] = node.embedding
+    return np.array(reservoir, dtype=np.float32)
+
+
+def exact_top_k(base: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    base = base / np.linalg.norm(base, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ base.T
+    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    order = np.argsort(np.take_along_axis(scores, top, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _build_collection(client, name: str, base: np.ndarray, hnsw: HNSWConfig):
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass
+    collection = client.create_collection(name=name, metadata=hnsw_metadata(hnsw))
+    ids = [str(i) for i in range(len(base))]
+    for i in range(0, len(base), BATCH_SIZE):
+        collection.add(ids=ids[i:i + BATCH_SIZE], embeddings=base[i:i + BATCH_SIZE])
+    return collection
+
+
+def _evaluate(collection, queries: np.ndarray, truth: np.ndarray, k: int) -> tuple[float, float]:
+    hits = 0
+    collection.query(query_embeddings=queries[:1], n_results=k)
+    latencies = []
+    for i, query in enumerate(queries):
+        t0 = time.perf_counter()
+        result = collection.query(query_embeddings=[query], n_results=k)
+        latencies.append(time.perf_counter() - t0)
+        found = {int(x) for x in result["ids"][0]}
+        hits += len(found & set(truth[i].tolist()))
+    return hits / truth.size, float(np.median(latencies))
+
+
+def sweep(base: np.ndarray, queries: np.ndarray, config: AutotuneConfig) -> list[dict]:
+    k = min(config.k, len(base))
+    truth = exact_top_k(base, queries, k)
+    client = chromadb.EphemeralClient()
+    results = []
+
+    for m, construction_ef in itertools.product(config.M, config.construction_ef):
+        # search_ef only affects queries, so one build per (M, construction_ef) serves every search_ef;
+        # the configs of a group then share one build time and pareto_front compares them on search alone
+        hnsw = HNSWConfig(construction_ef=construction_ef, M=m, search_ef=config.search_ef[0])
+        rss_before = current_rss_mb()
+        start_time = time.perf_counter()
+        collection = _build_collection(client, "autotune", base, hnsw)
+        build_time = time.perf_counter() - start_time
+        rss_after = current_rss_mb()
+
+        memory = estimate_hnsw_mb(len(base), base.shape[1], m)
+        if rss_before is not None and rss_after is not None and rss_after > rss_before:
+            memory = max(memory, rss_after - rss_before)
+
+        for search_ef in config.search_ef:
+            collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+            recall, latency = _evaluate(collection, queries, truth, k)
+            results.append({
+                "M": m,
+                "construction_ef": construction_ef,
+                "search_ef": search_ef,
+                "recall": recall,
+                "latency_ms": latency * 1000,
+                "build_s": build_time,
+                "memory_mb": memory,
+            })
+        client.delete_collection("autotune")
+
+    return results
+
+
+def pareto_front(results: list[dict]) -> list[dict]:
+    """Configs not dominated on (recall up, latency / build time / memory down)."""
+    def dominates(a, b):
+        no_worse = (
+            a["recall"] >= b["recall"] and a["latency_ms"] <= b["latency_ms"]
+            and a["build_s"] <= b["build_s"] and a["memory_mb"] <= b["memory_mb"]
+        )
+        better = (
+            a["recall"] > b["recall"] or a["latency_ms"] < b["latency_ms"]
+            or a["build_s"] < b["build_s"] or a["memory_mb"] < b["memory_mb"]
+        )
+        return no_worse and better
+
+    return [r for r in results if not any(dominates(o, r) for o in results if o is not r)]
+
+
+def choose(front: list[dict], target_recall: float) -> dict:
+    eligible = [r for r in front if r["recall"] >= target_recall]
+    if eligible:
+        return min(eligible, key=lambda r: (r["latency_ms"], r["build_s"]))
+    return max(front, key=lambda r: (r["recall"], -r["latency_ms"]))
+
+
+def print_results(results: list[dict], front: list[dict], best: dict):
+    table = Table(title="HNSW sweep")
+    for column in ["M", "construction_ef", "search_ef", "recall@k", "latency (ms)", "build (s)", "memory (MB)", ""]:
+        table.add_column(column, justify="right")
+    group = None
+    for r in sorted(results, key=lambda r: (r["M"], r["construction_ef"], r["search_ef"])):
+        mark = "⭐" if r is best else ("•" if r in front else "")
+        # Build time and memory belong to the (M, construction_ef) build, shown once per group
+        first = group != (r["M"], r["construction_ef"])
+        group = (r["M"], r["construction_ef"])
+        table.add_row(
+            str(r["M"]), str(r["construction_ef"]), str(r["search_ef"]),
+            f"{r['recall']:.3f}", f"{r['latency_ms']:.2f}",
+            f"{r['build_s']:.1f}" if first else "", f"{r['memory_mb']:.0f}" if first else "", mark
+        )
+    console.print(table)
+
+
+def autotune(backend: VectorBackend | None = None, config: AutotuneConfig | None = None, save: bool = True) -> dict | None:
+    config = config or settings.autotune
+    backend = backend or create_backend(settings.vector_store)
+
+    console.print(f"[bold cyan]🎛️  Sampling up to {config.sample_size} embeddings from '{backend.collection_name}'...[/bold cyan]")
+    vectors = sample_embeddings(backend, config.sample_size + config.query_count)
+    if len(vectors) <= config.query_count + config.k:
+        console.print("[yellow]⚠️ Not enough chunks in the knowledge base to autotune.[/yellow]")
+        return None
+
+    # Held-out real chunk embeddings act as queries for the rest of the sample
+    rng = np.random.default_rng(42)
+    rng.shuffle(vectors)
+    queries, base = vectors[:config.query_count], vectors[config.query_count:]
+    console.print(f"📐 {len(base)} base vectors, {len(queries)} queries, dim={base.shape[1]}")
+
+    results = sweep(base, queries, config)
+    front = pareto_front(results)
+    best = choose(front, config.target_recall)
+    print_results(results, front, best)
+
+    console.print(
+        f"[bold green]✅ Selected M={best['M']}, construction_ef={best['construction_ef']}, "
+        f"search_ef={best['search_ef']} (recall@{config.k}={best['recall']:.3f}, "
+        f"{best['latency_ms']:.2f} ms)[/bold green]"
+    )
+    if save:
+        update_config_section("vector_store.hnsw", {
+            "construction_ef": best["construction_ef"],
+            "M": best["M"],
+            "search_ef": best["search_ef"],
+        })
+        console.print("[dim]💾 Saved to config.toml; the new settings apply on the next rebuild.[/dim]")
+    return best
+
+
+if __name__ == "__main__":
+    autotune()
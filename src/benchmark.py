@@ -0,0 +1,714 @@
+"""Unified benchmark runner.
+
+    python -m src.benchmark run --suite search --suite query --sizes 1000,10000
+    python -m src.benchmark compare bench_results/baseline.json bench_results/latest.json
+
+Every suite runs offline: embeddings come from a hashing bag-of-words model
+and answers from llama-index's MockLLM unless a real model is requested.
+"""
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import shutil
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+from datetime import datetime, timezone
+from importlib import metadata as importlib_metadata
+from typing import Callable
+from rich.console import Console
+from rich.table import Table
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+console = Console()
+RESULTS_DIR = "bench_results"
+DEFAULT_SIZES = [1_000, 10_000]
+TOP_K = 5
+QUERY_COUNT = 50
+PACKAGES = ["numpy", "chromadb", "llama-index-core", "pymupdf", "pandas", "sentence-transformers", "faiss-cpu"]
+
+WORDS = (
+    "password reset account login token portal access security policy report revenue quarter "
+    "budget forecast vector index search query embedding model chunk document parser image caption "
+    "server database backup network latency throughput memory disk cache cluster node shard replica "
+    "invoice customer order product price discount shipping warehouse supplier contract payment"
+).split()
+
+SUITES: dict[str, Callable] = {}
+
+
+def suite(name: str):
+    def register(fn):
+        SUITES[name] = fn
+        return fn
+    return register
+
+
+class HashEmbedding(BaseEmbedding):
+    """Deterministic offline stand-in: hashed bag-of-words, L2-normalized."""
+
+    dim: int = 384
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            h = zlib.crc32(token.encode())
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._embed(text)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._embed(query)
+
+
+class StubLLM(CustomLLM):
+    """Offline LLM with a configurable delay.
+
+    Condense prompts are answered from `rewrites` (follow-up -> standalone
+    question) after `condense_latency_s` (defaults to `latency_s`), everything
+    else gets the fixed `answer`.
+    """
+
+    latency_s: float = 0.0
+    condense_latency_s: float | None = None
+    answer: str = "This is a stub answer based on the provided context."
+    rewrites: dict[str, str] = {}
+    calls: int = 0
+    condense_calls: int = 0
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="stub", context_window=32_000, num_output=256)
+
+    def _respond(self, prompt: str) -> str:
+        self.calls += 1
+        match = re.search(r"Follow Up Input:\s*(.*?)\s*Standalone question", prompt, re.DOTALL)
+        if match:
+            time.sleep(self.latency_s if self.condense_latency_s is None else self.condense_latency_s)
+            self.condense_calls += 1
+            question = match.group(1).strip()
+            return self.rewrites.get(question, question)
+        time.sleep(self.latency_s)
+        return self.answer
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        return CompletionResponse(text=self._respond(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+        text = self._respond(prompt)
+        yield CompletionResponse(text=text, delta=text)
+
+
+def get_embed_model(name: str) -> BaseEmbedding:
+    if name == "mock":
+        return HashEmbedding()
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    return HuggingFaceEmbedding(model_name=name, trust_remote_code=True)
+
+
+def synthetic_sentences(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(8, 24))).capitalize() + "." for _ in range(count)]
+
+
+def synthetic_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).random((count, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    arr = np.asarray(samples)
+    return {"p50": float(np.percentile(arr, 50)), "p95": float(np.percentile(arr, 95)), "p99": float(np.percentile(arr, 99))}
+
+
+def metric(name: str, value: float, unit: str, better: str = "lower", **params) -> dict:
+    return {"name": name, "value": float(value), "unit": unit, "better": better, "params": params}
+
+
+def latency_metrics(name: str, samples: list[float], **params) -> list[dict]:
+    return [metric(f"{name}_{p}", v * 1000, "ms", **params) for p, v in percentiles(samples).items()]
+
+
+def write_synthetic_pdf(path: str, sentences: list[str], lines_per_page: int = 40) -> int:
+    import pymupdf
+    doc = pymupdf.open()
+    for start in range(0, len(sentences), lines_per_page):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), "\n".join(sentences[start:start + lines_per_page]), fontsize=8)
+    page_count = doc.page_count
+    doc.save(path)
+    doc.close()
+    return page_count
+
+
+@suite("parsing")
+def bench_parsing(sizes: list[int], args) -> list[dict]:
+    from src.doc_parser import get_document_from_txt, get_document_from_md, clean_text, iter_pdf_pages
+    results = []
+    tmp = tempfile.mkdtemp(prefix="bench_parsing_")
+    try:
+        for size in sizes:
+            text = "\n".join(synthetic_sentences(size))
+            mb = len(text.encode()) / (1024 * 1024)
+            txt_path = os.path.join(tmp, f"doc_{size}.txt")
+            md_path = os.path.join(tmp, f"doc_{size}.md")
+            with open(txt_path, "w") as f:
+                f.write(text)
+            with open(md_path, "w") as f:
+                f.write("\n\n".join(f"## Section {i}\n{s}" for i, s in enumerate(text.split("\n"))))
+
+            for label, fn, path in [("txt", get_document_from_txt, txt_path), ("md", get_document_from_md, md_path)]:
+                start_time = time.perf_counter()
+                fn(path)
+                elapsed = time.perf_counter() - start_time
+                results.append(metric(f"{label}_throughput", mb / elapsed, "MB/s", "higher", sentences=size))
+
+            start_time = time.perf_counter()
+            clean_text(text, keep_structure=True)
+            results.append(metric("clean_text_throughput", mb / (time.perf_counter() - start_time), "MB/s", "higher", sentences=size))
+
+            pdf_path = os.path.join(tmp, f"doc_{size}.pdf")
+            page_count = write_synthetic_pdf(pdf_path, text.split("\n"))
+            for workers in (1, os.cpu_count() or 1):
+                start_time = time.perf_counter()
+                for _ in iter_pdf_pages(pdf_path, workers=workers):
+                    pass
+                elapsed = time.perf_counter() - start_time
+                results.append(metric("pdf_pages_per_s", page_count / elapsed, "pages/s", "higher", sentences=size, workers=workers))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def write_synthetic_table(path: str, rows: int, seed: int = 0):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("id,customer,product,region,amount,notes\n")
+        for i in range(rows):
+            f.write(f"{i},{rng.choice(WORDS)},{rng.choice(WORDS)},{rng.choice(WORDS)},{rng.random() * 1000:.2f},{' '.join(rng.choices(WORDS, k=6))}\n")
+
+
+def measure_peak(fn) -> tuple[float, float]:
+    """Run fn once; return (seconds, peak traced allocation in MB)."""
+    import tracemalloc
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+IMPORT_MODULES = ["src.doc_parser", "src.image_captioning"]
+
+
+@suite("startup")
+def bench_startup(sizes: list[int], args) -> list[dict]:
+    """Cold import time of the ingestion modules, each in a fresh interpreter (sizes = repetitions)."""
+    results = []
+    code = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    for module in IMPORT_MODULES:
+        samples = []
+        for _ in range(min(sizes[0], 5)):
+            out = subprocess.run(
+                [sys.executable, "-c", code.format(module=module)], capture_output=True, text=True, check=True
+            )
+            samples.append(float(out.stdout.strip().splitlines()[-1]))
+        results.append(metric("import_s", float(np.median(samples)), "s", "lower", module=module))
+    return results
+
+
+@suite("tabular")
+def bench_tabular(sizes: list[int], args) -> list[dict]:
+    """Whole-frame to_string() (the old CSV/XLSX path) vs streaming row batches; sizes are row counts."""
+    import pandas as pd
+    from src.doc_parser import clean_text, iter_csv_batches, iter_xlsx_batches
+    results = []
+    tmp = tempfile.mkdtemp(prefix="bench_tabular_")
+    try:
+        for size in sizes:
+            csv_path = os.path.join(tmp, f"table_{size}.csv")
+            write_synthetic_table(csv_path, size)
+            xlsx_path = os.path.join(tmp, f"table_{size}.xlsx")
+            pd.read_csv(csv_path).to_excel(xlsx_path, index=False)
+
+            loaders = [
+                ("csv_whole_frame", lambda: clean_text(pd.read_csv(csv_path).to_string())),
+                ("csv_streaming", lambda: sum(1 for _ in iter_csv_batches(csv_path))),
+                ("xlsx_whole_frame", lambda: clean_text(pd.read_excel(xlsx_path).to_string())),
+                ("xlsx_streaming", lambda: sum(1 for _ in iter_xlsx_batches(xlsx_path))),
+            ]
+            for label, fn in loaders:
+                elapsed, peak_mb = measure_peak(fn)
+                results.append(metric(f"{label}_rows_per_s", size / elapsed, "rows/s", "higher", rows=size))
+                results.append(metric(f"{label}_peak_mb", peak_mb, "MB", "lower", rows=size))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+@suite("chunking")
+def bench_chunking(sizes: list[int], args) -> list[dict]:
+    from llama_index.core import Document
+    from llama_index.core.node_parser import SemanticSplitterNodeParser, SentenceSplitter
+    embed_model = get_embed_model(args.embed_model)
+    results = []
+    for size in sizes:
+        documents = [Document(text=" ".join(synthetic_sentences(size // 10 or 1, seed=i))) for i in range(10)]
+        parsers = [
+            ("semantic", SemanticSplitterNodeParser(buffer_size=1, breakpoint_percentile_threshold=70, embed_model=embed_model)),
+            ("sentence", SentenceSplitter(chunk_size=512, chunk_overlap=32)),
+        ]
+        for label, parser in parsers:
+            start_time = time.perf_counter()
+            nodes = parser.get_nodes_from_documents(documents)
+            elapsed = time.perf_counter() - start_time
+            results.append(metric(f"{label}_sentences_per_s", size / elapsed, "sent/s", "higher", sentences=size))
+            results.append(metric(f"{label}_chunks", len(nodes), "chunks", "none", sentences=size))
+    return results
+
+
+@suite("embedding")
+def bench_embedding(sizes: list[int], args) -> list[dict]:
+    embed_model = get_embed_model(args.embed_model)
+    results = []
+    for size in sizes:
+        texts = synthetic_sentences(size)
+        start_time = time.perf_counter()
+        embed_model.get_text_embedding_batch(texts)
+        elapsed = time.perf_counter() - start_time
+        results.append(metric("texts_per_s", size / elapsed, "texts/s", "higher", texts=size, model=args.embed_model))
+
+        samples = []
+        for query in texts[:QUERY_COUNT]:
+            t0 = time.perf_counter()
+            embed_model.get_query_embedding(query)
+            samples.append(time.perf_counter() - t0)
+        results += latency_metrics("query_latency", samples, texts=size, model=args.embed_model)
+    return results
+
+
+CONCURRENCY_LEVELS = [1, 4, 16, 32]
+
+
+@suite("query_batching")
+def bench_query_batching(sizes: list[int], args) -> list[dict]:
+    """Concurrent query embedding, one forward pass per query vs micro-batched (sizes are not used)."""
+    from concurrent.futures import ThreadPoolExecutor
+    from src.query_batching import BatchedQueryEmbedding
+    embed_model = get_embed_model(args.embed_model)
+    batched = BatchedQueryEmbedding(embed_model, window_ms=5.0, max_batch=32)
+    results = []
+    for concurrency in CONCURRENCY_LEVELS:
+        queries = synthetic_sentences(max(QUERY_COUNT, concurrency * 8), seed=concurrency)
+        for label, model in (("direct", embed_model), ("batched", batched)):
+            model.get_query_embedding(queries[0])
+
+            def timed(query: str) -> float:
+                t0 = time.perf_counter()
+                model.get_query_embedding(query)
+                return time.perf_counter() - t0
+
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(timed, queries))
+            elapsed = time.perf_counter() - start_time
+            results += latency_metrics(f"{label}_latency", samples, concurrency=concurrency, model=args.embed_model)
+            results.append(metric(f"{label}_qps", len(queries) / elapsed, "q/s", "higher", concurrency=concurrency, model=args.embed_model))
+        results.append(metric("mean_batch", batched.batcher.stats()["mean_batch"], "queries", "higher", concurrency=concurrency, model=args.embed_model))
+    return results
+
+
+def _chroma_collection(client, name: str, vectors: np.ndarray, metadatas: list[dict] | None = None):
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass
+    collection = client.create_collection(name=name, metadata={"hnsw:space": "cosine"})
+    ids = [str(i) for i in range(len(vectors))]
+    for i in range(0, len(vectors), 5000):
+        collection.add(
+            ids=ids[i:i + 5000], embeddings=vectors[i:i + 5000],
+            metadatas=metadatas[i:i + 5000] if metadatas else None
+        )
+    return collection
+
+
+@suite("indexing")
+def bench_indexing(sizes: list[int], args) -> list[dict]:
+    import chromadb
+    from src.flat_index import FlatIndex
+    results = []
+    client = chromadb.EphemeralClient()
+    tmp = tempfile.mkdtemp(prefix="bench_indexing_")
+    try:
+        for size in sizes:
+            vectors = synthetic_vectors(size, args.dim)
+            metadatas = [{"file_name": f"file_{i % 100}.pdf", "access_level": "private"} for i in range(size)]
+
+            start_time = time.perf_counter()
+            _chroma_collection(client, "bench_indexing", vectors, metadatas)
+            results.append(metric("chroma_vectors_per_s", size / (time.perf_counter() - start_time), "vec/s", "higher", items=size))
+            client.delete_collection("bench_indexing")
+
+            start_time = time.perf_counter()
+            FlatIndex(os.path.join(tmp, str(size))).write([str(i) for i in range(size)], vectors, metadatas)
+            results.append(metric("flat_vectors_per_s", size / (time.perf_counter() - start_time), "vec/s", "higher", items=size))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+@suite("search")
+def bench_search(sizes: list[int], args) -> list[dict]:
+    import chromadb
+    from src.flat_index import FlatIndex
+    results = []
+    client = chromadb.EphemeralClient()
+    tmp = tempfile.mkdtemp(prefix="bench_search_")
+    try:
+        for size in sizes:
+            vectors = synthetic_vectors(size, args.dim)
+            queries = synthetic_vectors(QUERY_COUNT, args.dim, seed=1)
+            metadatas = [{"file_name": f"file_{i % 100}.pdf", "access_level": "private"} for i in range(size)]
+            collection = _chroma_collection(client, "bench_search", vectors, metadatas)
+            flat = FlatIndex(os.path.join(tmp, str(size)))
+            flat.write([str(i) for i in range(size)], vectors, metadatas)
+
+            runners = {
+                "chroma": lambda q: collection.query(query_embeddings=[q], n_results=TOP_K, where={"access_level": "private"}),
+                "flat": lambda q: flat.search(q, TOP_K, access_level="private"),
+            }
+            for label, run in runners.items():
+                run(queries[0])
+                samples = []
+                for q in queries:
+                    t0 = time.perf_counter()
+                    run(q)
+                    samples.append(time.perf_counter() - t0)
+                results += latency_metrics(f"{label}_latency", samples, items=size)
+            client.delete_collection("bench_search")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+@suite("partitions")
+def bench_partitions(sizes: list[int], args) -> list[dict]:
+    from llama_index.core.schema import TextNode
+    from llama_index.core.vector_stores import MetadataFilters, MetadataFilter, FilterOperator
+    from src.config import VectorStoreConfig
+    from src.vector_backends import create_backend
+    results = []
+    tmp = tempfile.mkdtemp(prefix="bench_partitions_")
+    layouts = {
+        "single": {},
+        "by_access_level": {"partition_by": "access_level"},
+        "by_file_group": {"partition_by": "file_group", "file_groups": {f"group_{g}": [f"file_{g}?.pdf"] for g in range(10)}},
+    }
+    # A minority private level and a three-file @file filter, as in a typical chat
+    queries = {
+        "access_level": MetadataFilters(filters=[MetadataFilter(key="access_level", value="private")]),
+        "files": MetadataFilters(filters=[
+            MetadataFilter(key="access_level", value="private"),
+            MetadataFilter(key="file_name", value=["file_10.pdf", "file_11.pdf", "file_12.pdf"], operator=FilterOperator.IN),
+        ]),
+    }
+    try:
+        for size in sizes:
+            vectors = synthetic_vectors(size, args.dim)
+            query_vectors = synthetic_vectors(QUERY_COUNT, args.dim, seed=1)
+            for layout, options in layouts.items():
+                config = VectorStoreConfig(collection_name="bench", path=os.path.join(tmp, f"{layout}_{size}"), backend="chroma", **options)
+                backend = create_backend(config)
+                backend.insert([
+                    TextNode(
+                        text=f"chunk {i}", id_=str(i), embedding=vectors[i].tolist(),
+                        metadata={"file_name": f"file_{i % 100}.pdf", "access_level": "private" if i % 10 == 0 else "public"}
+                    )
+                    for i in range(size)
+                ])
+                for label, filters in queries.items():
+                    backend.query(query_vectors[0].tolist(), TOP_K, filters)
+                    samples = []
+                    for q in query_vectors:
+                        t0 = time.perf_counter()
+                        backend.query(q.tolist(), TOP_K, filters)
+                        samples.append(time.perf_counter() - t0)
+                    results += latency_metrics(f"{layout}_{label}_latency", samples, items=size)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+@suite("file_catalog")
+def bench_file_catalog(sizes: list[int], args) -> list[dict]:
+    """@file resolution and filtered search: catalog id sets against metadata predicates."""
+    import chromadb
+    from llama_index.core.schema import TextNode
+    from src.file_catalog import FileCatalog
+    from src.flat_index import FlatIndex
+    results = []
+    client = chromadb.EphemeralClient()
+    tmp = tempfile.mkdtemp(prefix="bench_file_catalog_")
+    try:
+        for size in sizes:
+            # Ten chunks per file, with quarterly report names to resolve by prefix and glob
+            files = [f"q{i % 4 + 1}_report_{i:06d}.pdf" for i in range(max(1, size // 10))]
+            metadatas = [{"file_name": files[i % len(files)], "access_level": "private"} for i in range(size)]
+            catalog = FileCatalog(os.path.join(tmp, f"catalog_{size}.sqlite3"))
+            catalog.add_nodes([TextNode(text="", id_=str(i), metadata=m) for i, m in enumerate(metadatas)])
+
+            tokens = {"exact": files[len(files) // 2], "prefix": "q3_report_0000", "glob": "q3_*_00001*.pdf", "typo": "q3_reprot_000001.pdf"}
+            for label, token in tokens.items():
+                samples = []
+                for _ in range(QUERY_COUNT):
+                    t0 = time.perf_counter()
+                    catalog.resolve(token)
+                    samples.append(time.perf_counter() - t0)
+                results += latency_metrics(f"resolve_{label}_latency", samples, files=len(files))
+
+            targets = catalog.resolve(tokens["prefix"]).files
+            ids = catalog.ids(targets)
+            vectors = synthetic_vectors(size, args.dim)
+            queries = synthetic_vectors(QUERY_COUNT, args.dim, seed=1)
+            collection = _chroma_collection(client, "bench_file_catalog", vectors, metadatas)
+            flat = FlatIndex(os.path.join(tmp, str(size)))
+            flat.write([str(i) for i in range(size)], vectors, metadatas)
+            flat.search(queries[0], TOP_K, access_level="private", ids=ids)
+
+            where = {"$and": [{"access_level": "private"}, {"file_name": {"$in": targets}}]}
+            runners = {
+                "chroma_metadata": lambda q: collection.query(query_embeddings=[q], n_results=TOP_K, where=where),
+                "flat_id_set": lambda q: flat.search(q, TOP_K, access_level="private", ids=catalog.ids(targets)),
+            }
+            for label, run in runners.items():
+                run(queries[0])
+                samples = []
+                for q in queries:
+                    t0 = time.perf_counter()
+                    run(q)
+                    samples.append(time.perf_counter() - t0)
+                results += latency_metrics(f"{label}_latency", samples, items=size, files=len(targets))
+            client.delete_collection("bench_file_catalog")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+@suite("snapshot")
+def bench_snapshot(sizes: list[int], args) -> list[dict]:
+    from llama_index.core.schema import TextNode
+    from src.config import VectorStoreConfig
+    from src.vector_backends import create_backend
+    from src.snapshot import export_snapshot, import_snapshot
+    results = []
+    tmp = tempfile.mkdtemp(prefix="bench_snapshot_")
+    try:
+        for size in sizes:
+            vectors = synthetic_vectors(size, args.dim)
+            source = create_backend(VectorStoreConfig(collection_name="bench", path=os.path.join(tmp, f"source_{size}")))
+            source.insert([
+                TextNode(text=t, id_=str(i), embedding=vectors[i].tolist(), metadata={"file_name": f"file_{i % 100}.pdf", "access_level": "private"})
+                for i, t in enumerate(synthetic_sentences(size))
+            ])
+            for dtype in ("float16", "int8"):
+                directory = os.path.join(tmp, f"snapshot_{size}_{dtype}")
+                start_time = time.perf_counter()
+                manifest = export_snapshot(source, directory, dtype)
+                results.append(metric("export_chunks_per_s", size / (time.perf_counter() - start_time), "chunks/s", "higher", items=size, dtype=dtype))
+                snapshot_bytes = sum(os.path.getsize(os.path.join(directory, n)) for n in manifest["checksums"])
+                results.append(metric("snapshot_bytes_per_chunk", snapshot_bytes / size, "B", items=size, dtype=dtype))
+
+                target = VectorStoreConfig(collection_name="bench", path=os.path.join(tmp, f"target_{size}_{dtype}"))
+                start_time = time.perf_counter()
+                import_snapshot(directory, target)
+                results.append(metric("import_chunks_per_s", size / (time.perf_counter() - start_time), "chunks/s", "higher", items=size, dtype=dtype))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+@suite("query")
+def bench_query(sizes: list[int], args) -> list[dict]:
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.schema import TextNode
+    from llama_index.core.llms import MockLLM
+    from llama_index.core.memory import ChatMemoryBuffer
+    from llama_index.core.chat_engine import CondensePlusContextChatEngine
+    embed_model = get_embed_model(args.embed_model)
+    llm = MockLLM(max_tokens=64)
+    results = []
+    for size in sizes:
+        nodes = [TextNode(text=t, metadata={"file_name": f"file_{i % 100}.txt"}) for i, t in enumerate(synthetic_sentences(size))]
+        index = VectorStoreIndex(nodes, embed_model=embed_model)
+        questions = synthetic_sentences(QUERY_COUNT, seed=7)
+        memory = ChatMemoryBuffer.from_defaults(token_limit=4000)
+        chat_engine = CondensePlusContextChatEngine.from_defaults(
+            retriever=index.as_retriever(similarity_top_k=TOP_K), llm=llm, memory=memory
+        )
+        samples = []
+        for question in questions:
+            t0 = time.perf_counter()
+            chat_engine.chat(question)
+            samples.append(time.perf_counter() - t0)
+        results += latency_metrics("turn_latency", samples, items=size)
+    return results
+
+
+def environment_info() -> dict:
+    packages = {}
+    for name in PACKAGES:
+        try:
+            packages[name] = importlib_metadata.version(name)
+        except importlib_metadata.PackageNotFoundError:
+            packages[name] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+        "packages": packages,
+    }
+
+
+def run(args) -> dict:
+    names = args.suite or list(SUITES)
+    unknown = [n for n in names if n not in SUITES]
+    if unknown:
+        raise SystemExit(f"Unknown suite(s): {', '.join(unknown)}. Available: {', '.join(SUITES)}")
+
+    report = {"environment": environment_info(), "config": {"sizes": args.sizes, "embed_model": args.embed_model, "dim": args.dim}, "suites": {}}
+    for name in names:
+        console.print(f"[bold cyan]🚀 Running suite '{name}' (sizes={args.sizes})...[/bold cyan]")
+        start_time = time.perf_counter()
+        try:
+            metrics = SUITES[name](args.sizes, args)
+            report["suites"][name] = {"metrics": metrics, "duration_s": time.perf_counter() - start_time}
+        except Exception as e:
+            console.print(f"[red]Suite '{name}' failed:[/red] {e}")
+            report["suites"][name] = {"metrics": [], "error": str(e)}
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    console.print(f"[dim]💾 Results saved to {args.output}[/dim]")
+    return report
+
+
+def _metric_key(suite_name: str, m: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(m["params"].items()))
+    return f"{suite_name}.{m['name']}[{params}]"
+
+
+def flatten(report: dict) -> dict[str, dict]:
+    return {
+        _metric_key(suite_name, m): m
+        for suite_name, data in report["suites"].items()
+        for m in data["metrics"]
+    }
+
+
+def print_report(report: dict):
+    table = Table(title="Benchmark results")
+    table.add_column("Metric", style="bold magenta")
+    table.add_column("Value", justify="right")
+    table.add_column("Unit")
+    for key, m in flatten(report).items():
+        table.add_row(key, f"{m['value']:.3f}", m["unit"])
+    console.print(table)
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Return the metric keys that regressed by more than `threshold` (relative)."""
+    base_metrics, cur_metrics = flatten(baseline), flatten(current)
+    table = Table(title=f"Comparison (threshold {threshold:.0%})")
+    table.add_column("Metric", style="bold magenta")
+    table.add_column("Baseline", justify="right")
+    table.add_column("Current", justify="right")
+    table.add_column("Change", justify="right")
+    table.add_column("Status")
+    regressions = []
+
+    for key, cur in cur_metrics.items():
+        base = base_metrics.get(key)
+        if base is None:
+            table.add_row(key, "-", f"{cur['value']:.3f}", "-", "[dim]new[/dim]")
+            continue
+        change = (cur["value"] - base["value"]) / base["value"] if base["value"] else 0.0
+        worse = {"lower": change > threshold, "higher": change < -threshold}.get(cur["better"], False)
+        better = {"lower": change < -threshold, "higher": change > threshold}.get(cur["better"], False)
+        status = "[red]REGRESSION[/red]" if worse else ("[green]improved[/green]" if better else "ok")
+        if worse:
+            regressions.append(key)
+        table.add_row(key, f"{base['value']:.3f}", f"{cur['value']:.3f}", f"{change:+.1%}", status)
+
+    console.print(table)
+    return regressions
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="RAG pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="run benchmark suites and save JSON results")
+    run_parser.add_argument("--suite", action="append", help=f"suite to run (repeatable): {', '.join(SUITES)}")
+    run_parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=DEFAULT_SIZES)
+    run_parser.add_argument("--embed-model", default="mock", help="'mock' or a HuggingFace model name")
+    run_parser.add_argument("--dim", type=int, default=768, help="vector dimension for synthetic index/search data")
+    run_parser.add_argument("--output", default=None)
+
+    sub.add_parser("list", help="list available suites")
+
+    compare_parser = sub.add_parser("compare", help="flag regressions against a saved baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        for name in SUITES:
+            console.print(f"• {name}")
+    elif args.command == "run":
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        args.output = args.output or os.path.join(RESULTS_DIR, f"bench-{stamp}.json")
+        run(args)
+    elif args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            console.print(f"[bold red]❌ {len(regressions)} regression(s) detected.[/bold red]")
+            sys.exit(1)
+        console.print("[bold green]✅ No regressions.[/bold green]")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,14 +12,21 @@ import re
 
 from src.rag import (
     get_response,
+    resolve_file_filters,
     check_for_updates,
     update_knowledge_base,
     rebuild_knowledge_base,
     reset_chat_history,
     save_access_control_config,
     get_documents_access_control,
-    sync_access_levels
+    sync_access_levels,
+    get_backend,
+    get_query_stats,
+    switch_session,
+    list_sessions,
+    export_session
 )
+from src.autotune import autotune
 
 console = Console()
 
@@ -81,10 +88,45 @@ def main():
                 console.print("[dim]🧹 Chat history cleared.[/dim]")
                 continue
 
+            # Session, stats and tuning commands are slash commands, so no question is mistaken for one
+            if user_input.lower() == "/session" or user_input.lower().startswith("/session "):
+                parts = user_input.split(maxsplit=1)
+                if len(parts) < 2:
+                    console.print("[dim]Usage: /session <name>[/dim]")
+                    continue
+                session_id = parts[1].strip()
+                memory = switch_session(session_id)
+                console.print(f"[dim]💾 Session [bold]{session_id}[/bold] ({len(memory.get_all())} messages restored).[/dim]")
+                continue
+
+            if user_input.lower() == "/sessions":
+                sessions, active = list_sessions()
+                if not sessions:
+                    console.print("[dim]No saved sessions yet.[/dim]")
+                for session_id in sessions:
+                    marker = " [bold green](active)[/bold green]" if session_id == active else ""
+                    console.print(f"   💾 {escape(session_id)}{marker}")
+                continue
+
+            if user_input.lower() == "/export" or user_input.lower().startswith("/export "):
+                parts = user_input.split(maxsplit=1)
+                path = export_session(parts[1].strip() if len(parts) > 1 else None)
+                console.print(f"[dim]📤 Session exported to [bold]{escape(path)}[/bold].[/dim]")
+                continue
+
             if user_input.lower() == "admin":
                 run_admin_dashboard(console)
                 continue
 
+            if user_input.lower() == "/stats":
+                show_query_stats(console)
+                continue
+
+            if user_input.lower() == "/autotune":
+                if Prompt.ask("\n[bold cyan]🎛️  Sweep HNSW parameters on a sample of the knowledge base?[/bold cyan]", choices=["y", "n"], default="y") == "y":
+                    autotune(get_backend())
+                continue
+
             if user_input.lower() in ["update", "upd"]:
                 with console.status("[bold magenta]🔄 Checking for knowledge base updates...[/bold magenta]"):
                     changes = check_for_updates()
@@ -109,12 +151,17 @@ def main():
                 - Type your question and press Enter to get an answer.
                 - To target specific documents, use the syntax: [dim]@filename.ext[/dim] in your question.
                   Example: [dim]What is the summary of the report? @report.pdf[/dim]
+                  Globs and prefixes select several documents: [dim]@q3_*.pdf[/dim], [dim]@q3_[/dim]
                 - Type [dim]exit[/dim], [dim]quit[/dim], or [dim]q[/dim] to leave the chat.
                 - Type [dim]clear[/dim] or [dim]cls[/dim] to clear the screen.
                 - Type [dim]help[/dim], [dim]h[/dim], or [dim]?[/dim] to display this help message.
                 - Type [dim]update[/dim] or [dim]upd[/dim] to check for knowledge base updates.
                 - Type [dim]rebuild[/dim] or [dim]rb[/dim] to rebuild the entire knowledge base.
                 - Type [dim]clear history[/dim] or [dim]ch[/dim] to clear the chat history.
+                - Type [dim]/session <name>[/dim] to switch to (or resume) a saved chat session.
+                - Type [dim]/sessions[/dim] to list saved sessions, [dim]/export [file.json][/dim] to save the current transcript.
+                - Type [dim]/autotune[/dim] to pick HNSW parameters for the next rebuild.
+                - Type [dim]/stats[/dim] to show query latency percentiles per stage.
                 """
                 console.print(Panel(help_text, border_style="cyan", title="Help", title_align="left"))
                 continue
@@ -122,14 +169,25 @@ def main():
             if not user_input.strip():
                 continue
 
-            file_filters = re.findall(r'@([\w\.\-_]+)', user_input)
-            clean_input = re.sub(r'@[\w\.\-_]+', '', user_input).strip()
+            # A trailing period ends the sentence, not the file name
+            file_tokens = [t.rstrip(".") for t in re.findall(r'@([\w\.\-_\*\[\]]+)', user_input)]
+            clean_input = re.sub(r'@[\w\.\-_\*\[\]]+', '', user_input).strip()
 
-            if not clean_input and not file_filters:
+            if not clean_input and not file_tokens:
                 continue
 
             console.print("")
 
+            file_filters = []
+            for resolution in resolve_file_filters(file_tokens):
+                if resolution.files:
+                    file_filters += [f for f in resolution.files if f not in file_filters]
+                else:
+                    hint = f" Did you mean: {', '.join('@' + s for s in resolution.suggestions)}?" if resolution.suggestions else ""
+                    console.print(f"[yellow]⚠️ No document matches @{escape(resolution.token)}.{escape(hint)}[/yellow]")
+            if file_tokens and not file_filters:
+                continue
+
             if file_filters:
                 console.print(f"[dim]🎯 Targeted documents: {', '.join(file_filters)}[/dim]")
 
@@ -146,6 +204,11 @@ def main():
                     score = node_score.score or 0.0
                     meta = node_score.node.metadata
                     file_name = meta.get('file_name') or meta.get('file_path') or "Unknown"
+                    if meta.get('page_number'):
+                        file_name += f", p. {meta['page_number']}"
+                    shared_with = [f for f in (meta.get('source_files') or "").split("|") if f and f != meta.get('file_name')]
+                    if shared_with:
+                        file_name += f" (also in {', '.join(shared_with)})"
                     source_branch = tree.add(f"[cyan]{file_name}[/cyan] [dim](Score: {score:.2f})[/dim]")
                     text_preview = node_score.node.get_text().replace('\n', ' ').strip()[:80] + "..."
                     source_branch.add(f"[italic grey50]\"{text_preview}\"[/italic grey50]")
@@ -170,6 +233,65 @@ def main():
             console.print("[bold red]Traceback:[/bold red]")
             console.print(escape(str(traceback.format_exc())))
 
+def show_query_stats(console: Console):
+    stats = get_query_stats()
+    summary = stats["summary"]
+
+    if not summary:
+        console.print("[dim]No queries recorded yet.[/dim]")
+        return
+
+    table = Table(title="⏱️  Query stages", show_header=True, header_style="bold magenta")
+    table.add_column("Stage")
+    table.add_column("Count", justify="right")
+    table.add_column("p50 (ms)", justify="right")
+    table.add_column("p95 (ms)", justify="right")
+    table.add_column("p99 (ms)", justify="right")
+    table.add_column("Last (ms)", justify="right")
+
+    last = stats["last"]
+    for name, s in sorted(summary.items()):
+        if not name.startswith("span:"):
+            continue
+        stage = name.split(":", 1)[1]
+        last_value = last.spans.get(stage) if last else None
+        table.add_row(
+            stage, str(s["count"]),
+            f"{s['p50'] * 1000:.1f}", f"{s['p95'] * 1000:.1f}", f"{s['p99'] * 1000:.1f}",
+            f"{last_value * 1000:.1f}" if last_value is not None else "-"
+        )
+    console.print(table)
+
+    sizes = Table(title="📏 Query sizes", show_header=True, header_style="bold magenta")
+    sizes.add_column("Metric")
+    sizes.add_column("p50", justify="right")
+    sizes.add_column("p95", justify="right")
+    sizes.add_column("Last", justify="right")
+    for name, s in sorted(summary.items()):
+        if not name.startswith("counter:"):
+            continue
+        key = name.split(":", 1)[1]
+        last_value = last.counters.get(key) if last else None
+        sizes.add_row(key, f"{s['p50']:.0f}", f"{s['p95']:.0f}", f"{last_value:.0f}" if last_value is not None else "-")
+    console.print(sizes)
+
+    router = stats.get("llm_router")
+    if router:
+        providers = Table(
+            title=f"🔀 LLM providers ({router['hedges']} hedged, {router['failovers']} failed over)",
+            show_header=True, header_style="bold magenta"
+        )
+        for column in ("Provider", "Calls", "Wins", "Errors", "429s", "Cancelled", "EWMA (ms)", "p95 (ms)"):
+            providers.add_column(column, justify="left" if column == "Provider" else "right")
+        ms = lambda v: f"{v * 1000:.0f}" if v is not None else "-"
+        for name, p in router["providers"].items():
+            providers.add_row(
+                name + (" [yellow](cooling down)[/yellow]" if p["cooling_down"] else ""),
+                str(p["calls"]), str(p["wins"]), str(p["errors"]), str(p["rate_limited"]), str(p["cancelled"]),
+                ms(p["ewma_s"]), ms(p["p95_s"])
+            )
+        console.print(providers)
+
 def run_admin_dashboard(console: Console):
     files_on_disk, current_config = get_documents_access_control()
     disk_files_set = set(files_on_disk)
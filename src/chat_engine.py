@@ -0,0 +1,163 @@
+import time
+import numpy as np
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, Future
+from llama_index.core.chat_engine import CondensePlusContextChatEngine
+from llama_index.core.schema import QueryBundle, MetadataMode
+from llama_index.core.utils import get_tokenizer
+from src.metrics import QueryTrace
+from src.condense import CondensePolicy
+
+_speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-retrieval")
+
+
+def cosine_similarity(a, b) -> float:
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / denom if denom else 0.0
+
+
+class RAGChatEngine(CondensePlusContextChatEngine):
+    """Condense-plus-context engine that reports per-stage spans into a QueryTrace.
+
+    Query embedding is computed here and handed to the retriever through the
+    QueryBundle, so embedding and vector search are timed separately. With a
+    speculative condense policy, retrieval for the raw question runs while the
+    remote LLM condenses it, and is reused when both questions embed alike.
+    """
+
+    _trace: QueryTrace | None = None
+    _embed_model = None
+    _condense_policy: CondensePolicy | None = None
+    _speculation: Future | None = None
+    last_query: str | None = None
+
+    @classmethod
+    def create(
+        cls,
+        retriever,
+        llm,
+        memory,
+        embed_model,
+        trace: QueryTrace | None = None,
+        condense_policy: CondensePolicy | None = None,
+        **kwargs
+    ) -> "RAGChatEngine":
+        engine = cls.from_defaults(retriever=retriever, llm=llm, memory=memory, **kwargs)
+        engine._embed_model = embed_model
+        engine._trace = trace
+        engine._condense_policy = condense_policy
+        engine._tokenizer = get_tokenizer()
+        return engine
+
+    def _count_tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def _span(self, name: str):
+        return self._trace.span(name) if self._trace is not None else nullcontext()
+
+    def _set(self, name: str, value: float):
+        if self._trace is not None:
+            self._trace.set(name, value)
+
+    def _retrieve(self, message: str, embedding):
+        nodes = self._retriever.retrieve(QueryBundle(query_str=message, embedding=embedding))
+        for postprocessor in self._node_postprocessors:
+            nodes = postprocessor.postprocess_nodes(nodes, query_bundle=QueryBundle(message))
+        return nodes
+
+    def _speculate(self, message: str):
+        start_time = time.perf_counter()
+        embedding = self._embed_model.get_query_embedding(message)
+        nodes = self._retrieve(message, embedding)
+        if self._trace is not None:
+            self._trace.add_span("speculative_retrieval", time.perf_counter() - start_time)
+        return embedding, nodes
+
+    def _remote_condense(self, chat_history, latest_message: str) -> str:
+        policy = self._condense_policy
+        if policy is not None and policy.config.speculative and self._embed_model is not None:
+            self._speculation = _speculation_pool.submit(self._speculate, latest_message)
+        return super()._condense_question(chat_history, latest_message)
+
+    def _rewrite_question(self, chat_history, latest_message: str) -> str:
+        policy = self._condense_policy
+        if policy is None:
+            return super()._condense_question(chat_history, latest_message)
+        if not policy.should_condense(latest_message, chat_history):
+            return latest_message
+        local = policy.rewrite(chat_history, latest_message)
+        if local is not None:
+            return local
+        return self._remote_condense(chat_history, latest_message)
+
+    def _condense_question(self, chat_history, latest_message: str) -> str:
+        self._speculation = None
+        with self._span("condense"):
+            condensed = self._rewrite_question(chat_history, latest_message)
+        self._set("condensed", int(condensed != latest_message))
+        self.last_query = condensed
+        return condensed
+
+    def _get_nodes(self, message: str):
+        if self._embed_model is None:
+            return super()._get_nodes(message)
+
+        speculation, self._speculation = self._speculation, None
+        with self._span("query_embedding"):
+            embedding = self._embed_model.get_query_embedding(message)
+
+        nodes = None
+        if speculation is not None:
+            try:
+                with self._span("speculation_wait"):
+                    raw_embedding, raw_nodes = speculation.result(
+                        timeout=self._condense_policy.config.speculative_timeout_s
+                    )
+            except Exception as e:
+                # Speculation only saves time; a failed one leaves retrieval to the condensed question
+                print(f"⚠️ Speculative retrieval failed ({e}), retrieving for the condensed question.")
+                self._set("speculation_failed", 1)
+            else:
+                similarity = cosine_similarity(raw_embedding, embedding)
+                hit = similarity >= self._condense_policy.config.speculative_threshold
+                self._set("speculation_similarity", similarity)
+                self._set("speculation_hit", int(hit))
+                if hit:
+                    nodes = raw_nodes
+
+        if nodes is None:
+            with self._span("retrieval"):
+                nodes = self._retrieve(message, embedding)
+
+        context = "\n\n".join(n.node.get_content(metadata_mode=MetadataMode.LLM) for n in nodes)
+        self._set("retrieved_nodes", len(nodes))
+        self._set("context_chars", len(context))
+        if self._trace is not None:
+            self._set("context_tokens", self._count_tokens(context))
+        return nodes
+
+    def _get_response_synthesizer(self, chat_history, streaming: bool = False):
+        with self._span("prompt_assembly"):
+            synthesizer = super()._get_response_synthesizer(chat_history, streaming=streaming)
+        if self._trace is not None:
+            self._set("history_tokens", sum(self._count_tokens(str(m.content or "")) for m in chat_history))
+            synthesize = synthesizer.synthesize
+
+            def timed_synthesize(*args, **kwargs):
+                # The answer-generating LLM call, measured instead of inferred from the remaining time
+                with self._span("llm_generation"):
+                    return synthesize(*args, **kwargs)
+
+            synthesizer.synthesize = timed_synthesize
+        return synthesizer
+
+    def chat(self, message: str, *args, **kwargs):
+        response = super().chat(message, *args, **kwargs)
+        if self._trace is not None:
+            counters = self._trace.counters
+            counters["tokens_in"] = (
+                self._count_tokens(message) + counters.get("context_tokens", 0) + counters.get("history_tokens", 0)
+            )
+            counters["tokens_out"] = self._count_tokens(str(response))
+        return response
@@ -0,0 +1,316 @@
+import os
+import re
+import time
+import itertools
+import numpy as np
+from typing import Any, Callable
+from collections.abc import Iterable, Iterator
+from pydantic import Field, PrivateAttr
+from llama_index.core import Document
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.node_parser import NodeParser, SemanticSplitterNodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.utils import get_tokenizer, get_tqdm_iterable
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from src.config import settings
+from src.profiling import profiler
+
+CHUNKING_MODEL_NAME = "sentence-transformers/all-MiniLM-L12-v2"
+
+_chunking_model: BaseEmbedding | None = None
+
+
+def get_chunking_model() -> BaseEmbedding:
+    """Embedding model behind semantic splitting, loaded on first use.
+
+    With `ingestion.chunking_model = "retrieval"` this is the retrieval model;
+    the app hands over its own instance through `set_chunking_model`, parse
+    worker processes load one here.
+    """
+    global _chunking_model
+    if _chunking_model is None:
+        if settings.ingestion.chunking_model == "retrieval":
+            _chunking_model = HuggingFaceEmbedding(
+                model_name=settings.embedding.model_name,
+                trust_remote_code=True,
+                model_kwargs={"attn_implementation": "sdpa"}
+            )
+        else:
+            _chunking_model = HuggingFaceEmbedding(model_name=CHUNKING_MODEL_NAME)
+    return _chunking_model
+
+
+def set_chunking_model(model: BaseEmbedding):
+    global _chunking_model
+    _chunking_model = model
+
+
+def reuses_chunk_embeddings() -> bool:
+    """Chunk embeddings from the splitter are only valid when it ran the retrieval model."""
+    return settings.ingestion.chunking_model == "retrieval" and settings.ingestion.reuse_chunk_embeddings
+
+
+class ReusingSemanticSplitter(SemanticSplitterNodeParser):
+    """Semantic splitter that keeps the sentence-group embeddings it computed.
+
+    Each chunk gets the normalized mean of the embeddings of its sentence
+    groups, so with the retrieval model as `embed_model` the chunks need no
+    second forward pass before they are indexed.
+    """
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ReusingSemanticSplitter"
+
+    def build_semantic_nodes_from_documents(self, documents, show_progress: bool = False):
+        all_nodes = []
+        for doc in documents:
+            sentences = self._build_sentence_groups(self.sentence_splitter(doc.text))
+            embeddings = self.embed_model.get_text_embedding_batch(
+                [s["combined_sentence"] for s in sentences], show_progress=show_progress
+            )
+            for sentence, embedding in zip(sentences, embeddings):
+                sentence["combined_sentence_embedding"] = embedding
+            groups = self._chunk_groups(sentences, self._calculate_distances_between_sentence_groups(sentences))
+            joiner = "" if len(sentences) > 1 else " "
+            texts = [joiner.join(s["sentence"] for s in group) for group in groups]
+            nodes = build_nodes_from_splits(texts, doc, id_func=self.id_func)
+            for node, group in zip(nodes, groups):
+                if not group:
+                    # Empty document: nothing to pool, the chunk is embedded like any other
+                    continue
+                pooled = np.mean([s["combined_sentence_embedding"] for s in group], axis=0)
+                norm = np.linalg.norm(pooled)
+                node.embedding = (pooled / norm if norm else pooled).tolist()
+            all_nodes.extend(nodes)
+        return all_nodes
+
+    def _chunk_groups(self, sentences: list[dict], distances: list[float]) -> list[list[dict]]:
+        # Same breakpoints as SemanticSplitterNodeParser._build_node_chunks, keeping the groups instead of text
+        if not distances:
+            return [sentences]
+        threshold = np.percentile(distances, self.breakpoint_percentile_threshold)
+        groups, start = [], 0
+        for i, distance in enumerate(distances):
+            if distance > threshold:
+                groups.append(sentences[start:i + 1])
+                start = i + 1
+        if start < len(sentences):
+            groups.append(sentences[start:])
+        return groups
+
+
+def split_sentences(text: str) -> list[str]:
+    sentences = re.split(r'(?<=[\.\!\?])\s+', text.strip())
+    return [s.strip() for s in sentences if s.strip()]
+
+_MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+\S")
+_NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*\.?|[IVX]+\.)\s+\S")
+
+
+def is_heading(block: str) -> bool:
+    """Markdown headings, and short single lines that read like titles ("2.1 Access levels", "INTRODUCTION")."""
+    if "\n" in block:
+        return False
+    if _MARKDOWN_HEADING.match(block):
+        return True
+    if len(block) > 80 or len(block.split()) > 10 or block[-1] in ".!?:;,":
+        return False
+    return bool(_NUMBERED_HEADING.match(block)) or block.isupper() or block.istitle()
+
+
+class StructuralSplitter(NodeParser):
+    """Model-free splitter that follows the document's own structure.
+
+    Text is cut at headings, paragraphs are packed into chunks of up to
+    `chunk_tokens`, and every chunk starts with its section heading. A
+    paragraph longer than that becomes sentence windows that overlap by
+    `sentence_overlap` sentences.
+    """
+
+    chunk_tokens: int = Field(default=512, gt=0)
+    sentence_overlap: int = Field(default=1, ge=0)
+    _tokenizer: Callable = PrivateAttr()
+
+    def __init__(self, tokenizer: Callable | None = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StructuralSplitter"
+
+    def _tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def split_text(self, text: str) -> list[str]:
+        chunks, paragraphs, heading = [], [], ""
+        used, has_body = 0, False
+
+        def flush():
+            nonlocal used
+            if paragraphs:
+                chunks.append("\n\n".join(([heading] if heading else []) + paragraphs))
+                paragraphs.clear()
+            used = 0
+
+        for block in self._blocks(text):
+            if is_heading(block):
+                flush()
+                # Consecutive headings (chapter, then section) are kept together as the chunk prefix
+                heading = f"{heading}\n{block}" if heading and not has_body else block
+                has_body = False
+                continue
+            has_body = True
+
+            budget = max(1, self.chunk_tokens - self._tokens(heading))
+            size = self._tokens(block)
+            if size > budget:
+                flush()
+                chunks.extend("\n\n".join(([heading] if heading else []) + [w]) for w in self._windows(block, budget))
+                continue
+            if used + size > budget:
+                flush()
+            paragraphs.append(block)
+            used += size
+        flush()
+        if heading and not has_body:
+            chunks.append(heading)
+        return chunks
+
+    @staticmethod
+    def _blocks(text: str) -> list[str]:
+        """Paragraphs (blank-line separated), with Markdown heading lines split out of them."""
+        blocks = []
+        for paragraph in re.split(r"\n\s*\n", text):
+            lines = []
+            for line in paragraph.splitlines():
+                if _MARKDOWN_HEADING.match(line.strip()):
+                    blocks.append("\n".join(lines))
+                    blocks.append(line)
+                    lines = []
+                else:
+                    lines.append(line)
+            blocks.append("\n".join(lines))
+        return [b.strip() for b in blocks if b.strip()]
+
+    def _windows(self, paragraph: str, budget: int) -> list[str]:
+        sentences = []
+        for sentence in split_sentences(paragraph):
+            if self._tokens(sentence) <= budget:
+                sentences.append(sentence)
+                continue
+            # A single run-on "sentence" (a table row dump, a URL list) is cut by words
+            # Each word is tokenized once, with its leading space, and added to a running count
+            piece, used = [], 0
+            for word in sentence.split():
+                size = self._tokens(f" {word}")
+                if piece and used + size > budget:
+                    sentences.append(" ".join(piece))
+                    piece, used = [], 0
+                piece.append(word)
+                used += size
+            if piece:
+                sentences.append(" ".join(piece))
+
+        windows, start = [], 0
+        while start < len(sentences):
+            end, used = start, 0
+            while end < len(sentences):
+                size = self._tokens(sentences[end])
+                if end > start and used + size > budget:
+                    break
+                used += size
+                end += 1
+            windows.append(" ".join(sentences[start:end]))
+            if end >= len(sentences):
+                break
+            start = max(start + 1, end - self.sentence_overlap)
+        return windows
+
+    def _parse_nodes(self, nodes, show_progress: bool = False, **kwargs: Any):
+        all_nodes = []
+        for node in get_tqdm_iterable(nodes, show_progress, "Splitting by structure"):
+            splits = self.split_text(node.get_content())
+            all_nodes.extend(build_nodes_from_splits(splits, node, id_func=self.id_func))
+        return all_nodes
+
+
+STRATEGIES = ("semantic", "structural")
+
+
+def choose_strategy(file_name: str, text_chars: int) -> str:
+    """Chunking strategy for one file under `[chunking]`."""
+    config = settings.chunking
+    if config.strategy != "adaptive":
+        return config.strategy
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension in config.by_extension:
+        return config.by_extension[extension]
+    # Tiny files fit in a chunk or two anyway; huge ones cost the most to embed sentence by sentence
+    if config.semantic_min_chars <= text_chars <= config.semantic_max_chars:
+        return "semantic"
+    return "structural"
+
+
+def get_node_parser(strategy: str = "semantic"):
+    if strategy == "structural":
+        return StructuralSplitter(
+            chunk_tokens=settings.chunking.chunk_tokens,
+            sentence_overlap=settings.chunking.sentence_overlap
+        )
+    parser_class = ReusingSemanticSplitter if reuses_chunk_embeddings() else SemanticSplitterNodeParser
+    return parser_class(
+        buffer_size=1,
+        breakpoint_percentile_threshold=70,
+        sentence_splitter=split_sentences,
+        embed_model=get_chunking_model()
+    )
+
+def _length_decides(file_name: str) -> bool:
+    config = settings.chunking
+    return config.strategy == "adaptive" and os.path.splitext(file_name)[1].lower() not in config.by_extension
+
+
+def split_documents(documents: Iterable[Document], file_name: str, batch_size: int) -> Iterator[list]:
+    """Chunk the documents of one file with the strategy chosen for it, yielding batches of about `batch_size` chunks.
+
+    Documents are split as they arrive. Only an adaptive, length-based
+    choice reads ahead, and no further than `semantic_max_chars`, so memory
+    stays bounded by the batch size rather than the file size.
+    """
+    documents = iter(documents)
+    head, text_chars = [], 0
+    if _length_decides(file_name):
+        for document in documents:
+            head.append(document)
+            text_chars += len(document.text)
+            if text_chars > settings.chunking.semantic_max_chars:
+                break
+    strategy = choose_strategy(file_name, text_chars)
+    splitter = get_node_parser(strategy)
+    profiler.count(f"files_chunked_{strategy}")
+
+    def record(nodes: list, items_in: int, elapsed: float):
+        profiler.add("chunking", elapsed, file_name or None, items_in=items_in, items_out=len(nodes))
+        if strategy == "semantic" and reuses_chunk_embeddings():
+            profiler.count("chunk_embeddings_reused", len(nodes))
+
+    batch, items_in, elapsed = [], 0, 0.0
+    for document in itertools.chain(head, documents):
+        start_time = time.perf_counter()
+        if strategy == "semantic":
+            # Loaders keep lines and heading markers for the structural splitter; semantic splitting runs on flat text
+            from src.doc_parser import clean_text
+            document.set_content(clean_text(document.text))
+        batch.extend(splitter.get_nodes_from_documents([document]))
+        elapsed += time.perf_counter() - start_time
+        items_in += 1
+        if len(batch) >= batch_size:
+            record(batch, items_in, elapsed)
+            yield batch
+            batch, items_in, elapsed = [], 0, 0.0
+    if items_in:
+        record(batch, items_in, elapsed)
+    if batch:
+        yield batch
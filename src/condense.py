@@ -0,0 +1,81 @@
+import re
+from functools import lru_cache
+from llama_index.core.llms import ChatMessage, MessageRole
+from src.config import CondenseConfig
+
+# Words that usually point back into the conversation
+ANAPHORA = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|theirs|he|him|his|she|her|hers|there|"
+    r"above|previous|earlier|former|latter|same|such|also|too|else|another|again)\b",
+    re.IGNORECASE
+)
+FOLLOW_UP_OPENERS = re.compile(
+    r"^\s*(and|but|also|so|then|or|what about|how about|why|why not|what else|"
+    r"elaborate|explain|continue|go on|tell me more|more)\b",
+    re.IGNORECASE
+)
+LOCAL_PROMPT = (
+    "Rewrite the follow-up question as a standalone question.\n"
+    "Conversation:\n{history}\n"
+    "Follow-up question: {question}\n"
+    "Standalone question:"
+)
+
+
+def is_self_contained(query: str, min_words: int = 4) -> bool:
+    """Cheap check whether a question can be answered without the chat history."""
+    words = re.findall(r"\w+", query)
+    if len(words) < min_words:
+        return False
+    if FOLLOW_UP_OPENERS.match(query):
+        return False
+    return not ANAPHORA.search(query)
+
+
+def last_user_message(chat_history: list[ChatMessage]) -> str | None:
+    for message in reversed(chat_history):
+        if message.role == MessageRole.USER and message.content:
+            return str(message.content)
+    return None
+
+
+@lru_cache(maxsize=2)
+def _load_local_model(model_name: str):
+    from transformers import pipeline
+    return pipeline("text2text-generation", model=model_name)
+
+
+class CondensePolicy:
+    """Decides whether a turn needs condensing and, optionally, rewrites it locally.
+
+    policy:   "always" (stock behaviour), "auto" (skip self-contained questions) or "never"
+    rewriter: "remote" (the chat LLM), "rules" (prepend the previous user question)
+              or "local_model" (a small seq2seq model run in-process)
+    """
+
+    def __init__(self, config: CondenseConfig):
+        self.config = config
+
+    def should_condense(self, query: str, chat_history: list[ChatMessage]) -> bool:
+        if not chat_history or self.config.policy == "never":
+            return False
+        if self.config.policy == "always":
+            return True
+        return not is_self_contained(query, self.config.min_words)
+
+    def rewrite(self, chat_history: list[ChatMessage], query: str) -> str | None:
+        """Return a locally rewritten question, or None to defer to the remote LLM."""
+        match self.config.rewriter:
+            case "remote":
+                return None
+            case "rules":
+                previous = last_user_message(chat_history)
+                return f"{previous} {query}" if previous else query
+            case "local_model":
+                turns = chat_history[-self.config.history_turns * 2:]
+                history = "\n".join(f"{m.role.value}: {m.content}" for m in turns)
+                generator = _load_local_model(self.config.local_model)
+                output = generator(LOCAL_PROMPT.format(history=history, question=query), max_new_tokens=64)
+                return output[0]["generated_text"].strip() or query
+            case _:
+                raise ValueError(f"Unsupported condense rewriter: {self.config.rewriter}")
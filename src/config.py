@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 if sys.version_info >= (3, 11):
     import tomllib
 else:
@@ -8,12 +9,44 @@ else:
 from pydantic import BaseModel, Field
 from pathlib import Path
 from functools import lru_cache
+from typing import Literal
+
+class LLMProviderConfig(BaseModel):
+    provider: str
+    model_name: str
+    api_key_env_var: str
+    # Override the API endpoint, e.g. a local stub server
+    base_url: str = ""
+
+class LLMRouterConfig(BaseModel):
+    # Route every request over [llm] plus the fallbacks: hedge slow calls, fail over on errors and 429s
+    enabled: bool = False
+    fallbacks: list[LLMProviderConfig] = Field(default_factory=list)
+    # A duplicate request goes to the next provider once the first is slower than this percentile of its recent latencies
+    hedge: bool = True
+    hedge_percentile: float = 95.0
+    # Hedge delay until min_samples latencies are known, and bounds on it
+    hedge_initial_ms: float = 2000.0
+    hedge_min_ms: float = 250.0
+    hedge_max_ms: float = 10000.0
+    min_samples: int = 10
+    window: int = 200
+    # Weight of the newest latency in the per-provider EWMA that orders providers
+    ewma_alpha: float = 0.2
+    # Every probe_every-th request goes first to the provider measured least recently (0 disables)
+    probe_every: int = 20
+    # A provider is skipped for this long after an error, or after a 429 without Retry-After
+    error_cooldown_s: float = 10.0
+    rate_limit_cooldown_s: float = 30.0
+    timeout_s: float = 60.0
 
 class LLMConfig(BaseModel):
     provider: str
     model_name: str
     temperature: float = 0.1
     api_key_env_var: str
+    base_url: str = ""
+    router: LLMRouterConfig = Field(default_factory=LLMRouterConfig)
 
     @property
     def api_key(self) -> str:
@@ -23,22 +56,174 @@ class LLMConfig(BaseModel):
             raise ValueError(f"Environment variable {self.api_key_env_var} is not set.")
         return key
 
+class HNSWConfig(BaseModel):
+    construction_ef: int = 200
+    M: int = 64
+    search_ef: int = 200
+
 class VectorStoreConfig(BaseModel):
     collection_name: str
     path: str
     top_k: int = 5
+    backend: Literal["chroma", "lancedb", "qdrant", "faiss"] = "chroma"
+    # Exact NumPy search: "auto" uses it below the thresholds, "always" / "never" force it
+    flat_search: Literal["auto", "always", "never"] = "auto"
+    flat_max_chunks: int = 100_000
+    flat_max_filtered: int = 20_000
+    flat_dtype: Literal["float16", "float32"] = "float16"
+    # Shard chunks over one collection per access level or per file group; queries only visit matching shards
+    partition_by: Literal["none", "access_level", "file_group"] = "none"
+    # file_group partitions: group name -> file name patterns (fnmatch); unmatched files land in "default"
+    file_groups: dict[str, list[str]] = Field(default_factory=dict)
+    hnsw: HNSWConfig = Field(default_factory=HNSWConfig)
 
 class EmbeddingConfig(BaseModel):
     model_name: str
+    # Concurrent query embeddings are coalesced into one forward pass (up to query_max_batch queries);
+    # once concurrent callers are seen, the dispatcher collects arrivals for up to query_batch_window_ms per pass
+    query_batching: bool = True
+    query_batch_window_ms: float = 5.0
+    query_max_batch: int = 32
+    # Ingestion embeddings are sorted by token length and batched so that count x longest text
+    # stays within ingest_token_budget (at most ingest_max_batch texts), which keeps padding low
+    ingest_length_bucketing: bool = True
+    ingest_token_budget: int = 16384
+    ingest_max_batch: int = 128
 
 class DomainConfig(BaseModel):
     domain_path: str
 
+class IngestionConfig(BaseModel):
+    # Worker processes for PDF page extraction; 0 uses every CPU, 1 parses in-process
+    pdf_workers: int = 0
+    pdf_pages_per_task: int = 16
+    # CSV/XLSX rows per Document; each batch repeats the header row
+    table_rows_per_batch: int = 200
+    # Durable job queue (SQLite, under vector_store.path unless set): interrupted runs resume from the last finished stage
+    queue_path: str = ""
+    # Parse worker processes draining the queue; embedding and inserts stay in the app process
+    queue_workers: int = 1
+    max_attempts: int = 3
+    retry_backoff_s: float = 5.0
+    retry_backoff_max_s: float = 300.0
+    # Chunks parsed, embedded, inserted and checkpointed per batch; peak memory follows this, not the file size
+    checkpoint_chunks: int = Field(default=512, gt=0)
+    # Semantic splitting model: "separate" loads MiniLM next to the retrieval model, "retrieval" reuses it.
+    # With reuse_chunk_embeddings, a chunk's vector is the mean of its sentence-group embeddings from the
+    # splitter instead of a second forward pass (only with "retrieval")
+    chunking_model: Literal["separate", "retrieval"] = "separate"
+    reuse_chunk_embeddings: bool = True
+
+class ChunkingConfig(BaseModel):
+    # "semantic" splits every file at embedding breakpoints; "structural" packs headings, paragraphs and
+    # sentence windows up to chunk_tokens without model calls; "adaptive" picks one per file
+    strategy: Literal["semantic", "structural", "adaptive"] = "semantic"
+    # adaptive: extension overrides (".md" = "structural"); other files are split semantically only when
+    # their text length is within [semantic_min_chars, semantic_max_chars]
+    by_extension: dict[str, Literal["semantic", "structural"]] = Field(default_factory=dict)
+    semantic_min_chars: int = 2_000
+    semantic_max_chars: int = 200_000
+    chunk_tokens: int = 512
+    # Sentences repeated at the start of the next window when a paragraph is longer than chunk_tokens
+    sentence_overlap: int = 1
+
+class CaptioningConfig(BaseModel):
+    # Provider for images embedded in PDFs; standalone image files use Gemini
+    provider: Literal["groq", "gemini"] = "groq"
+    # Images packed into one multimodal request (Groq accepts up to 5)
+    images_per_request: int = 5
+    groq_model: str = "meta-llama/llama-4-scout-17b-16e-instruct"
+    gemini_model: str = "gemini-2.5-flash-lite"
+    # Override the Groq API endpoint, e.g. a local mock server
+    base_url: str = ""
+    timeout_s: float = 60.0
+    max_retries: int = 2
+
+class ImageTriageConfig(BaseModel):
+    enabled: bool = True
+    # Icons, bullets and separators: smaller than this, or with less grayscale entropy (bits), are not captioned
+    min_side: int = 48
+    min_area: int = 64 * 64
+    min_entropy: float = 2.0
+    # Everything else is downscaled to max_side and recompressed before upload
+    max_side: int = 1024
+    jpeg_quality: int = 80
+    # Images whose 64-bit dHash differs in at most this many bits share one caption
+    hash_distance: int = 5
+
+class DedupConfig(BaseModel):
+    # Near-duplicate chunks (MinHash estimate of word-shingle Jaccard >= threshold, same numbers) are stored
+    # once. Lossy: an answer may quote the canonical chunk's wording for every file that shares it, so opt-in
+    enabled: bool = False
+    threshold: float = 0.9
+    num_perm: int = 128
+    shingle_size: int = 3
+    seed: int = 1
+
+class TablesConfig(BaseModel):
+    # Load CSV/XLSX into a local SQLite store and answer aggregate questions with SQL
+    enabled: bool = True
+    # Also embed row batches for vector retrieval; false keeps tables in SQL only
+    embed_rows: bool = True
+    # SQLite file; empty means <vector_store.path>/tables.sqlite3
+    path: str = ""
+    max_rows: int = 50
+
+class AutotuneConfig(BaseModel):
+    sample_size: int = 20_000
+    query_count: int = 200
+    k: int = 10
+    target_recall: float = 0.95
+    M: list[int] = [16, 32, 64, 128]
+    construction_ef: list[int] = [100, 200, 400]
+    search_ef: list[int] = [50, 100, 200, 400]
+
+class ProfilingConfig(BaseModel):
+    # Optional JSONL file that receives one record per ingestion stage
+    trace_path: str = ""
+
+class MetricsConfig(BaseModel):
+    # Query metrics file; empty disables the export
+    path: str = ""
+    format: Literal["prometheus", "jsonl"] = "prometheus"
+
+class CondenseConfig(BaseModel):
+    policy: Literal["always", "auto", "never"] = "auto"
+    rewriter: Literal["remote", "rules", "local_model"] = "remote"
+    local_model: str = "google/flan-t5-base"
+    min_words: int = 4
+    history_turns: int = 2
+    # Retrieve for the raw question while the remote LLM condenses it
+    speculative: bool = False
+    speculative_threshold: float = 0.9
+    # Longest wait for the speculative retrieval once condensing is done
+    speculative_timeout_s: float = 5.0
+
+class MemoryConfig(BaseModel):
+    session_id: str = "default"
+    # SQLite file for persisted sessions; empty means <vector_store.path>/sessions.sqlite3
+    path: str = ""
+    token_limit: int = 4000
+    # Fold older turns into a rolling summary once the retained history exceeds this
+    summarize_after: int = 3000
+    keep_recent: int = 1500
+
 class Settings(BaseModel):
     llm: LLMConfig
     vector_store: VectorStoreConfig
     embedding: EmbeddingConfig
     domain: DomainConfig
+    ingestion: IngestionConfig = Field(default_factory=IngestionConfig)
+    chunking: ChunkingConfig = Field(default_factory=ChunkingConfig)
+    captioning: CaptioningConfig = Field(default_factory=CaptioningConfig)
+    image_triage: ImageTriageConfig = Field(default_factory=ImageTriageConfig)
+    dedup: DedupConfig = Field(default_factory=DedupConfig)
+    tables: TablesConfig = Field(default_factory=TablesConfig)
+    autotune: AutotuneConfig = Field(default_factory=AutotuneConfig)
+    profiling: ProfilingConfig = Field(default_factory=ProfilingConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+    condense: CondenseConfig = Field(default_factory=CondenseConfig)
+    memory: MemoryConfig = Field(default_factory=MemoryConfig)
 
 
 def load_config(config_path: str = "config.toml") -> Settings:
@@ -52,6 +237,27 @@ def load_config(config_path: str = "config.toml") -> Settings:
 
     return Settings(**config_data)
 
+def update_config_section(section: str, values: dict, config_path: str = "config.toml"):
+    """Rewrite (or append) one `[section]` table of config.toml, keeping the rest of the file as is."""
+    path = Path(config_path)
+    lines = path.read_text().splitlines() if path.exists() else []
+    body = [f"{key} = {json.dumps(value)}" for key, value in values.items()]
+
+    start = next((i for i, line in enumerate(lines) if line.strip() == f"[{section}]"), None)
+    if start is None:
+        if lines and lines[-1].strip():
+            lines.append("")
+        lines += [f"[{section}]", *body]
+    else:
+        end = start + 1
+        while end < len(lines) and not lines[end].lstrip().startswith("["):
+            end += 1
+        while end > start + 1 and not lines[end - 1].strip():
+            end -= 1
+        lines[start + 1:end] = body
+
+    path.write_text("\n".join(lines) + "\n")
+
 @lru_cache()
 def get_settings() -> Settings:
     return load_config()
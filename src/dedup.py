@@ -0,0 +1,283 @@
+import os
+import re
+import zlib
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from dataclasses import dataclass, field
+from src.config import DedupConfig
+from src.doc_parser import DEFAULT_ACCESS_LEVEL
+
+MASK_32 = np.uint64(0xFFFFFFFF)
+SEPARATOR = "|"
+
+
+def lsh_params(num_perm: int, threshold: float) -> tuple[int, int]:
+    """(bands, rows) whose S-curve midpoint (1/b)^(1/r) is closest to, but not above, the threshold."""
+    pairs = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    below = [p for p in pairs if (1 / p[0]) ** (1 / p[1]) <= threshold] or pairs
+    return min(below, key=lambda p: threshold - (1 / p[0]) ** (1 / p[1]))
+
+
+def join_sources(files: list[str]) -> str:
+    return SEPARATOR.join(sorted(set(files)))
+
+
+def split_sources(value: str | None) -> list[str]:
+    return [f for f in (value or "").split(SEPARATOR) if f]
+
+
+def number_fingerprint(text: str) -> int:
+    """CRC of the numbers in a chunk, in order; revisions that differ in a figure or date never match."""
+    return zlib.crc32(" ".join(re.findall(r"\d+", text)).encode())
+
+
+@dataclass
+class DedupPlan:
+    kept: list = field(default_factory=list)
+    # Signatures and number fingerprints of the kept nodes, by node id
+    signatures: dict = field(default_factory=dict)
+    numbers: dict = field(default_factory=dict)
+    # Already stored canonical node id -> files to add to its sources
+    shared: dict = field(default_factory=dict)
+    duplicates: int = 0
+    duplicate_bytes: int = 0
+
+
+class ChunkDeduplicator:
+    """Near-duplicate chunk detection with MinHash signatures and LSH banding.
+
+    Signatures, band buckets and the extra source files of every canonical
+    chunk live in SQLite next to the vector store, so chunks of later updates
+    are matched against everything already indexed. Chunks are only merged
+    within the same access level, and only when they contain the same
+    numbers in the same order, so ACL filters keep their meaning and two
+    revisions that differ in a figure or a date stay apart; the
+    files sharing a chunk are listed in its `source_files` metadata. When a
+    file's level changes, `sync_access_levels` detaches it from chunks at
+    another level so it can be re-indexed on its own.
+    """
+
+    def __init__(self, db_path: str, config: DedupConfig):
+        self.config = config
+        self.bands, self.rows = lsh_params(config.num_perm, config.threshold)
+        rng = np.random.default_rng(config.seed)
+        self._a = rng.integers(1, 2**32 - 1, size=config.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2**32 - 1, size=config.num_perm, dtype=np.uint64)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS signatures (node_id TEXT PRIMARY KEY, file_name TEXT, access_level TEXT, signature BLOB);
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, bucket INTEGER, node_id TEXT);
+            CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, bucket);
+            CREATE INDEX IF NOT EXISTS bands_node ON bands (node_id);
+            CREATE INDEX IF NOT EXISTS signatures_file ON signatures (file_name);
+            CREATE TABLE IF NOT EXISTS sources (node_id TEXT, file_name TEXT, PRIMARY KEY (node_id, file_name));
+            CREATE INDEX IF NOT EXISTS sources_file ON sources (file_name);
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(signatures)")}
+        if "numbers" not in columns:
+            # Chunks stored before number fingerprints (NULL) are never matched again
+            self._conn.execute("ALTER TABLE signatures ADD COLUMN numbers INTEGER")
+            self._conn.commit()
+
+    def signature(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower())
+        k = self.config.shingle_size
+        shingles = {" ".join(words[i:i + k]) for i in range(max(len(words) - k + 1, 1))}
+        x = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+        hashed = (self._a[:, None] * x[None, :] + self._b[:, None]) & MASK_32
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _buckets(self, signature: np.ndarray) -> list[int]:
+        return [
+            int.from_bytes(hashlib.blake2b(signature[i * self.rows:(i + 1) * self.rows].tobytes(), digest_size=8).digest(), "big", signed=True)
+            for i in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.mean(a == b))
+
+    def _stored_match(self, signature: np.ndarray, buckets: list[int], access_level: str, numbers: int) -> str | None:
+        seen = set()
+        for band, bucket in enumerate(buckets):
+            for (node_id,) in self._conn.execute("SELECT node_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)):
+                if node_id in seen:
+                    continue
+                seen.add(node_id)
+                row = self._conn.execute(
+                    "SELECT signature FROM signatures WHERE node_id = ? AND access_level = ? AND numbers = ?",
+                    (node_id, access_level, numbers)
+                ).fetchone()
+                if row and self.similarity(signature, np.frombuffer(row[0], dtype=np.uint32)) >= self.config.threshold:
+                    return node_id
+        return None
+
+    def plan(self, nodes: list) -> DedupPlan:
+        """Split nodes into canonical chunks to embed and duplicates to fold into existing ones."""
+        plan = DedupPlan()
+        batch_buckets: dict[tuple[int, int], list[int]] = {}
+        with self._lock:
+            for node in nodes:
+                text = node.get_content()
+                file_name = node.metadata.get("file_name")
+                access_level = node.metadata.get("access_level")
+                signature = self.signature(text)
+                numbers = number_fingerprint(text)
+                buckets = self._buckets(signature)
+
+                match = None
+                for band, bucket in enumerate(buckets):
+                    for i in batch_buckets.get((band, bucket), []):
+                        other = plan.kept[i]
+                        if other.metadata.get("access_level") == access_level and plan.numbers[other.node_id] == numbers and \
+                                self.similarity(signature, plan.signatures[other.node_id]) >= self.config.threshold:
+                            match = other
+                            break
+                    if match is not None:
+                        break
+
+                if match is not None:
+                    files = split_sources(match.metadata.get("source_files")) or [match.metadata.get("file_name")]
+                    match.metadata["source_files"] = join_sources(files + [file_name])
+                elif (stored := self._stored_match(signature, buckets, access_level, numbers)) is not None:
+                    plan.shared.setdefault(stored, set()).add(file_name)
+                else:
+                    node.excluded_embed_metadata_keys = list(set(node.excluded_embed_metadata_keys) | {"source_files"})
+                    node.excluded_llm_metadata_keys = list(set(node.excluded_llm_metadata_keys) | {"source_files"})
+                    plan.signatures[node.node_id] = signature
+                    plan.numbers[node.node_id] = numbers
+                    for band, bucket in enumerate(buckets):
+                        batch_buckets.setdefault((band, bucket), []).append(len(plan.kept))
+                    plan.kept.append(node)
+                    continue
+
+                plan.duplicates += 1
+                plan.duplicate_bytes += len(text.encode())
+        return plan
+
+    def commit(self, plan: DedupPlan, backend) -> None:
+        """Record the kept chunks and add new sources to stored ones, once they are in the vector store."""
+        with self._lock:
+            for node in plan.kept:
+                signature = plan.signatures[node.node_id]
+                owner = node.metadata.get("file_name")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO signatures (node_id, file_name, access_level, signature, numbers) VALUES (?, ?, ?, ?, ?)",
+                    (node.node_id, owner, node.metadata.get("access_level"), signature.tobytes(), plan.numbers[node.node_id])
+                )
+                self._conn.executemany(
+                    "INSERT INTO bands VALUES (?, ?, ?)",
+                    [(band, bucket, node.node_id) for band, bucket in enumerate(self._buckets(signature))]
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO sources VALUES (?, ?)",
+                    [(node.node_id, f) for f in split_sources(node.metadata.get("source_files")) if f != owner]
+                )
+
+            updates = {}
+            for node_id, files in plan.shared.items():
+                owner = self._conn.execute("SELECT file_name FROM signatures WHERE node_id = ?", (node_id,)).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO sources VALUES (?, ?)", [(node_id, f) for f in files if f != owner]
+                )
+                updates[node_id] = {"source_files": join_sources([owner] + self._sources(node_id))}
+            self._conn.commit()
+        if updates:
+            backend.update_metadata(updates)
+
+    def _sources(self, node_id: str) -> list[str]:
+        return [r[0] for r in self._conn.execute("SELECT file_name FROM sources WHERE node_id = ?", (node_id,))]
+
+    def shared_ids(self, file_names: list[str]) -> set[str]:
+        """Canonical chunks owned by other files that the given files also contain."""
+        if not file_names:
+            return set()
+        placeholders = ", ".join("?" * len(file_names))
+        return {r[0] for r in self._conn.execute(f"SELECT node_id FROM sources WHERE file_name IN ({placeholders})", file_names)}
+
+    def remove_file(self, file_name: str, backend, access_config: dict | None = None, default_access: str = DEFAULT_ACCESS_LEVEL) -> set[str]:
+        """Detach a file before its chunks are deleted; shared chunks it owns move to another source.
+
+        With `access_config`, a chunk is only handed to a source at the
+        chunk's own access level; sources whose level differs lose the shared
+        copy. Returns those files, which need re-indexing to get their own.
+        """
+        def level(f: str) -> str:
+            return access_config.get(f, default_access)
+
+        updates, detached = {}, set()
+        with self._lock:
+            owned = self._conn.execute(
+                "SELECT node_id, access_level FROM signatures WHERE file_name = ?", (file_name,)
+            ).fetchall()
+            for node_id, access_level in owned:
+                others = sorted(self._sources(node_id))
+                if access_config is not None:
+                    moved = [f for f in others if level(f) != access_level]
+                    self._conn.executemany("DELETE FROM sources WHERE node_id = ? AND file_name = ?", [(node_id, f) for f in moved])
+                    detached.update(moved)
+                    others = [f for f in others if f not in moved]
+                if others:
+                    new_owner = others[0]
+                    self._conn.execute("UPDATE signatures SET file_name = ? WHERE node_id = ?", (new_owner, node_id))
+                    self._conn.execute("DELETE FROM sources WHERE node_id = ? AND file_name = ?", (node_id, new_owner))
+                    updates[node_id] = {"file_name": new_owner, "source_files": join_sources(others)}
+                else:
+                    self._conn.execute("DELETE FROM signatures WHERE node_id = ?", (node_id,))
+                    self._conn.execute("DELETE FROM bands WHERE node_id = ?", (node_id,))
+
+            shared = [r[0] for r in self._conn.execute("SELECT node_id FROM sources WHERE file_name = ?", (file_name,))]
+            self._conn.execute("DELETE FROM sources WHERE file_name = ?", (file_name,))
+            for node_id in shared:
+                owner = self._conn.execute("SELECT file_name FROM signatures WHERE node_id = ?", (node_id,)).fetchone()
+                if owner:
+                    updates[node_id] = {"source_files": join_sources([owner[0]] + self._sources(node_id))}
+            self._conn.commit()
+        if updates:
+            backend.update_metadata(updates)
+        return detached - {file_name}
+
+    def sync_access_levels(self, access_config: dict, backend, default_access: str = DEFAULT_ACCESS_LEVEL) -> set[str]:
+        """Move canonical chunks to their owner's level and detach sources now at another level.
+
+        A chunk stored once for several files carries its owner's access
+        level. When a source file's level no longer matches (either file was
+        re-classified), it is removed from the chunk's `source_files`, so its
+        content is neither left at the old level nor exposed at the new one.
+        Returns the detached files; they must be re-indexed to get their own
+        copy at their current level.
+        """
+        def level(f: str) -> str:
+            return access_config.get(f, default_access)
+
+        updates, detached = {}, set()
+        with self._lock:
+            files = [r[0] for r in self._conn.execute("SELECT DISTINCT file_name FROM signatures")]
+            self._conn.executemany(
+                "UPDATE signatures SET access_level = ? WHERE file_name = ?", [(level(f), f) for f in files]
+            )
+            rows = self._conn.execute(
+                "SELECT s.node_id, s.file_name, g.file_name, g.access_level FROM sources s JOIN signatures g ON g.node_id = s.node_id"
+            ).fetchall()
+            changed = {}
+            for node_id, source, owner, access_level in rows:
+                if level(source) != access_level:
+                    self._conn.execute("DELETE FROM sources WHERE node_id = ? AND file_name = ?", (node_id, source))
+                    detached.add(source)
+                    changed[node_id] = owner
+            for node_id, owner in changed.items():
+                updates[node_id] = {"source_files": join_sources([owner] + self._sources(node_id))}
+            self._conn.commit()
+        if updates:
+            backend.update_metadata(updates)
+        return detached
+
+    def reset(self):
+        with self._lock:
+            self._conn.executescript("DELETE FROM signatures; DELETE FROM bands; DELETE FROM sources;")
@@ -1,84 +1,222 @@
-import fitz
-import io
 import re
 import os
-import pymupdf
-import markdown
-import docx
-import json
-import pandas as pd
-from PIL import Image
-from src.image_captioning import caption_image, caption_image_groq
+import time
+import mimetypes
+import zipfile
+from collections import deque
+from collections.abc import Iterator, Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from llama_index.core import Document
-from bs4 import BeautifulSoup
+from src.profiling import profiler, detach_profiler
+from src.config import settings
+
+# Parsing libraries (pymupdf, pandas, openpyxl, docx, markdown, bs4) and the
+# captioning SDKs are imported inside the loaders that need them, so importing
+# this module, and starting the chat, does not pay for formats never used.
 
 ACCESS_CONTROL_CONFIG = {}
+# Level of a file missing from the access config, everywhere levels are assigned or synced
+DEFAULT_ACCESS_LEVEL = "private"
 
 def set_access_control_config(config: dict):
     global ACCESS_CONTROL_CONFIG
     ACCESS_CONTROL_CONFIG = config
 
+def extract_page_images(page) -> list[bytes]:
+    images = []
+    for img in page.get_images(full=True):
+        base_image = page.parent.extract_image(img[0])
+        images.append(base_image["image"])
+    return images
+
+def _caption(images: list[bytes], known: dict[int, str] | None = None) -> tuple[list[str], dict, dict[int, str]]:
+    """One description per image ("" where dropped or failed), the triage stats and the new captions by dHash.
+
+    Images are triaged first (tiny/flat ones dropped, near-duplicates share a
+    caption, the rest shrunk), then captioned in as few requests as possible.
+    Images matching a hash in `known` (captioned earlier in the same file)
+    reuse that description.
+    """
+    from src.image_captioning import get_captioning_service, describe
+    from src.image_triage import triage
+    if not images:
+        return [], {}, {}
+    known = known or {}
+    result = triage(images, settings.image_triage, known)
+    captions = get_captioning_service().caption_many(result.kept) if result.kept else []
+    descriptions = [describe(c) if c else "" for c in captions]
+    captioned = {h: d for h, d in zip(result.hashes, descriptions) if h is not None and d}
+    output = [
+        known[result.reused[i]] if i in result.reused else (descriptions[k] if k is not None else "")
+        for i, k in enumerate(result.mapping)
+    ]
+    return output, result.stats, captioned
+
+def count_triage(stats: dict):
+    for name, value in stats.items():
+        profiler.count(name, value)
+
+def caption_images(images: list[bytes], file_name: str | None = None) -> list[str]:
+    with profiler.stage("captioning", file_name, bytes_in=sum(map(len, images)), items_in=len(images)) as record:
+        descriptions, stats, _ = _caption(images)
+        record["items_out"] = sum(bool(d) for d in descriptions)
+    count_triage(stats)
+    return descriptions
+
 def get_images_description(page) -> str:
-    image_list = page.get_images(full=True)
-    descriptions = []
-
-    for image_index, img in enumerate(image_list, start=1):
-        xref = img[0]
-        base_image = page.parent.extract_image(xref)
-        image_bytes = base_image["image"]
-        caption = caption_image_groq(image_bytes)
-        if not caption:
-            continue
-        desc_str = (
-            f"Image: {caption.image_name} "
-            f"Type: {caption.image_type} "
-            f"Description: {caption.image_description}"
-        )
-        descriptions.append(desc_str)
-
-    if not descriptions:
-        return ""
+    descriptions = caption_images(extract_page_images(page), os.path.basename(page.parent.name))
+    return '\n'.join(d for d in descriptions if d)
 
-    result = '\n'.join(descriptions)
-    return result
+_HEADING_MARKER = re.compile(r'^\s*(#{1,6})\s+')
 
-def clean_text(text: str) -> str:
-    text = re.sub(r'[^\w\s\.]', '', text)
-    text = text.replace('\n', ' ')
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+def clean_text(text: str, keep_structure: bool = False) -> str:
+    """Strip symbols and collapse whitespace.
+
+    With `keep_structure`, lines and blank-line paragraph breaks survive and
+    Markdown heading lines keep their `#` marker, so the structural splitter
+    can still see them; cleaning that result again without it gives the
+    flat text the semantic splitter works on.
+    """
+    with profiler.stage("clean_text", bytes_in=len(text)):
+        if not keep_structure:
+            text = re.sub(r'[^\w\s\.]', '', text)
+            text = text.replace('\n', ' ')
+            text = re.sub(r'\s+', ' ', text)
+            return text.strip()
+        lines = []
+        for line in text.splitlines():
+            marker = _HEADING_MARKER.match(line)
+            line = re.sub(r'\s+', ' ', re.sub(r'[^\w\s\.]', '', line)).strip()
+            lines.append(f"{marker.group(1)} {line}" if marker and line else line)
+        return re.sub(r'\n{3,}', '\n\n', "\n".join(lines)).strip()
 
 def clean_markdown(md_text: str) -> str:
+    """Markdown to plain text, with headings as `#` lines and blocks separated by blank lines."""
+    import markdown
+    from bs4 import BeautifulSoup
     html = markdown.markdown(md_text)
     soup = BeautifulSoup(html, "html.parser")
+    for level in range(1, 7):
+        for heading in soup.find_all(f"h{level}"):
+            heading.insert(0, f"\n\n{'#' * level} ")
+    for block in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "pre", "blockquote", "tr"]):
+        block.append("\n\n")
     text = soup.get_text(separator=' ')
     return text.strip()
 
-def get_document_from_pdf(path_to_pdf: str) -> Document:
-    doc = pymupdf.open(path_to_pdf)
-    text = ' '.join([page.get_text() + ' ' +  get_images_description(page) for page in doc])
-    text = clean_text(text)
+def _extract_pdf_pages(path_to_pdf: str, start: int, stop: int, known: dict[int, str] | None = None) -> list[dict]:
+    """Extract pages [start, stop) of a PDF; runs in a worker process that opens the file itself.
+
+    Images from the whole range are captioned together so requests carry
+    several images each, then their descriptions are put back on their page.
+    `known` maps dHashes already captioned in earlier ranges to their
+    descriptions; the range's new ones are returned on the first page.
+    """
+    import pymupdf
+    pages, images, owners = [], [], []
+    with pymupdf.open(path_to_pdf) as doc:
+        for number in range(start, stop):
+            page = doc[number]
+            start_time = time.perf_counter()
+            # Text blocks become blank-line separated paragraphs; a heading is usually a block of its own
+            page_text = "\n\n".join(b[4].strip() for b in page.get_text("blocks") if b[6] == 0)
+            page_images = extract_page_images(page)
+            images.extend(page_images)
+            owners.extend([len(pages)] * len(page_images))
+            pages.append({"page_number": number + 1, "text": page_text, "pdf_text_s": time.perf_counter() - start_time})
+
+    start_time = time.perf_counter()
+    descriptions, triage_stats, captioned = _caption(images, known)
+    captioning_s = time.perf_counter() - start_time
+    per_page = [[] for _ in pages]
+    for owner, description in zip(owners, descriptions):
+        if description:
+            per_page[owner].append(description)
+
+    for page, page_descriptions in zip(pages, per_page):
+        page["text"] = clean_text("\n\n".join([page["text"]] + page_descriptions), keep_structure=True)
+    if pages:
+        pages[0]["captioning_s"] = captioning_s
+        pages[0]["images"] = len(images)
+        pages[0]["captions"] = sum(bool(d) for d in descriptions)
+        pages[0]["triage"] = triage_stats
+        pages[0]["captioned"] = captioned
+    return pages
+
+def _pdf_page_document(path_to_pdf: str, page: dict, page_count: int) -> Document:
     file_name = os.path.basename(path_to_pdf)
     return Document(
-        text=text,
+        text=page["text"],
         metadata={
             "file_path": path_to_pdf,
-            "file_name": os.path.basename(path_to_pdf),
-            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, "private")
+            "file_name": file_name,
+            "page_number": page["page_number"],
+            "page_count": page_count,
+            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, DEFAULT_ACCESS_LEVEL)
         }
     )
 
+def iter_pdf_pages(path_to_pdf: str, workers: int | None = None, pages_per_task: int | None = None) -> Iterator[Document]:
+    """Yield one Document per PDF page, in page order.
+
+    Page ranges are parsed in worker processes; at most two ranges per worker
+    are in flight, so memory stays bounded regardless of the page count.
+    """
+    import pymupdf
+    config = settings.ingestion
+    workers = workers if workers is not None else (config.pdf_workers or os.cpu_count() or 1)
+    pages_per_task = pages_per_task or config.pdf_pages_per_task
+    file_name = os.path.basename(path_to_pdf)
+
+    with pymupdf.open(path_to_pdf) as doc:
+        page_count = doc.page_count
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    workers = min(workers, len(ranges))
+    # dHash -> description for images captioned so far: a logo on every page is captioned
+    # once per PDF (once per range in flight when ranges run in parallel), not once per range
+    known: dict[int, str] = {}
+
+    def collect(pages):
+        if pages:
+            known.update(pages[0].get("captioned", {}))
+        return pages
+
+    def emit(pages):
+        for page in pages:
+            profiler.add("pdf_text", page["pdf_text_s"], file_name, items_in=1, items_out=1)
+            if page.get("images"):
+                profiler.add("captioning", page["captioning_s"], file_name, items_in=page["images"], items_out=page["captions"])
+                count_triage(page["triage"])
+            if page["text"]:
+                yield _pdf_page_document(path_to_pdf, page, page_count)
+
+    if workers <= 1:
+        for start, stop in ranges:
+            yield from emit(collect(_extract_pdf_pages(path_to_pdf, start, stop, known)))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=detach_profiler) as pool:
+        remaining = iter(ranges)
+        pending = deque(pool.submit(_extract_pdf_pages, path_to_pdf, *r) for _, r in zip(range(workers * 2), remaining))
+        while pending:
+            pages = collect(pending.popleft().result())
+            next_range = next(remaining, None)
+            if next_range is not None:
+                pending.append(pool.submit(_extract_pdf_pages, path_to_pdf, *next_range, dict(known)))
+            yield from emit(pages)
+
 def get_document_from_txt(path_to_txt: str) -> Document:
     with open(path_to_txt, "r", encoding="utf-8") as f:
         text = f.read()
-    text = clean_text(text)
+    text = clean_text(text, keep_structure=True)
     file_name = os.path.basename(path_to_txt)
     return Document(
         text=text,
         metadata={
             "file_path": path_to_txt,
             "file_name": file_name,
-            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, "private")
+            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, DEFAULT_ACCESS_LEVEL)
         }
     )
 
@@ -87,77 +225,125 @@ def get_document_from_md(path_to_md: str) -> Document:
         text = f.read()
 
     cleaned_markdown = clean_markdown(text)
-    cleaned_text = clean_text(cleaned_markdown)
+    cleaned_text = clean_text(cleaned_markdown, keep_structure=True)
     file_name = os.path.basename(path_to_md)
     return Document(
         text=cleaned_text,
         metadata={
             "file_path": path_to_md,
             "file_name": file_name,
-            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, "private")
+            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, DEFAULT_ACCESS_LEVEL)
         }
     )
 
 def get_document_from_docx(path_to_docx: str) -> Document:
+    import docx
     doc = docx.Document(path_to_docx)
     text_content = []
 
     for para in doc.paragraphs:
         if para.text.strip():
-            text_content.append(para.text)
+            style = para.style.name if para.style is not None else ""
+            level = style.removeprefix("Heading").strip()
+            # Word heading styles become Markdown heading lines for the structural splitter
+            text_content.append(f"{'#' * min(int(level), 6)} {para.text}" if level.isdigit() else para.text)
 
     if doc.tables:
-        text_content.append("\n--- TABLES DATA ---\n")
+        text_content.append("--- TABLES DATA ---")
         for table in doc.tables:
-            for row in table.rows:
-                row_text = [cell.text.strip() for cell in row.cells]
-                text_content.append(" | ".join(row_text))
-            text_content.append("")
+            # One paragraph per table, one line per row
+            text_content.append("\n".join(" | ".join(cell.text.strip() for cell in row.cells) for row in table.rows))
 
-    full_text = "\n".join(text_content)
+    full_text = "\n\n".join(text_content)
     file_name = os.path.basename(path_to_docx)
-    cleaned_text = clean_text(full_text)
+    cleaned_text = clean_text(full_text, keep_structure=True)
     return Document(
         text=cleaned_text,
         metadata={
             "file_path": path_to_docx,
             "file_name": file_name,
-            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, "private")
+            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, DEFAULT_ACCESS_LEVEL)
         }
     )
 
-def get_document_from_csv(path_to_csv: str) -> Document:
-    df = pd.read_csv(path_to_csv)
-    text = df.to_string()
-    text = clean_text(text)
-    file_name = os.path.basename(path_to_csv)
-    return Document(
-        text=text,
-        metadata={
-            "file_path": path_to_csv,
-            "file_name": file_name,
-            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, "private")
-        }
-    )
+def _format_cell(value) -> str:
+    if value is None:
+        return ""
+    return re.sub(r'\s+', ' ', str(value)).strip()
 
-def get_document_from_xlsx(path_to_xlsx: str) -> Document:
-    df = pd.read_excel(path_to_xlsx)
-    text = df.to_string()
-    text = clean_text(text)
-    file_name = os.path.basename(path_to_xlsx)
-    return Document(
-        text=text,
-        metadata={
-            "file_path": path_to_xlsx,
-            "file_name": file_name,
-            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, "private")
-        }
-    )
+def _table_batch_document(path_to_table: str, header: list[str], rows: list[list[str]], row_start: int, sheet_name: str | None = None) -> Document:
+    # The header is repeated in every batch so each chunk is readable on its own
+    lines = [" | ".join(header)]
+    lines.extend(" | ".join(row) for row in rows)
+    file_name = os.path.basename(path_to_table)
+    metadata = {
+        "file_path": path_to_table,
+        "file_name": file_name,
+        "row_start": row_start,
+        "row_end": row_start + len(rows) - 1,
+        "access_level": ACCESS_CONTROL_CONFIG.get(file_name, DEFAULT_ACCESS_LEVEL)
+    }
+    if sheet_name is not None:
+        metadata["sheet_name"] = sheet_name
+    return Document(text="\n".join(lines), metadata=metadata)
+
+def iter_csv_rows(path_to_csv: str, rows_per_batch: int | None = None) -> Iterator[tuple[list[str], list[list[str]]]]:
+    """Yield (header, rows) batches of formatted cells; only one batch is held in memory at a time."""
+    import pandas as pd
+    rows_per_batch = rows_per_batch or settings.ingestion.table_rows_per_batch
+    with pd.read_csv(path_to_csv, chunksize=rows_per_batch, dtype=str, keep_default_na=False) as reader:
+        for chunk in reader:
+            header = [_format_cell(c) for c in chunk.columns]
+            yield header, [[_format_cell(v) for v in row] for row in chunk.itertuples(index=False, name=None)]
+
+def iter_xlsx_rows(path_to_xlsx: str, rows_per_batch: int | None = None) -> Iterator[tuple[str, list[str], list[list[str]]]]:
+    """Yield (sheet_name, header, rows) batches from every sheet via openpyxl's read-only mode."""
+    import openpyxl
+    rows_per_batch = rows_per_batch or settings.ingestion.table_rows_per_batch
+    workbook = openpyxl.load_workbook(path_to_xlsx, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            header, rows = None, []
+            for values in sheet.iter_rows(values_only=True):
+                cells = [_format_cell(v) for v in values]
+                if not any(cells):
+                    continue
+                if header is None:
+                    header = cells
+                    continue
+                rows.append(cells)
+                if len(rows) >= rows_per_batch:
+                    yield sheet.title, header, rows
+                    rows = []
+            if rows:
+                yield sheet.title, header, rows
+    finally:
+        workbook.close()
+
+def iter_csv_batches(path_to_csv: str, rows_per_batch: int | None = None) -> Iterator[Document]:
+    """Yield one Document per batch of rows."""
+    row_start = 1
+    for header, rows in iter_csv_rows(path_to_csv, rows_per_batch):
+        yield _table_batch_document(path_to_csv, header, rows, row_start)
+        row_start += len(rows)
+
+def iter_xlsx_batches(path_to_xlsx: str, rows_per_batch: int | None = None) -> Iterator[Document]:
+    """Yield row batches from every sheet of a workbook."""
+    current_sheet, row_start = None, 1
+    for sheet_name, header, rows in iter_xlsx_rows(path_to_xlsx, rows_per_batch):
+        if sheet_name != current_sheet:
+            current_sheet, row_start = sheet_name, 1
+        yield _table_batch_document(path_to_xlsx, header, rows, row_start, sheet_name)
+        row_start += len(rows)
 
 def get_document_from_image(path_to_image: str) -> Document | None:
+    from src.image_captioning import caption_image
+    from src.image_triage import prepare_for_upload
     with open(path_to_image, "rb") as f:
         image_bytes = f.read()
-    caption = caption_image(image_bytes)
+    upload = prepare_for_upload(image_bytes, settings.image_triage)
+    profiler.count("image_bytes_saved", len(image_bytes) - len(upload))
+    caption = caption_image(upload)
     if not caption:
         return None
     text = (
@@ -171,6 +357,114 @@ def get_document_from_image(path_to_image: str) -> Document | None:
         metadata={
             "file_path": path_to_image,
             "file_name": file_name,
-            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, "private")
+            "access_level": ACCESS_CONTROL_CONFIG.get(file_name, DEFAULT_ACCESS_LEVEL)
         }
     )
+
+
+@dataclass(frozen=True)
+class Loader:
+    name: str
+    extensions: tuple[str, ...]
+    mime_types: tuple[str, ...]
+    load: Callable[[str], Iterator[Document]]
+    tabular: bool = False
+
+
+LOADERS: list[Loader] = []
+_BY_EXTENSION: dict[str, Loader] = {}
+_BY_MIME: dict[str, Loader] = {}
+
+def register_loader(name: str, extensions: tuple[str, ...], mime_types: tuple[str, ...] = (), tabular: bool = False):
+    """Register `fn(path) -> Document | Iterable[Document] | None` for the given extensions and MIME types.
+
+    The registered `load` yields documents lazily, so streaming readers (PDF
+    page ranges, CSV/XLSX row batches) are never collected into a list.
+    """
+    def register(fn):
+        def load(path: str) -> Iterator[Document]:
+            result = fn(path)
+            if result is None:
+                return iter(())
+            if isinstance(result, Document):
+                return iter([result])
+            return (d for d in result if d is not None)
+
+        loader = Loader(name, tuple(e.lower() for e in extensions), mime_types, load, tabular)
+        LOADERS.append(loader)
+        for ext in loader.extensions:
+            _BY_EXTENSION[ext] = loader
+        for mime in mime_types:
+            _BY_MIME[mime] = loader
+        return fn
+    return register
+
+# Magic bytes shared by file sniffing here and image MIME detection in src.image_captioning
+_SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+]
+_OOXML = {
+    "word/": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xl/": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def mime_from_bytes(head: bytes) -> str | None:
+    """MIME type from magic bytes at the start of a file or image buffer."""
+    for signature, mime in _SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+def sniff_mime(path: str) -> str | None:
+    """MIME type from the file's magic bytes, falling back to the extension."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(16)
+    except OSError:
+        return None
+    mime = mime_from_bytes(head)
+    if mime:
+        return mime
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                names = archive.namelist()
+            for prefix, mime in _OOXML.items():
+                if any(n.startswith(prefix) for n in names):
+                    return mime
+        except zipfile.BadZipFile:
+            pass
+    return mimetypes.guess_type(path)[0]
+
+def get_loader(path: str, sniff: bool = True) -> Loader | None:
+    """Loader for a file: by extension, or by sniffed MIME type when the extension is missing or unknown.
+
+    Known extensions are trusted without opening the file, so state scans
+    over the data folder do not read (or unzip) every document.
+    """
+    loader = _BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+    if loader is not None or not sniff:
+        return loader
+    return _BY_MIME.get(sniff_mime(path) or "")
+
+def is_supported(path: str) -> bool:
+    return get_loader(path) is not None
+
+register_loader("PDF", (".pdf",), ("application/pdf",))(iter_pdf_pages)
+register_loader("TXT", (".txt",), ("text/plain",))(get_document_from_txt)
+register_loader("MD", (".md", ".markdown"), ("text/markdown",))(get_document_from_md)
+register_loader("DOCX", (".docx",), (_OOXML["word/"],))(get_document_from_docx)
+register_loader("CSV", (".csv",), ("text/csv",), tabular=True)(iter_csv_batches)
+register_loader("XLSX", (".xlsx",), (_OOXML["xl/"],), tabular=True)(iter_xlsx_batches)
+register_loader(
+    "IMAGE", (".png", ".jpg", ".jpeg", ".bmp", ".gif"), ("image/png", "image/jpeg", "image/gif", "image/bmp")
+)(get_document_from_image)
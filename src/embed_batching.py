@@ -0,0 +1,57 @@
+from llama_index.core.embeddings import BaseEmbedding
+
+
+def token_lengths(model: BaseEmbedding, texts: list[str]) -> list[int]:
+    """Token count per text with the model's own tokenizer (truncated like the model), or a rough estimate."""
+    encoder = getattr(model, "_model", None)
+    tokenizer = getattr(encoder, "tokenizer", None)
+    if tokenizer is None:
+        return [len(text) // 4 + 2 for text in texts]
+    max_length = getattr(encoder, "max_seq_length", None) or 512
+    encoded = tokenizer(texts, add_special_tokens=True, truncation=True, max_length=max_length)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def plan_batches(lengths: list[int], token_budget: int, max_batch: int) -> list[list[int]]:
+    """Group text indices by length so that a batch's padded size (count x longest) stays within the budget."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches, batch, longest = [], [], 0
+    for i in order:
+        # Longest first: the first text of a batch sets its padded length
+        width = max(longest, lengths[i])
+        if batch and ((len(batch) + 1) * width > token_budget or len(batch) >= max_batch):
+            batches.append(batch)
+            batch, width = [], lengths[i]
+        batch.append(i)
+        longest = width
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def embed_texts(model: BaseEmbedding, texts: list[str], token_budget: int = 16384, max_batch: int = 128) -> tuple[list[list[float]], dict]:
+    """Embed texts in length-bucketed batches; results come back in input order.
+
+    The model's `embed_batch_size` should be at least `max_batch`, so every
+    planned batch is one forward pass.
+    """
+    if not texts:
+        return [], {"batches": 0, "tokens": 0, "padded_tokens": 0}
+    lengths = token_lengths(model, texts)
+    batches = plan_batches(lengths, token_budget, max_batch)
+    embeddings: list = [None] * len(texts)
+    padded = 0
+    for batch in batches:
+        vectors = model._get_text_embeddings([texts[i] for i in batch])
+        for i, vector in zip(batch, vectors):
+            embeddings[i] = vector
+        padded += len(batch) * max(lengths[i] for i in batch)
+    return embeddings, {"batches": len(batches), "tokens": sum(lengths), "padded_tokens": padded}
+
+
+def arrival_order_padding(lengths: list[int], batch_size: int) -> int:
+    """Padded tokens of fixed-size batches in arrival order, for comparison."""
+    return sum(
+        len(lengths[i:i + batch_size]) * max(lengths[i:i + batch_size])
+        for i in range(0, len(lengths), batch_size)
+    )
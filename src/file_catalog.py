@@ -0,0 +1,175 @@
+import os
+import bisect
+import difflib
+import fnmatch
+import sqlite3
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from src.dedup import split_sources
+
+GLOB_CHARS = "*?["
+
+
+@dataclass
+class Resolution:
+    """Files an @token matched, or close names when it matched nothing."""
+    token: str
+    files: list[str] = field(default_factory=list)
+    suggestions: list[str] = field(default_factory=list)
+
+
+class FileCatalog:
+    """File name -> chunk id index, kept up to date by ingestion.
+
+    Ids live in SQLite next to the vector store; the file names are held in
+    memory as a sorted, lower-cased list, so `@` tokens resolve by exact
+    name, glob or prefix with a bisect instead of a metadata scan. A file's
+    ids include chunks it shares with other files (see src.dedup), so an id
+    set covers everything a file contributed.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # Bumped on every change, so callers can cache counts derived from the catalog
+        self.version = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS catalog (
+                file_name TEXT NOT NULL,
+                node_id TEXT NOT NULL,
+                PRIMARY KEY (file_name, node_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS catalog_node ON catalog (node_id);
+        """)
+        self._load()
+
+    def _load(self):
+        names = [r[0] for r in self._conn.execute("SELECT DISTINCT file_name FROM catalog")]
+        self._names = {}
+        for name in names:
+            self._names.setdefault(name.lower(), []).append(name)
+        self._sorted = sorted(self._names)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def chunk_count(self, file_names: list[str] | None = None) -> int:
+        """Distinct chunks in the catalog, or only those of `file_names`."""
+        if file_names is None:
+            return self._conn.execute("SELECT COUNT(DISTINCT node_id) FROM catalog").fetchone()[0]
+        with self._lock:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (file_name TEXT PRIMARY KEY)")
+            self._conn.execute("DELETE FROM wanted")
+            self._conn.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", [(f,) for f in file_names])
+            return self._conn.execute(
+                "SELECT COUNT(DISTINCT node_id) FROM catalog JOIN wanted USING (file_name)"
+            ).fetchone()[0]
+
+    def file_names(self) -> list[str]:
+        return [name for key in self._sorted for name in self._names[key]]
+
+    def add(self, entries: dict[str, list[str]]):
+        """Record chunk ids per file name."""
+        rows = [(file_name, node_id) for file_name, ids in entries.items() for node_id in ids if file_name]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO catalog VALUES (?, ?)", rows)
+            self._conn.commit()
+            self.version += 1
+            for file_name in entries:
+                key = file_name.lower()
+                if file_name and file_name not in self._names.get(key, []):
+                    if key not in self._names:
+                        bisect.insort(self._sorted, key)
+                    self._names.setdefault(key, []).append(file_name)
+
+    def add_nodes(self, nodes, shared: dict[str, list[str]] | None = None):
+        """Catalog stored nodes (owner and `source_files`), plus already stored ids newly shared with files."""
+        entries: dict[str, list[str]] = {}
+        for node in nodes:
+            owner = node.metadata.get("file_name")
+            for file_name in {owner, *split_sources(node.metadata.get("source_files"))}:
+                if file_name:
+                    entries.setdefault(file_name, []).append(node.node_id)
+        for node_id, files in (shared or {}).items():
+            for file_name in files:
+                entries.setdefault(file_name, []).append(node_id)
+        self.add(entries)
+
+    def remove_file(self, file_name: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM catalog WHERE file_name = ?", (file_name,))
+            self._conn.commit()
+            self.version += 1
+            key = file_name.lower()
+            names = self._names.get(key, [])
+            if file_name in names:
+                names.remove(file_name)
+            if key in self._names and not names:
+                del self._names[key]
+                self._sorted.pop(bisect.bisect_left(self._sorted, key))
+
+    def reset(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM catalog")
+            self._conn.commit()
+            self.version += 1
+            self._names, self._sorted = {}, []
+
+    def build(self, backend) -> "FileCatalog":
+        """Rebuild from the chunks in the vector store (first start, or after a snapshot import)."""
+        self.reset()
+        batch = []
+        for node in backend.iter_nodes(with_embeddings=False):
+            batch.append(node)
+            if len(batch) >= 1000:
+                self.add_nodes(batch)
+                batch = []
+        if batch:
+            self.add_nodes(batch)
+        return self
+
+    def _with_prefix(self, prefix: str) -> list[str]:
+        start = bisect.bisect_left(self._sorted, prefix)
+        end = bisect.bisect_left(self._sorted, prefix + "\U0010ffff")
+        return self._sorted[start:end]
+
+    def resolve(self, token: str, visible: Callable[[str], bool] | None = None) -> Resolution:
+        """Exact name (case-insensitive), then glob, then prefix; close names if nothing matches.
+
+        With `visible`, files it rejects (another access level) are neither
+        matched nor suggested, so a token never reveals their names.
+        """
+        def names(key: str) -> list[str]:
+            return [name for name in self._names[key] if visible is None or visible(name)]
+
+        resolution = Resolution(token)
+        key = token.lower()
+        if key in self._names:
+            keys = [key]
+        elif any(c in key for c in GLOB_CHARS):
+            # Only names sharing the literal part before the first wildcard need matching
+            literal = key[:min(key.index(c) for c in GLOB_CHARS if c in key)]
+            keys = [k for k in self._with_prefix(literal) if fnmatch.fnmatchcase(k, key)]
+        else:
+            keys = self._with_prefix(key)
+        resolution.files = [name for k in keys for name in names(k)]
+        if token in resolution.files:
+            resolution.files = [token]
+        if not resolution.files:
+            candidates = self._sorted if visible is None else [k for k in self._sorted if names(k)]
+            close = difflib.get_close_matches(key, candidates, n=3, cutoff=0.6)
+            resolution.suggestions = [name for k in close for name in names(k)]
+        return resolution
+
+    def ids(self, file_names: list[str]) -> set[str]:
+        """Chunk ids of the given files, including chunks they share with other files."""
+        if not file_names:
+            return set()
+        placeholders = ", ".join("?" * len(file_names))
+        return {r[0] for r in self._conn.execute(
+            f"SELECT node_id FROM catalog WHERE file_name IN ({placeholders})", file_names
+        )}
@@ -0,0 +1,200 @@
+import os
+import json
+import shutil
+import numpy as np
+from typing import Any
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from src.vector_backends import VectorBackend
+
+BLOCK_SIZE = 65_536
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class FlatIndex:
+    """Exact cosine search over a memory-mapped embedding matrix.
+
+    Embeddings are mirrored from the vector backend into `embeddings.npy`
+    (float16 or float32) and `access_level` is kept as an integer code array,
+    so the ACL filter becomes a vectorized mask instead of a metadata scan;
+    file filters arrive as chunk id sets from the file catalog.
+    """
+
+    def __init__(self, directory: str, dtype: str = "float16"):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self._embeddings = None
+        self._ids = None
+        self._access_codes = None
+        self._access_vocab = {}
+        self._positions = None
+
+    @property
+    def _embeddings_path(self) -> str:
+        return os.path.join(self.directory, "embeddings.npy")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def __len__(self) -> int:
+        return 0 if self._ids is None else len(self._ids)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._embeddings_path) and os.path.exists(self._meta_path)
+
+    def invalidate(self):
+        self._embeddings = None
+        self._ids = None
+        self._positions = None
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, ids: list[str], embeddings: np.ndarray, metadatas: list[dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        matrix = np.lib.format.open_memmap(
+            self._embeddings_path, mode="w+", dtype=self.dtype, shape=embeddings.shape
+        )
+        for i in range(0, len(embeddings), BLOCK_SIZE):
+            matrix[i:i + BLOCK_SIZE] = normalize(embeddings[i:i + BLOCK_SIZE]).astype(self.dtype)
+        matrix.flush()
+        del matrix
+        self._write_meta(ids, metadatas)
+        self.load()
+
+    def build(self, backend: VectorBackend) -> "FlatIndex":
+        """Mirror all embeddings of the backend into the flat matrix, streaming."""
+        total = backend.count()
+        os.makedirs(self.directory, exist_ok=True)
+        matrix = None
+        ids, metadatas = [], []
+
+        for i, node in enumerate(backend.iter_nodes(with_embeddings=True)):
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(
+                    self._embeddings_path, mode="w+", dtype=self.dtype, shape=(total, len(node.embedding))
+                )
+            if i >= total:
+                break
+            matrix[i] = normalize(node.embedding).astype(self.dtype)
+            ids.append(node.node_id)
+            metadatas.append(node.metadata)
+
+        if matrix is None:
+            self.invalidate()
+            return self
+        matrix.flush()
+        del matrix
+        self._write_meta(ids, metadatas)
+        self.load()
+        return self
+
+    def _write_meta(self, ids: list[str], metadatas: list[dict]):
+        with open(self._meta_path, "w") as f:
+            json.dump({
+                "ids": ids,
+                "access_level": [m.get("access_level") for m in metadatas],
+            }, f)
+
+    def load(self) -> bool:
+        if not self.exists():
+            return False
+        with open(self._meta_path, "r") as f:
+            meta = json.load(f)
+        self._ids = np.array(meta["ids"])
+        self._embeddings = np.load(self._embeddings_path, mmap_mode="r")[:len(self._ids)]
+        self._access_codes, self._access_vocab = self._encode(meta["access_level"])
+        self._positions = None
+        return True
+
+    @staticmethod
+    def _encode(values: list[Any]) -> tuple[np.ndarray, dict]:
+        vocab = {}
+        codes = np.fromiter((vocab.setdefault(v, len(vocab)) for v in values), dtype=np.int32, count=len(values))
+        return codes, vocab
+
+    def _id_mask(self, ids: set[str]) -> np.ndarray:
+        if self._positions is None:
+            # Built on the first id-set search; row lookups then cost one dict probe per id
+            self._positions = {node_id: i for i, node_id in enumerate(self._ids.tolist())}
+        rows = np.fromiter((self._positions[i] for i in ids if i in self._positions), dtype=np.int64)
+        mask = np.zeros(len(self), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def _mask(self, access_level: str | None, ids: set[str] | None = None) -> np.ndarray | None:
+        mask = None
+        if access_level is not None:
+            code = self._access_vocab.get(access_level, -1)
+            mask = self._access_codes == code
+        if ids is not None:
+            # File filters are resolved to chunk ids by src.file_catalog, shared chunks included
+            id_mask = self._id_mask(ids)
+            mask = id_mask if mask is None else mask & id_mask
+        return mask
+
+    def subset_size(self, access_level: str | None = None, ids: set[str] | None = None) -> int:
+        mask = self._mask(access_level, ids)
+        return len(self) if mask is None else int(np.count_nonzero(mask))
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        access_level: str | None = None,
+        ids: set[str] | None = None
+    ) -> tuple[list[str], list[float]]:
+        if not len(self):
+            return [], []
+
+        query_vec = normalize(query)
+        mask = self._mask(access_level, ids)
+        candidates = None if mask is None else np.flatnonzero(mask)
+        size = len(self) if candidates is None else len(candidates)
+        if size == 0:
+            return [], []
+
+        scores = np.empty(size, dtype=np.float32)
+        for start in range(0, size, BLOCK_SIZE):
+            end = min(start + BLOCK_SIZE, size)
+            rows = self._embeddings[start:end] if candidates is None else self._embeddings[candidates[start:end]]
+            scores[start:end] = rows.astype(np.float32, copy=False) @ query_vec
+
+        k = min(top_k, size)
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        positions = top if candidates is None else candidates[top]
+        return self._ids[positions].tolist(), scores[top].tolist()
+
+
+class FlatRetriever(BaseRetriever):
+    def __init__(
+        self,
+        flat_index: FlatIndex,
+        backend: VectorBackend,
+        embed_model,
+        top_k: int,
+        access_level: str | None = None,
+        ids: set[str] | None = None,
+        **kwargs
+    ):
+        self._flat_index = flat_index
+        self._backend = backend
+        self._embed_model = embed_model
+        self._top_k = top_k
+        self._access_level = access_level
+        self._ids = ids
+        super().__init__(**kwargs)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        embedding = query_bundle.embedding or self._embed_model.get_query_embedding(query_bundle.query_str)
+        ids, scores = self._flat_index.search(
+            np.asarray(embedding), self._top_k, self._access_level, self._ids
+        )
+        nodes = {node.node_id: node for node in self._backend.get_nodes(ids=ids)}
+        return [NodeWithScore(node=nodes[i], score=s) for i, s in zip(ids, scores) if i in nodes]
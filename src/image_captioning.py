@@ -1,81 +1,163 @@
-from google import genai
-from google.genai import types
-from groq import Groq
 import base64
 import os
-import os
 import json
+import threading
 from typing import cast
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from src.config import settings, CaptioningConfig
+from src.doc_parser import mime_from_bytes
 
 class Image(BaseModel):
     image_type: str = Field(description="Type of the image, e.g., 'Picture', 'Drawing', 'Plot', etc.")
     image_name: str = Field(description="Name or title of the image.")
     image_description: str = Field(description="A brief description of the image content.")
 
+class ImageList(BaseModel):
+    images: list[Image] = Field(description="One entry per input image, in the order the images were given.")
+
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=GEMINI_API_KEY)
+
+def detect_mime(image_data: bytes) -> str:
+    return mime_from_bytes(image_data[:16]) or "image/jpeg"
 
 def encode_image(image_path):
   with open(image_path, "rb") as image_file:
     return base64.b64encode(image_file.read()).decode('utf-8')
 
-def caption_image(image_data: bytes):
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash-lite',
-            contents=[
-                types.Part.from_bytes(
-                data=image_data,
-                mime_type='image/jpeg',
-                ),
-                'Caption this image'
-            ],
+def _prompt(count: int) -> str:
+    if count == 1:
+        return "Caption this image"
+    return f"Caption each of the {count} images, in the order given. Return exactly {count} entries."
+
+
+class CaptioningService:
+    """Captioning with one long-lived (keep-alive) client per provider.
+
+    `caption_many` packs up to `images_per_request` images into a single
+    multimodal request and parses a structured list back; a batch whose
+    reply does not line up with its images is retried one image at a time.
+    """
+
+    def __init__(self, config: CaptioningConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._clients = {}
+        self.requests = 0
+
+    def _client(self, provider: str):
+        with self._lock:
+            if provider not in self._clients:
+                if provider == "groq":
+                    from groq import Groq
+                    self._clients[provider] = Groq(
+                        api_key=os.environ.get("GROQ_API_KEY"),
+                        base_url=self.config.base_url or None,
+                        timeout=self.config.timeout_s,
+                        max_retries=self.config.max_retries
+                    )
+                else:
+                    from google import genai
+                    self._clients[provider] = genai.Client(api_key=GEMINI_API_KEY)
+            return self._clients[provider]
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                close = getattr(client, "close", None)
+                if close is not None:
+                    close()
+            self._clients.clear()
+
+    def _request_groq(self, images: list[bytes]) -> list[Image]:
+        content = [{"type": "text", "text": _prompt(len(images))}]
+        for image_data in images:
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:{detect_mime(image_data)};base64,{base64.b64encode(image_data).decode('utf-8')}"},
+            })
+        schema = Image if len(images) == 1 else ImageList
+        self.requests += 1
+        chat_completion = self._client("groq").chat.completions.create(
+            messages=[{"role": "user", "content": content}],  # ty:ignore[invalid-argument-type]
+            model=self.config.groq_model,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": schema.__name__.lower(), "schema": schema.model_json_schema()}
+            }  # ty:ignore[invalid-argument-type]
+        )
+        result = json.loads(chat_completion.choices[0].message.content)
+        return [Image(**result)] if schema is Image else ImageList(**result).images
+
+    def _request_gemini(self, images: list[bytes]) -> list[Image]:
+        from google.genai import types
+        parts = [types.Part.from_bytes(data=image_data, mime_type=detect_mime(image_data)) for image_data in images]
+        schema = Image if len(images) == 1 else ImageList
+        self.requests += 1
+        response = self._client("gemini").models.generate_content(
+            model=self.config.gemini_model,
+            contents=[*parts, _prompt(len(images))],
             config={
                 "response_mime_type": "application/json",
-                "response_schema": Image,
+                "response_schema": schema,
             },
         )
-        image: Image = cast(Image, response.parsed)
-    except Exception as e:
-        print(f"🚨 Error captioning image.")
-        return None
+        parsed = response.parsed
+        return [cast(Image, parsed)] if schema is Image else cast(ImageList, parsed).images
+
+    def _request(self, provider: str, images: list[bytes]) -> list[Image]:
+        return self._request_groq(images) if provider == "groq" else self._request_gemini(images)
+
+    def caption_many(self, images: list[bytes], provider: str | None = None) -> list[Image | None]:
+        provider = provider or self.config.provider
+        per_request = max(1, self.config.images_per_request)
+        results: list[Image | None] = []
+        for start in range(0, len(images), per_request):
+            batch = images[start:start + per_request]
+            try:
+                captions = self._request(provider, batch)
+            except Exception as e:
+                print(f"🚨 Error captioning {len(batch)} image(s): {e}")
+                captions = []
+            if len(captions) != len(batch):
+                if len(batch) == 1:
+                    captions = [None]
+                else:
+                    captions = [self.caption_one(image_data, provider) for image_data in batch]
+            results.extend(captions)
+        return results
+
+    def caption_one(self, image_data: bytes, provider: str | None = None) -> Image | None:
+        try:
+            captions = self._request(provider or self.config.provider, [image_data])
+        except Exception as e:
+            print(f"🚨 Error captioning image: {e}")
+            return None
+        return captions[0] if captions else None
 
-    return image
+
+_service: CaptioningService | None = None
+
+def get_captioning_service() -> CaptioningService:
+    # One per process: PDF worker processes each build their own on first use
+    global _service
+    if _service is None:
+        _service = CaptioningService(settings.captioning)
+    return _service
+
+def caption_image(image_data: bytes):
+    return get_captioning_service().caption_one(image_data, "gemini")
 
 def caption_image_groq(image_data: bytes):
-    base64_image = base64.b64encode(image_data).decode('utf-8')
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Caption this image"},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}",
-                        },
-                    },
-                ],
-            }
-        ],  # ty:ignore[invalid-argument-type]
-        model="meta-llama/llama-4-scout-17b-16e-instruct",
-        response_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "product_review",
-                "schema": Image.model_json_schema()
-            }
-
-        }  # ty:ignore[invalid-argument-type]
+    return get_captioning_service().caption_one(image_data, "groq")
+
+def describe(caption: Image) -> str:
+    return (
+        f"Image: {caption.image_name} "
+        f"Type: {caption.image_type} "
+        f"Description: {caption.image_description}"
     )
-    result = chat_completion.choices[0].message.content
-    image: Image = Image(**json.loads(result))
-    return image
 
 if __name__ == "__main__":
     with open("data/newplot.png", "rb") as image_file:
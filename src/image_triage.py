@@ -0,0 +1,133 @@
+import io
+from dataclasses import dataclass, field
+from src.config import ImageTriageConfig
+
+
+@dataclass
+class TriageResult:
+    # Images to caption, and for every input image the index of its kept image (None = dropped)
+    kept: list[bytes]
+    mapping: list[int | None]
+    stats: dict[str, int] = field(default_factory=dict)
+    # dHash of every kept image (None when Pillow could not read it)
+    hashes: list[int | None] = field(default_factory=list)
+    # Input images matching an already captioned hash passed in `known`: index -> that hash
+    reused: dict[int, int] = field(default_factory=dict)
+
+
+def dhash(image, size: int = 8) -> int:
+    """64-bit difference hash: near-identical images differ in only a few bits."""
+    from PIL import Image
+    pixels = list(image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS).getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left, right = pixels[row * (size + 1) + col], pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | int(left > right)
+    return bits
+
+
+def shrink(image, original: bytes, config: ImageTriageConfig) -> bytes:
+    """Downscale to max_side and recompress; returns whichever encoding is smaller."""
+    from PIL import Image
+    downscaled = max(image.size) > config.max_side
+    if downscaled:
+        image = image.copy()
+        image.thumbnail((config.max_side, config.max_side), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha:
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.convert("RGB").save(buffer, format="JPEG", quality=config.jpeg_quality, optimize=True)
+    encoded = buffer.getvalue()
+    return encoded if downscaled or len(encoded) < len(original) else original
+
+
+def _near(h: int, hashes, distance: int):
+    return next((other for other in hashes if other is not None and bin(h ^ other).count("1") <= distance), None)
+
+
+def triage(images: list[bytes], config: ImageTriageConfig, known=()) -> TriageResult:
+    """Drop tiny or flat images, collapse near-duplicates and shrink the rest before captioning.
+
+    `known` holds hashes captioned earlier in the same file (e.g. by another
+    PDF page range); images matching one are not captioned again.
+    """
+    from PIL import Image, UnidentifiedImageError
+    stats = {
+        "images_seen": len(images),
+        "images_dropped_small": 0,
+        "images_dropped_low_entropy": 0,
+        "images_deduplicated": 0,
+        "images_caption_reused": 0,
+        "image_bytes_in": sum(map(len, images)),
+        "image_bytes_sent": 0,
+    }
+    if not config.enabled:
+        stats.update(image_bytes_sent=stats["image_bytes_in"], captions_avoided=0, image_bytes_saved=0)
+        return TriageResult(list(images), list(range(len(images))), stats, [None] * len(images))
+
+    kept, hashes, mapping, reused = [], [], [], {}
+    for data in images:
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except (UnidentifiedImageError, OSError):
+            # Unknown to Pillow: let the captioning provider decide
+            mapping.append(len(kept))
+            kept.append(data)
+            hashes.append(None)
+            continue
+
+        width, height = image.size
+        if min(width, height) < config.min_side or width * height < config.min_area:
+            stats["images_dropped_small"] += 1
+            mapping.append(None)
+            continue
+        if image.convert("L").entropy() < config.min_entropy:
+            stats["images_dropped_low_entropy"] += 1
+            mapping.append(None)
+            continue
+
+        h = dhash(image)
+        match = _near(h, known, config.hash_distance)
+        if match is not None:
+            stats["images_caption_reused"] += 1
+            mapping.append(None)
+            reused[len(mapping) - 1] = match
+            continue
+        duplicate = next(
+            (i for i, other in enumerate(hashes) if other is not None and bin(h ^ other).count("1") <= config.hash_distance),
+            None
+        )
+        if duplicate is not None:
+            stats["images_deduplicated"] += 1
+            mapping.append(duplicate)
+            continue
+
+        try:
+            shrunk = shrink(image, data, config)
+        except (OSError, ValueError):
+            shrunk = data
+        mapping.append(len(kept))
+        kept.append(shrunk)
+        hashes.append(h)
+
+    stats["image_bytes_sent"] = sum(map(len, kept))
+    stats["captions_avoided"] = len(images) - len(kept)
+    stats["image_bytes_saved"] = stats["image_bytes_in"] - stats["image_bytes_sent"]
+    return TriageResult(kept, mapping, stats, hashes, reused)
+
+
+def prepare_for_upload(data: bytes, config: ImageTriageConfig) -> bytes:
+    """Shrink a single image the user added on purpose (never dropped)."""
+    from PIL import Image, UnidentifiedImageError
+    if not config.enabled:
+        return data
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return shrink(image, data, config)
+    except (UnidentifiedImageError, OSError, ValueError):
+        return data
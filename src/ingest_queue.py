@@ -0,0 +1,389 @@
+"""Durable ingestion job queue.
+
+    python -m src.ingest_queue status
+    python -m src.ingest_queue work --workers 4
+
+`work` starts extra parse workers against the queue of a running (or
+crashed) ingestion; embedding and vector-store inserts stay with the app.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import subprocess
+import numpy as np
+from collections.abc import Iterator
+from llama_index.core.schema import TextNode
+from src.config import settings
+from src.profiling import profiler
+
+STAGES = ("pending", "parsed", "embedded", "inserted")
+FAILED = "failed"
+
+
+def default_queue_path() -> str:
+    return settings.ingestion.queue_path or os.path.join(settings.vector_store.path, "ingest_queue.sqlite3")
+
+
+class IngestQueue:
+    """Per-file ingestion jobs with checkpointed stages, in SQLite.
+
+    A job moves pending -> parsed -> embedded -> inserted and the chunks each
+    stage produced are stored with it, so an interrupted run resumes at the
+    last finished stage instead of re-parsing, re-captioning and re-embedding.
+    Chunks are written and read in batches, so a large file never has to
+    fit in memory at once. A failing job is retried with exponential backoff
+    until `max_attempts`, then stays failed. Jobs are claimed under a lease,
+    renewed with every batch, so several processes can drain the same queue.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_attempts: int = 3,
+        backoff_s: float = 5.0,
+        backoff_max_s: float = 300.0,
+        lease_s: float = 1800.0
+    ):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.lease_s = lease_s
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit mode: claims use explicit BEGIN IMMEDIATE transactions
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                file_name TEXT PRIMARY KEY, path TEXT, mtime REAL, stage TEXT, state TEXT,
+                attempts INTEGER DEFAULT 0, next_attempt_at REAL DEFAULT 0, error TEXT,
+                lease_owner TEXT, lease_until REAL DEFAULT 0, chunks INTEGER DEFAULT 0, updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (file_name TEXT, seq INTEGER, node TEXT, embedding BLOB, PRIMARY KEY (file_name, seq));
+            """
+        )
+
+    @classmethod
+    def from_settings(cls) -> "IngestQueue":
+        config = settings.ingestion
+        return cls(
+            default_queue_path(),
+            max_attempts=config.max_attempts,
+            backoff_s=config.retry_backoff_s,
+            backoff_max_s=config.retry_backoff_max_s
+        )
+
+    def enqueue(self, files: dict[str, str], force: bool = False) -> int:
+        """Queue files (name -> path). Unchanged files keep their checkpoint unless `force`; returns the jobs left to run."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for file_name, path in files.items():
+                mtime = os.path.getmtime(path)
+                row = self._conn.execute("SELECT mtime FROM jobs WHERE file_name = ?", (file_name,)).fetchone()
+                if row and abs(row[0] - mtime) <= 1 and not force:
+                    # Same file as last time: resume from its checkpoint, with a fresh set of attempts
+                    self._conn.execute(
+                        "UPDATE jobs SET path = ?, attempts = 0, next_attempt_at = 0, state = stage WHERE file_name = ? AND stage != 'inserted'",
+                        (path, file_name)
+                    )
+                    continue
+                self._conn.execute("DELETE FROM chunks WHERE file_name = ?", (file_name,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (file_name, path, mtime, stage, state, updated_at) VALUES (?, ?, ?, 'pending', 'pending', ?)",
+                    (file_name, path, mtime, now)
+                )
+            self._conn.execute("COMMIT")
+        return self.unfinished()
+
+    def recover(self) -> int:
+        """Release the leases of a previous run that died mid-job."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET lease_owner = NULL, lease_until = 0 WHERE lease_owner IS NOT NULL"
+            ).rowcount
+
+    def _runnable(self, stages: tuple[str, ...] | None) -> tuple[str, list]:
+        stages = stages or STAGES[:-1]
+        placeholders = ", ".join("?" * len(stages))
+        where = (
+            f"stage IN ({placeholders}) AND attempts < ? "
+            "AND (lease_owner IS NULL OR lease_until < ?)"
+        )
+        return where, [*stages, self.max_attempts]
+
+    def claim(self, owner: str, stages: tuple[str, ...] | None = None) -> dict | None:
+        """Lease the next job due in one of `stages` (any unfinished stage by default)."""
+        now = time.time()
+        where, params = self._runnable(stages)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT file_name, path, stage, attempts FROM jobs WHERE {where} AND next_attempt_at <= ? "
+                    "ORDER BY attempts, updated_at LIMIT 1",
+                    (*params, now, now)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE jobs SET lease_owner = ?, lease_until = ? WHERE file_name = ?",
+                        (owner, now + self.lease_s, row[0])
+                    )
+            finally:
+                self._conn.execute("COMMIT")
+        if row is None:
+            return None
+        return {"file_name": row[0], "path": row[1], "stage": row[2], "attempts": row[3]}
+
+    def next_retry_in(self, stages: tuple[str, ...] | None = None) -> float | None:
+        """Seconds until another job in `stages` can be claimed; None when nothing is left."""
+        where, params = self._runnable(stages)
+        row = self._conn.execute(
+            f"SELECT MIN(next_attempt_at) FROM jobs WHERE {where}", (*params, time.time())
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def clear_nodes(self, file_name: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE file_name = ?", (file_name,))
+
+    @staticmethod
+    def _embedding_blob(embedding) -> bytes | None:
+        return np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+
+    def append_nodes(self, file_name: str, nodes: list):
+        """Checkpoint one batch of a stage's chunks (embeddings as float32 blobs) and renew the job's lease."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            start = self._conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM chunks WHERE file_name = ?", (file_name,)).fetchone()[0]
+            rows = []
+            for seq, node in enumerate(nodes, start):
+                data = node.to_dict()
+                rows.append((file_name, seq, json.dumps(data), self._embedding_blob(data.pop("embedding", None))))
+            self._conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+            self._renew_lease(file_name)
+            self._conn.execute("COMMIT")
+
+    def save_embeddings(self, file_name: str, batch: list[tuple[int, TextNode]]):
+        """Store the embeddings of already checkpointed chunks, by seq."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "UPDATE chunks SET embedding = ? WHERE file_name = ? AND seq = ?",
+                [(self._embedding_blob(node.embedding), file_name, seq) for seq, node in batch]
+            )
+            self._renew_lease(file_name)
+            self._conn.execute("COMMIT")
+
+    def _renew_lease(self, file_name: str):
+        # A large file takes many batches; each one proves the owner is still alive
+        self._conn.execute(
+            "UPDATE jobs SET lease_until = ? WHERE file_name = ? AND lease_owner IS NOT NULL",
+            (time.time() + self.lease_s, file_name)
+        )
+
+    def finish_stage(self, file_name: str, stage: str):
+        """Mark a stage done once all its batches are checkpointed, and release the job."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET stage = ?, state = ?, chunks = (SELECT COUNT(*) FROM chunks WHERE file_name = ?), "
+                "error = NULL, lease_owner = NULL, lease_until = 0, updated_at = ? WHERE file_name = ?",
+                (stage, stage, file_name, time.time(), file_name)
+            )
+
+    def iter_nodes(self, file_name: str, batch_size: int) -> Iterator[list[tuple[int, TextNode]]]:
+        """Checkpointed chunks of a file as (seq, node) batches, read one page at a time."""
+        last = -1
+        while True:
+            rows = self._conn.execute(
+                "SELECT seq, node, embedding FROM chunks WHERE file_name = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (file_name, last, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            batch = []
+            for seq, data, embedding in rows:
+                node = TextNode.from_dict(json.loads(data))
+                if embedding is not None:
+                    node.embedding = np.frombuffer(embedding, dtype=np.float32).tolist()
+                batch.append((seq, node))
+            yield batch
+            last = rows[-1][0]
+
+    def complete(self, file_name: str, chunks: int):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM chunks WHERE file_name = ?", (file_name,))
+            self._conn.execute(
+                "UPDATE jobs SET stage = 'inserted', state = 'inserted', chunks = ?, error = NULL, "
+                "lease_owner = NULL, lease_until = 0, updated_at = ? WHERE file_name = ?",
+                (chunks, time.time(), file_name)
+            )
+            self._conn.execute("COMMIT")
+
+    def fail(self, file_name: str, error: str) -> bool:
+        """Record a failure; returns True if the job will be retried."""
+        with self._lock:
+            attempts = self._conn.execute("SELECT attempts FROM jobs WHERE file_name = ?", (file_name,)).fetchone()[0] + 1
+            delay = min(self.backoff_s * 2 ** (attempts - 1), self.backoff_max_s)
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = ?, next_attempt_at = ?, error = ?, "
+                "lease_owner = NULL, lease_until = 0, updated_at = ? WHERE file_name = ?",
+                (FAILED, attempts, time.time() + delay, error[:2000], time.time(), file_name)
+            )
+        return attempts < self.max_attempts
+
+    def remove(self, file_name: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE file_name = ?", (file_name,))
+            self._conn.execute("DELETE FROM jobs WHERE file_name = ?", (file_name,))
+
+    def reset(self):
+        with self._lock:
+            self._conn.executescript("DELETE FROM jobs; DELETE FROM chunks;")
+
+    def unfinished(self) -> int:
+        where, params = self._runnable(None)
+        return self._conn.execute(f"SELECT COUNT(*) FROM jobs WHERE {where}", (*params, float("inf"))).fetchone()[0]
+
+    def file_names(self) -> list[str]:
+        return [r[0] for r in self._conn.execute("SELECT file_name FROM jobs ORDER BY file_name")]
+
+    def failed(self) -> dict[str, str]:
+        """Jobs that used up their attempts, with their last error."""
+        return dict(self._conn.execute(
+            "SELECT file_name, error FROM jobs WHERE state = ? AND attempts >= ?", (FAILED, self.max_attempts)
+        ).fetchall())
+
+    def summary(self) -> dict:
+        counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        retrying = self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state = ? AND attempts < ?", (FAILED, self.max_attempts)
+        ).fetchone()[0]
+        chunks = self._conn.execute("SELECT COALESCE(SUM(chunks), 0) FROM jobs WHERE state = 'inserted'").fetchone()[0]
+        return {
+            **{state: counts.get(state, 0) for state in (*STAGES, FAILED)},
+            "retrying": retrying,
+            "total": sum(counts.values()),
+            "chunks_inserted": chunks,
+        }
+
+    def progress_line(self) -> str:
+        s = self.summary()
+        parts = [f"{s['inserted']}/{s['total']} files inserted ({s['chunks_inserted']} chunks)"]
+        parts += [f"{s[stage]} {stage}" for stage in ("pending", "parsed", "embedded") if s[stage]]
+        if s["retrying"]:
+            parts.append(f"{s['retrying']} retrying")
+        if s[FAILED] - s["retrying"]:
+            parts.append(f"{s[FAILED] - s['retrying']} failed")
+        return "📊 Ingestion: " + ", ".join(parts)
+
+
+def _timed_load(documents: Iterator, file_name: str, bytes_in: int) -> Iterator:
+    """Pass documents through, recording the time spent reading them as one 'load' stage."""
+    elapsed, count = 0.0, 0
+    while True:
+        start_time = time.perf_counter()
+        document = next(documents, None)
+        elapsed += time.perf_counter() - start_time
+        if document is None:
+            break
+        count += 1
+        yield document
+    profiler.add("load", elapsed, file_name, bytes_in=bytes_in, items_out=count)
+
+
+def parse_file(path: str, batch_size: int | None = None) -> Iterator[list]:
+    """Load one file through the loader registry and chunk it, yielding batches of chunks.
+
+    Documents are read lazily and split as they arrive, so a file is never
+    held in memory whole.
+    """
+    from src.doc_parser import get_loader
+    from src.chunking import split_documents
+    loader = get_loader(path)
+    if loader is None:
+        return
+    file_name = os.path.basename(path)
+    documents = _timed_load(loader.load(path), file_name, os.path.getsize(path))
+    yield from split_documents(documents, file_name, batch_size or settings.ingestion.checkpoint_chunks)
+
+
+def parse_job(queue: IngestQueue, file_name: str, path: str):
+    """Pending stage: checkpoint the file's chunks batch by batch, then mark it parsed."""
+    # A retried parse starts over; batches of an interrupted attempt are dropped
+    queue.clear_nodes(file_name)
+    for nodes in parse_file(path):
+        queue.append_nodes(file_name, nodes)
+    queue.finish_stage(file_name, "parsed")
+
+
+def parse_worker(queue: IngestQueue, owner: str, poll_s: float = 1.0) -> int:
+    """Drain the pending stage until nothing is left to parse; returns the number of files parsed."""
+    parsed = 0
+    while True:
+        job = queue.claim(owner, ("pending",))
+        if job is None:
+            wait = queue.next_retry_in(("pending",))
+            if wait is None:
+                return parsed
+            time.sleep(min(max(wait, poll_s), 30))
+            continue
+        try:
+            parse_job(queue, job["file_name"], job["path"])
+            parsed += 1
+            print(f"   - [{owner}] Parsed: {job['file_name']}")
+        except Exception as e:
+            retry = queue.fail(job["file_name"], str(e))
+            print(f"   ❌ [{owner}] Error parsing {job['file_name']}: {e}" + (" (will retry)" if retry else ""))
+
+
+def start_parse_workers(count: int, access_config_path: str) -> list[subprocess.Popen]:
+    """Spawn parse worker processes; each runs `python -m src.ingest_queue work` without loading the app."""
+    return [
+        subprocess.Popen([
+            sys.executable, "-m", "src.ingest_queue", "work",
+            "--access-config", access_config_path, "--name", f"worker-{i + 1}"
+        ])
+        for i in range(count)
+    ]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Ingestion job queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+    work = sub.add_parser("work", help="parse pending jobs until the queue is drained")
+    work.add_argument("--workers", type=int, default=1)
+    work.add_argument("--access-config", default="access_config.json")
+    work.add_argument("--name", default=None)
+    sub.add_parser("status", help="show per-state job counts and failures")
+    args = parser.parse_args(argv)
+
+    queue = IngestQueue.from_settings()
+    if args.command == "status":
+        print(queue.progress_line())
+        for file_name, error in queue.failed().items():
+            print(f"   ❌ {file_name}: {error}")
+        return
+
+    if args.workers > 1:
+        for process in start_parse_workers(args.workers, args.access_config):
+            process.wait()
+        print(queue.progress_line())
+        return
+
+    from src.doc_parser import set_access_control_config
+    if os.path.exists(args.access_config):
+        with open(args.access_config, "r") as f:
+            set_access_control_config(json.load(f))
+    parse_worker(queue, args.name or f"worker-{os.getpid()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Sequence
+import numpy as np
+from pydantic import PrivateAttr
+from llama_index.core.llms import LLM, ChatMessage, ChatResponse, CompletionResponse, LLMMetadata
+from src.config import LLMConfig, LLMRouterConfig
+
+
+def create_provider_llm(provider: str, model_name: str, api_key: str, base_url: str = "", timeout_s: float = 60.0, max_retries: int = 3) -> LLM:
+    kwargs = {"model": model_name, "api_key": api_key, "timeout": timeout_s, "max_retries": max_retries}
+    if base_url:
+        kwargs["api_base"] = base_url
+    match provider:
+        case "cerebras":
+            from llama_index.llms.cerebras import Cerebras
+            return Cerebras(**kwargs)
+        case "groq":
+            from llama_index.llms.groq import Groq
+            return Groq(**kwargs)
+        case _:
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+
+
+def retry_after_s(error: Exception) -> float | None:
+    """Seconds from a 429's Retry-After header, if the error carries a response."""
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or getattr(getattr(error, "response", None), "status_code", None) == 429
+
+
+class ProviderStats:
+    """Latency and outcome tracking for one provider.
+
+    `ewma_s` orders the providers. The recent-latency window gives the hedge
+    delay. A provider that failed or was rate limited is skipped until
+    `cooldown_until`.
+    """
+
+    def __init__(self, name: str, alpha: float, window: int):
+        self.name = name
+        self.alpha = alpha
+        self.ewma_s: float | None = None
+        self.samples: deque = deque(maxlen=window)
+        self.calls = 0
+        self.wins = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.cancelled = 0
+        self.cooldown_until = 0.0
+        self.observed_at = 0.0
+
+    def observe(self, latency_s: float, complete: bool = True):
+        self.observed_at = time.monotonic()
+        self.ewma_s = latency_s if self.ewma_s is None else self.alpha * latency_s + (1 - self.alpha) * self.ewma_s
+        # A cancelled loser only tells us "at least this slow"; it moves the EWMA but not the percentile window
+        if complete:
+            self.samples.append(latency_s)
+
+    def percentile_s(self, percentile: float, min_samples: int) -> float | None:
+        if len(self.samples) < min_samples:
+            return None
+        return float(np.percentile(self.samples, percentile))
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def summary(self) -> dict:
+        p50 = float(np.percentile(self.samples, 50)) if self.samples else None
+        p95 = float(np.percentile(self.samples, 95)) if self.samples else None
+        return {
+            "calls": self.calls, "wins": self.wins, "errors": self.errors, "rate_limited": self.rate_limited,
+            "cancelled": self.cancelled, "ewma_s": self.ewma_s, "p50_s": p50, "p95_s": p95,
+            "cooling_down": not self.available(time.monotonic()),
+        }
+
+
+class LLMRouter(LLM):
+    """LLM that spreads each request over several providers.
+
+    Providers are tried in EWMA-latency order, and ones cooling down after
+    an error or a 429 are skipped. If the first provider has not answered
+    within its `hedge_percentile` latency, the same request also goes to the
+    next provider. The first answer wins and the other request is cancelled.
+    Errors and 429s fail over to the next provider. Streaming calls only
+    fail over, before the first token.
+    """
+
+    _providers: list = PrivateAttr(default_factory=list)
+    _stats: dict = PrivateAttr(default_factory=dict)
+    _config: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default=None)
+    _loop: Any = PrivateAttr(default=None)
+    _hedges: int = PrivateAttr(default=0)
+    _failovers: int = PrivateAttr(default=0)
+    _requests: int = PrivateAttr(default=0)
+
+    def __init__(self, providers: list[tuple[str, LLM]], config: LLMRouterConfig, **kwargs: Any):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        super().__init__(**kwargs)
+        self._providers = providers
+        self._stats = {name: ProviderStats(name, config.ewma_alpha, config.window) for name, _ in providers}
+        self._config = config
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LLMRouter"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self._providers[0][1].metadata
+
+    def _order(self) -> list[tuple[str, LLM]]:
+        now = time.monotonic()
+        with self._lock:
+            ranked = sorted(
+                enumerate(self._providers),
+                # Unmeasured providers go after measured ones (in configured order) until a hedge or failover measures them
+                key=lambda item: (self._stats[item[1][0]].ewma_s is None, self._stats[item[1][0]].ewma_s or 0.0, item[0])
+            )
+            ready = [p for _, p in ranked if self._stats[p[0]].available(now)]
+            self._requests += 1
+            probe_every = self._config.probe_every
+            if probe_every and self._requests % probe_every == 0 and len(ready) > 1:
+                # A provider that is never first is only measured by hedges; refresh the stalest estimate now and then
+                stalest = min(ready, key=lambda p: self._stats[p[0]].observed_at)
+                ready.remove(stalest)
+                ready.insert(0, stalest)
+            # Everything cooling down: try the provider whose cooldown ends first rather than failing outright
+            return ready or sorted(self._providers, key=lambda p: self._stats[p[0]].cooldown_until)
+
+    def _hedge_delay(self, name: str) -> float:
+        config = self._config
+        observed = self._stats[name].percentile_s(config.hedge_percentile, config.min_samples)
+        delay_ms = config.hedge_initial_ms if observed is None else observed * 1000
+        return min(max(delay_ms, config.hedge_min_ms), config.hedge_max_ms) / 1000
+
+    def _record_error(self, name: str, error: Exception):
+        stats = self._stats[name]
+        with self._lock:
+            stats.errors += 1
+            cooldown = self._config.error_cooldown_s
+            if is_rate_limited(error):
+                stats.rate_limited += 1
+                cooldown = retry_after_s(error) or self._config.rate_limit_cooldown_s
+            stats.cooldown_until = time.monotonic() + cooldown
+
+    async def _route(self, method: str, *args: Any, **kwargs: Any):
+        order = self._order()
+        queue = list(order)
+        running: dict[asyncio.Task, tuple[str, float]] = {}
+        hedged = False
+        last_error: Exception | None = None
+
+        def launch():
+            name, llm = queue.pop(0)
+            with self._lock:
+                self._stats[name].calls += 1
+            task = asyncio.ensure_future(getattr(llm, method)(*args, **kwargs))
+            running[task] = (name, time.perf_counter())
+
+        launch()
+        try:
+            while running:
+                timeout = None
+                if self._config.hedge and not hedged and queue and len(running) == 1:
+                    name, started = next(iter(running.values()))
+                    timeout = max(0.0, self._hedge_delay(name) - (time.perf_counter() - started))
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    with self._lock:
+                        self._hedges += 1
+                    launch()
+                    continue
+
+                # A success completing alongside a failure wins
+                for task in sorted(done, key=lambda t: t.exception() is not None):
+                    name, started = running.pop(task)
+                    elapsed = time.perf_counter() - started
+                    if task.exception() is None:
+                        with self._lock:
+                            self._stats[name].observe(elapsed)
+                            self._stats[name].wins += 1
+                        for loser, (loser_name, loser_started) in running.items():
+                            if not loser.cancel():
+                                continue
+                            with self._lock:
+                                self._stats[loser_name].cancelled += 1
+                                self._stats[loser_name].observe(time.perf_counter() - loser_started, complete=False)
+                        if running:
+                            await asyncio.gather(*running, return_exceptions=True)
+                        return task.result()
+                    last_error = task.exception()
+                    self._record_error(name, last_error)
+                if not running and queue:
+                    with self._lock:
+                        self._failovers += 1
+                    launch()
+        finally:
+            # Also reached when the caller itself is cancelled
+            for task in running:
+                task.cancel()
+        raise last_error
+
+    def _run(self, coro):
+        with self._lock:
+            if self._loop is None:
+                # One private loop serves the sync API, so cancellation works the same for chat() and achat()
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-router", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return self._run(self._route("achat", messages, **kwargs))
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self._run(self._route("acomplete", prompt, formatted=formatted, **kwargs))
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return await self._route("achat", messages, **kwargs)
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return await self._route("acomplete", prompt, formatted=formatted, **kwargs)
+
+    def _stream(self, method: str, *args: Any, **kwargs: Any):
+        last_error: Exception | None = None
+        for name, llm in self._order():
+            with self._lock:
+                self._stats[name].calls += 1
+            started = time.perf_counter()
+            try:
+                stream = getattr(llm, method)(*args, **kwargs)
+                first = next(stream)
+            except StopIteration:
+                return
+            except Exception as e:
+                last_error = e
+                self._record_error(name, e)
+                with self._lock:
+                    self._failovers += 1
+                continue
+            with self._lock:
+                self._stats[name].observe(time.perf_counter() - started)
+                self._stats[name].wins += 1
+            yield first
+            yield from stream
+            return
+        raise last_error
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        return self._stream("stream_chat", messages, **kwargs)
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        return self._stream("stream_complete", prompt, formatted=formatted, **kwargs)
+
+    async def _astream(self, method: str, *args: Any, **kwargs: Any):
+        last_error: Exception | None = None
+        for name, llm in self._order():
+            with self._lock:
+                self._stats[name].calls += 1
+            started = time.perf_counter()
+            try:
+                stream = await getattr(llm, method)(*args, **kwargs)
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                last_error = e
+                self._record_error(name, e)
+                with self._lock:
+                    self._failovers += 1
+                continue
+            with self._lock:
+                self._stats[name].observe(time.perf_counter() - started)
+                self._stats[name].wins += 1
+            yield first
+            async for chunk in stream:
+                yield chunk
+            return
+        raise last_error
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        return self._astream("astream_chat", messages, **kwargs)
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        return self._astream("astream_complete", prompt, formatted=formatted, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hedges": self._hedges,
+                "failovers": self._failovers,
+                "providers": {name: s.summary() for name, s in self._stats.items()},
+            }
+
+
+def build_router(config: LLMConfig) -> LLMRouter:
+    """[llm] as the first provider plus every fallback whose API key is set.
+
+    Provider clients do not retry on their own; the router fails over instead.
+    """
+    router = config.router
+    timeout_s = router.timeout_s
+    providers = [(
+        f"{config.provider}/{config.model_name}",
+        create_provider_llm(config.provider, config.model_name, config.api_key, config.base_url, timeout_s, max_retries=0)
+    )]
+    for fallback in router.fallbacks:
+        api_key = os.getenv(fallback.api_key_env_var)
+        if not api_key:
+            print(f"⚠️ Skipping LLM fallback {fallback.provider}/{fallback.model_name}: {fallback.api_key_env_var} is not set.")
+            continue
+        name = f"{fallback.provider}/{fallback.model_name}"
+        if any(name == existing for existing, _ in providers):
+            name = f"{name}#{len(providers)}"
+        providers.append((
+            name, create_provider_llm(fallback.provider, fallback.model_name, api_key, fallback.base_url, timeout_s, max_retries=0)
+        ))
+    return LLMRouter(providers, router)
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+MAX_SAMPLES = 10_000
+QUANTILES = (0.5, 0.95, 0.99)
+# Spans that overlap other stages (run on a worker thread) and must not count towards the total
+CONCURRENT_SPANS = {"speculative_retrieval"}
+
+
+class QueryTrace:
+    """Spans and counters collected for a single `get_response` call."""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: dict[str, float] = {}
+        self.counters: dict[str, float] = {}
+        self.total_s: float | None = None
+
+    @contextmanager
+    def span(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - start_time)
+
+    def add_span(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def set(self, name: str, value: float):
+        self.counters[name] = value
+
+    def finish(self):
+        self.total_s = time.perf_counter() - self._t0
+        # Time outside every explicit span (response bookkeeping, memory writes) is reported on its own
+        covered = sum(v for k, v in self.spans.items() if k not in CONCURRENT_SPANS)
+        self.spans["untracked"] = max(self.total_s - covered, 0.0)
+        self.spans["total"] = self.total_s
+
+    def to_dict(self) -> dict:
+        return {
+            "ts": self.started,
+            "query_chars": len(self.query),
+            "spans_s": self.spans,
+            "counters": self.counters,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        self._sums: dict[str, float] = defaultdict(float)
+        self._counts: dict[str, int] = defaultdict(int)
+        self.last_trace: QueryTrace | None = None
+        self.path: str | None = None
+        self.format = "prometheus"
+
+    def configure(self, path: str | None, fmt: str = "prometheus"):
+        self.path = path or None
+        self.format = fmt
+
+    def start_trace(self, query: str) -> QueryTrace:
+        return QueryTrace(query)
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self._samples[name].append(value)
+            self._sums[name] += value
+            self._counts[name] += 1
+
+    def record(self, trace: QueryTrace):
+        if trace.total_s is None:
+            trace.finish()
+        for name, seconds in trace.spans.items():
+            self.observe(f"span:{name}", seconds)
+        for name, value in trace.counters.items():
+            self.observe(f"counter:{name}", value)
+        self.last_trace = trace
+        self.export(trace)
+
+    def summary(self) -> dict[str, dict]:
+        with self._lock:
+            result = {}
+            for name, samples in self._samples.items():
+                arr = np.fromiter(samples, dtype=np.float64)
+                result[name] = {
+                    "count": self._counts[name],
+                    "sum": self._sums[name],
+                    **{f"p{int(q * 100)}": float(np.quantile(arr, q)) for q in QUANTILES},
+                }
+            return result
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP rag_query_stage_seconds Wall time per query stage.",
+            "# TYPE rag_query_stage_seconds summary",
+        ]
+        counter_lines = [
+            "# HELP rag_query_value Per-query sizes (tokens, context characters, retrieved nodes).",
+            "# TYPE rag_query_value summary",
+        ]
+        for name, s in sorted(self.summary().items()):
+            kind, label = name.split(":", 1)
+            metric, key = ("rag_query_stage_seconds", "stage") if kind == "span" else ("rag_query_value", "name")
+            target = lines if kind == "span" else counter_lines
+            for q in QUANTILES:
+                target.append(f'{metric}{{{key}="{label}",quantile="{q}"}} {s[f"p{int(q * 100)}"]:.6f}')
+            target.append(f'{metric}_sum{{{key}="{label}"}} {s["sum"]:.6f}')
+            target.append(f'{metric}_count{{{key}="{label}"}} {s["count"]}')
+        return "\n".join(lines + counter_lines) + "\n"
+
+    def export(self, trace: QueryTrace | None = None):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self.format == "jsonl":
+            if trace is not None:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(trace.to_dict()) + "\n")
+        else:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, self.path)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss_mb() -> float | None:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class IngestionProfiler:
+    """Per-file, per-stage timings for one ingestion run.
+
+    Loaders and the indexing pipeline wrap their work in `stage(...)`; the
+    outermost `run(...)` prints a summary when it finishes and, if a trace
+    path is configured, appends every stage record to a JSONL file.
+    """
+
+    def __init__(self, trace_path: str | None = None):
+        self.trace_path = trace_path
+        self._depth = 0
+        self._label = None
+        self._started = 0.0
+        self._records: list[dict] = []
+        self._counters: dict[str, float] = defaultdict(float)
+        self._max_rss = None
+
+    @property
+    def active(self) -> bool:
+        return self._depth > 0
+
+    @contextmanager
+    def run(self, label: str):
+        if self._depth == 0:
+            self._label = label
+            self._started = time.perf_counter()
+            self._records = []
+            self._counters = defaultdict(float)
+            self._max_rss = current_rss_mb()
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.report()
+
+    @contextmanager
+    def stage(self, name: str, file_name: str | None = None, bytes_in: int = 0, items_in: int = 0):
+        record = {
+            "run": self._label,
+            "stage": name,
+            "file": file_name,
+            "bytes_in": bytes_in,
+            "items_in": items_in,
+            "items_out": 0,
+        }
+        start_time = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["duration_s"] = time.perf_counter() - start_time
+            rss = current_rss_mb()
+            record["rss_mb"] = rss
+            if rss is not None:
+                self._max_rss = max(self._max_rss or 0.0, rss)
+            if self.active:
+                self._records.append(record)
+                self._write_trace(record)
+
+    def add(self, name: str, duration_s: float, file_name: str | None = None, bytes_in: int = 0, items_in: int = 0, items_out: int = 0):
+        """Record a stage timed elsewhere, e.g. in a worker process."""
+        if not self.active:
+            return
+        record = {
+            "run": self._label,
+            "stage": name,
+            "file": file_name,
+            "bytes_in": bytes_in,
+            "items_in": items_in,
+            "items_out": items_out,
+            "duration_s": duration_s,
+            "rss_mb": None,
+        }
+        self._records.append(record)
+        self._write_trace(record)
+
+    def detach(self):
+        """Forget run state inherited by a forked worker; the parent records the worker's timings."""
+        self._depth = 0
+        self.trace_path = None
+
+    def count(self, name: str, value: float = 1):
+        if self.active:
+            self._counters[name] += value
+
+    def _write_trace(self, record: dict):
+        if not self.trace_path:
+            return
+        os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+        with open(self.trace_path, "a") as f:
+            f.write(json.dumps({"ts": time.time(), **record}) + "\n")
+
+    def summary(self) -> dict:
+        stages = defaultdict(lambda: {"calls": 0, "duration_s": 0.0, "bytes_in": 0, "items_in": 0, "items_out": 0})
+        files = defaultdict(lambda: defaultdict(float))
+        for r in self._records:
+            s = stages[r["stage"]]
+            s["calls"] += 1
+            s["duration_s"] += r["duration_s"]
+            s["bytes_in"] += r["bytes_in"]
+            s["items_in"] += r["items_in"]
+            s["items_out"] += r["items_out"]
+            if r["file"]:
+                files[r["file"]][r["stage"]] += r["duration_s"]
+
+        embedding = stages.get("embedding")
+        return {
+            "run": self._label,
+            "wall_s": time.perf_counter() - self._started,
+            "stages": dict(stages),
+            "files": {f: dict(v) for f, v in files.items()},
+            "counters": dict(self._counters),
+            "embeddings_per_s": embedding["items_in"] / embedding["duration_s"] if embedding and embedding["duration_s"] else None,
+            "max_rss_mb": self._max_rss,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def report(self):
+        summary = self.summary()
+        if not summary["stages"]:
+            return
+        print(f"\n📊 Ingestion profile ({summary['run']}, {summary['wall_s']:.2f}s wall)")
+        print(f"   {'Stage':<16} {'Calls':>6} {'Time (s)':>10} {'MB in':>9} {'Items in':>9} {'Items out':>10}")
+        for name, s in sorted(summary["stages"].items(), key=lambda kv: -kv[1]["duration_s"]):
+            print(
+                f"   {name:<16} {s['calls']:>6} {s['duration_s']:>10.2f} "
+                f"{s['bytes_in'] / (1024 * 1024):>9.2f} {s['items_in']:>9} {s['items_out']:>10}"
+            )
+        slowest = sorted(summary["files"].items(), key=lambda kv: -sum(kv[1].values()))[:5]
+        if slowest:
+            print("   Slowest files:")
+            for file_name, stages in slowest:
+                detail = ", ".join(f"{k} {v:.2f}s" for k, v in sorted(stages.items(), key=lambda kv: -kv[1]))
+                print(f"     - {file_name}: {detail}")
+        counters = dict(summary["counters"])
+        if "images_seen" in counters:
+            print(
+                f"   🖼️  Images: {counters.pop('images_seen'):g} seen, "
+                f"{counters.pop('captions_avoided', 0):g} captions avoided "
+                f"({counters.pop('images_dropped_small', 0):g} small, {counters.pop('images_dropped_low_entropy', 0):g} flat, "
+                f"{counters.pop('images_deduplicated', 0):g} duplicates, "
+                f"{counters.pop('images_caption_reused', 0):g} captioned earlier in the file)"
+            )
+        if "image_bytes_saved" in counters:
+            counters.pop("image_bytes_in", None)
+            counters.pop("image_bytes_sent", None)
+            print(f"   📉 Image upload bytes saved: {counters.pop('image_bytes_saved') / (1024 * 1024):.2f} MB")
+        if "chunks_deduplicated" in counters:
+            print(
+                f"   ♻️  Duplicate chunks not embedded: {counters.pop('chunks_deduplicated'):g} "
+                f"({counters.pop('dedup_bytes_avoided', 0) / (1024 * 1024):.2f} MB of text and vectors not stored)"
+            )
+        for name, value in counters.items():
+            print(f"   {name}: {value:g}")
+        if summary["embeddings_per_s"]:
+            print(f"   ⚡ Embeddings/s: {summary['embeddings_per_s']:.1f}")
+        if summary["peak_rss_mb"]:
+            print(f"   🧠 Peak RSS: {summary['peak_rss_mb']:.0f} MB")
+        print("   ('load' and 'chunking' include the clean_text sub-stage; pdf_text and captioning are summed over PDF worker processes)")
+        if self.trace_path:
+            print(f"   🧾 Trace appended to {self.trace_path}")
+
+
+profiler = IngestionProfiler()
+
+
+def configure_profiler(trace_path: str | None):
+    profiler.trace_path = trace_path or None
+
+
+def detach_profiler():
+    """Process pool initializer: workers must not record into a run inherited from the parent."""
+    profiler.detach()
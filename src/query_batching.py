@@ -0,0 +1,156 @@
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any
+from pydantic import PrivateAttr
+from llama_index.core.embeddings import BaseEmbedding
+
+
+def embed_queries(model: BaseEmbedding, queries: list[str]) -> list[list[float]]:
+    """Query embeddings for several queries, in one forward pass where the model allows it.
+
+    Sentence-transformers models prepend their query prompt to the input, so
+    when texts get no prompt of their own a batch of prompted queries through
+    the public text-batch API is the same computation as one
+    `get_query_embedding` call per query. Other models are called per query.
+    """
+    if len(queries) == 1:
+        return [model.get_query_embedding(queries[0])]
+    try:
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        from llama_index.embeddings.huggingface.utils import (
+            get_query_instruct_for_model_name,
+            get_text_instruct_for_model_name,
+        )
+    except ImportError:
+        HuggingFaceEmbedding = None
+    if HuggingFaceEmbedding is not None and isinstance(model, HuggingFaceEmbedding):
+        text_prompt = model.text_instruction or get_text_instruct_for_model_name(model.model_name)
+        if not text_prompt:
+            query_prompt = model.query_instruction or get_query_instruct_for_model_name(model.model_name)
+            return model.get_text_embedding_batch([f"{query_prompt}{q}" for q in queries])
+    return [model.get_query_embedding(q) for q in queries]
+
+
+class QueryEmbeddingBatcher:
+    """Coalesces concurrent query-embedding requests into shared forward passes.
+
+    Callers block on a future while one dispatcher thread drains the queue.
+    A lone request runs at once. Once concurrency has been seen (another
+    caller in flight, or the previous pass carried several queries), the
+    dispatcher keeps collecting new arrivals for up to `window_ms` before
+    running the pass, and never packs more than `max_batch` queries into it.
+    """
+
+    def __init__(self, model: BaseEmbedding, window_ms: float = 5.0, max_batch: int = 32):
+        self.model = model
+        self.window_s = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_batch = 0
+        self._thread = None
+        self.batches = 0
+        self.queries = 0
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, query: str) -> Future:
+        future = Future()
+        with self._lock:
+            self._in_flight += 1
+        self._queue.put((query, future))
+        self._start()
+        return future
+
+    def embed(self, query: str) -> list[float]:
+        return self.submit(query).result()
+
+    def _collect(self) -> list[tuple[str, Future]]:
+        batch = [self._queue.get()]
+        with self._lock:
+            concurrent = self._in_flight > 1 or self._last_batch > 1
+        if not concurrent:
+            return batch
+        deadline = time.perf_counter() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self._last_batch = len(batch)
+            try:
+                vectors = embed_queries(self.model, [q for q, _ in batch])
+                self.batches += 1
+                self.queries += len(batch)
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(list(vector))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._in_flight -= len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch": self.queries / self.batches if self.batches else 0.0,
+        }
+
+
+class BatchedQueryEmbedding(BaseEmbedding):
+    """Drop-in embedding model whose query embeddings go through a `QueryEmbeddingBatcher`.
+
+    Text (ingestion) embeddings are passed straight to the wrapped model,
+    which already embeds them in batches.
+    """
+
+    _inner: Any = PrivateAttr(default=None)
+    _batcher: Any = PrivateAttr(default=None)
+
+    def __init__(self, inner: BaseEmbedding, window_ms: float = 5.0, max_batch: int = 32, **kwargs):
+        super().__init__(model_name=inner.model_name, embed_batch_size=inner.embed_batch_size, **kwargs)
+        self._inner = inner
+        self._batcher = QueryEmbeddingBatcher(inner, window_ms=window_ms, max_batch=max_batch)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchedQueryEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    @property
+    def batcher(self) -> QueryEmbeddingBatcher:
+        return self._batcher
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._batcher.embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return await asyncio.wrap_future(self._batcher.submit(query))
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._inner.get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return self._inner.get_text_embedding_batch(texts)
+
+    async def _aget_text_embedding(self, text: str) -> list[float]:
+        return await self._inner.aget_text_embedding(text)
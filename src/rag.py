@@ -2,28 +2,37 @@ import os
 import shutil
 import gc
 import re
+import fnmatch
 import json
 import time
-import chromadb
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings, Document, StorageContext
-from llama_index.core.node_parser import SemanticSplitterNodeParser
 from llama_index.core.postprocessor import SimilarityPostprocessor
 from llama_index.core.vector_stores import MetadataFilters, MetadataFilter, FilterCondition, FilterOperator
-from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.vector_stores.chroma import ChromaVectorStore
+from llama_index.core.schema import MetadataMode, TextNode, NodeWithScore
+from llama_index.core.chat_engine.types import AgentChatResponse
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.constants import DEFAULT_EMBED_BATCH_SIZE
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.cerebras import Cerebras
-from llama_index.llms.groq import Groq
 from src.config import settings
+from src.vector_backends import create_backend
+from src.flat_index import FlatIndex, FlatRetriever
+from src.profiling import profiler, configure_profiler
+from src.metrics import metrics
+from src.chat_engine import RAGChatEngine
+from src.condense import CondensePolicy
+from src.session_memory import SessionMemory
+from src.dedup import ChunkDeduplicator
+from src.file_catalog import FileCatalog, Resolution
+from src.table_store import TableStore, answer_with_sql, is_aggregate_question
+from src.chunking import set_chunking_model
+from src.query_batching import BatchedQueryEmbedding
+from src.embed_batching import embed_texts
+from src.ingest_queue import IngestQueue, parse_job, start_parse_workers
+from src.llm_router import LLMRouter, build_router, create_provider_llm
 from src.doc_parser import (
-    get_document_from_pdf,
-    get_document_from_txt,
-    get_document_from_md,
-    get_document_from_docx,
-    get_document_from_csv,
-    get_document_from_xlsx,
-    get_document_from_image,
-    get_images_description,
+    DEFAULT_ACCESS_LEVEL,
+    get_loader,
+    is_supported,
     set_access_control_config
 )
 
@@ -31,20 +40,31 @@ LLM_API_KEY = settings.llm.api_key
 
 if not LLM_API_KEY:
     raise ValueError("LLM_API_KEY environment variable is not set.")
-match settings.llm.provider:
-    case "cerebras":
-        Settings.llm = Cerebras(model=settings.llm.model_name, api_key=LLM_API_KEY)
-    case "groq":
-        Settings.llm = Groq(model=settings.llm.model_name, api_key=LLM_API_KEY)
-    case _:
-        raise ValueError(f"Unsupported LLM provider: {settings.llm.provider}")
-
-embed_model = HuggingFaceEmbedding(
+if settings.llm.router.enabled:
+    # Hedged and fallback requests across [llm] and [[llm.router.fallbacks]]
+    Settings.llm = build_router(settings.llm)
+else:
+    Settings.llm = create_provider_llm(settings.llm.provider, settings.llm.model_name, LLM_API_KEY, settings.llm.base_url)
+
+base_embed_model = HuggingFaceEmbedding(
     model_name=settings.embedding.model_name,
     trust_remote_code=True,
-    model_kwargs={"attn_implementation": "sdpa"}
+    model_kwargs={"attn_implementation": "sdpa"},
+    # Length-bucketed ingestion batches are sized by token budget; each one should be a single forward pass
+    embed_batch_size=settings.embedding.ingest_max_batch if settings.embedding.ingest_length_bucketing else DEFAULT_EMBED_BATCH_SIZE
 )
-embed_chunking_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L12-v2")
+# Concurrent queries share forward passes; ingestion embeddings go straight to the model
+embed_model = BatchedQueryEmbedding(
+    base_embed_model,
+    window_ms=settings.embedding.query_batch_window_ms,
+    max_batch=settings.embedding.query_max_batch
+) if settings.embedding.query_batching else base_embed_model
+if settings.ingestion.chunking_model == "retrieval":
+    # One model for splitting and retrieval instead of loading MiniLM as well
+    set_chunking_model(base_embed_model)
+configure_profiler(settings.profiling.trace_path)
+metrics.configure(settings.metrics.path, settings.metrics.format)
+condense_policy = CondensePolicy(settings.condense)
 STATE_FILE = os.path.join(settings.vector_store.path, "kb_state.json")
 ACCESS_CONTROL_FILE = "access_config.json"
 ACCESS_CONTROL_STATUS = "private"
@@ -55,8 +75,6 @@ ACCESS_CONTROL_STATUS = "private"
 
 def sync_access_levels():
     print("🔄 Syncing access levels across the database...")
-    db_path = settings.vector_store.path
-    collection_name = settings.vector_store.collection_name
     config_path = ACCESS_CONTROL_FILE
 
     if not os.path.exists(config_path):
@@ -70,51 +88,69 @@ def sync_access_levels():
         print(f"❌ Error loading access config: {e}")
         return
 
-    try:
-        db = chromadb.PersistentClient(path=db_path)
-        collection = db.get_collection(name=collection_name)
-    except Exception as e:
-        print(f"❌ Error connecting to database: {e}")
-        return
+    if _table_store is not None:
+        updated_tables = _table_store.sync_access_levels(access_config)
+        if updated_tables:
+            print(f"✅ Updated access levels for {updated_tables} table file(s).")
 
-    existing_data = collection.get(include=["metadatas"])
-    ids_to_update = []
-    metadatas_to_update = []
-    update_count = 0
-    total_chunks = len(existing_data["ids"])
+    updates = {}
+    total_chunks = _backend.count()
     print(f"📊 Scanning {total_chunks} chunks...")
 
-    for i, doc_id in enumerate(existing_data["ids"]):
-        current_metadata = existing_data["metadatas"][i]  # ty:ignore[non-subscriptable]
-        file_name = current_metadata.get("file_name")
-
-        if not file_name:
-            continue
+    try:
+        for node in _backend.iter_nodes():
+            file_name = node.metadata.get("file_name")
 
-        target_access = access_config.get(file_name, "public")
-        current_access = current_metadata.get("access_level")
+            if not file_name:
+                continue
 
-        if current_access != target_access:
-            current_metadata["access_level"] = target_access  # ty:ignore[invalid-assignment]
-            ids_to_update.append(doc_id)
-            metadatas_to_update.append(current_metadata)
-            update_count += 1
+            target_access = file_access_level(file_name, access_config)
+            current_access = node.metadata.get("access_level")
 
-    if ids_to_update:
-        print(f"📝 Updating {len(ids_to_update)} chunks...")
-        batch_size = 5000
+            if current_access != target_access:
+                updates[node.node_id] = {"access_level": target_access}
+    except Exception as e:
+        print(f"❌ Error reading database: {e}")
+        return
 
-        for i in range(0, len(ids_to_update), batch_size):
-            end = i + batch_size
-            collection.update(
-                ids=ids_to_update[i:end],
-                metadatas=metadatas_to_update[i:end]
-            )
+    detached = set()
+    if _dedup is not None:
+        detached = _dedup.sync_access_levels(access_config, _backend)
+    _level_counts.clear()
 
-        print(f"✅ Successfully updated access levels for {update_count} chunks.")
+    if updates:
+        print(f"📝 Updating {len(updates)} chunks...")
+        _backend.update_metadata(updates)
+        _flat_index.invalidate()
+        print(f"✅ Successfully updated access levels for {len(updates)} chunks.")
     else:
         print("✅ No access level changes required.")
 
+    if detached:
+        # Their content was stored once under a file now at another access level
+        print(f"🔁 Re-indexing {len(detached)} file(s) whose shared chunks changed access level...")
+        reindex_files(detached)
+        if _index_instance is not None:
+            drain_queue(_index_instance)
+
+def file_access_level(file_name: str, access_config: dict) -> str:
+    return access_config.get(file_name, DEFAULT_ACCESS_LEVEL)
+
+def load_access_config() -> dict:
+    try:
+        return get_access_control_config()
+    except Exception:
+        return {}
+
+def reindex_files(filenames):
+    """Queue files for a full re-ingestion even though they did not change on disk."""
+    files = ingestion_files(settings.domain.domain_path, sorted(filenames))
+    missing = set(filenames) - set(files)
+    if missing:
+        print(f"⚠️ Cannot re-index {', '.join(sorted(missing))}: not in {settings.domain.domain_path}.")
+    if files:
+        _queue.enqueue(files, force=True)
+
 def get_access_control_config():
     with open(ACCESS_CONTROL_FILE, 'r') as f:
         config = json.load(f)
@@ -138,60 +174,209 @@ def save_access_control_config(config: dict):
     config_path = ACCESS_CONTROL_FILE
     with open(config_path, 'w') as f:
         json.dump(config, f, indent=4)
+    # Files parsed from now on (e.g. re-indexed by sync_access_levels) get the new levels
+    set_access_control_config(config)
 
 set_access_control_config(get_access_control_config())
 
-def get_node_parser():
-    def _simple_sentence_splitter(text: str):
-        sentences = re.split(r'(?<=[\.\!\?])\s+', text.strip())
-        return [s.strip() for s in sentences if s.strip()]
-
-    return SemanticSplitterNodeParser(
-        buffer_size=1,
-        breakpoint_percentile_threshold=70,
-        sentence_splitter=_simple_sentence_splitter,
-        embed_model=embed_chunking_model
-    )
-
-def get_documents(path: str):
-    documents = []
+def embed_nodes(nodes):
+    with profiler.stage("embedding", items_in=len(nodes)) as record:
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        if settings.embedding.ingest_length_bucketing:
+            embeddings, stats = embed_texts(
+                base_embed_model, texts,
+                token_budget=settings.embedding.ingest_token_budget,
+                max_batch=settings.embedding.ingest_max_batch
+            )
+            profiler.count("embedding_batches", stats["batches"])
+            profiler.count("embedding_tokens", stats["tokens"])
+            profiler.count("embedding_padded_tokens", stats["padded_tokens"])
+        else:
+            embeddings = embed_model.get_text_embedding_batch(texts)
+        record["items_out"] = len(embeddings)
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+
+def deduplicate_nodes(nodes):
+    if _dedup is None:
+        return None
+    # Merge under the level sync_access_levels will give the chunks, so merges never cross levels
+    access_config = load_access_config()
+    for node in nodes:
+        node.metadata["access_level"] = file_access_level(node.metadata.get("file_name"), access_config)
+    with profiler.stage("dedup", items_in=len(nodes)) as record:
+        plan = _dedup.plan(nodes)
+        record["items_out"] = len(plan.kept)
+    return plan
+
+def index_nodes(index: VectorStoreIndex, nodes):
+    plan = deduplicate_nodes(nodes)
+    if plan is not None:
+        nodes = plan.kept
+    # Chunks restored from an ingestion checkpoint already carry their embeddings
+    pending = [node for node in nodes if node.embedding is None]
+    if pending:
+        embed_nodes(pending)
+    with profiler.stage("vector_write", items_in=len(nodes)):
+        index.insert_nodes(nodes)
+    _catalog.add_nodes(nodes, plan.shared if plan is not None else None)
+    if plan is not None:
+        _dedup.commit(plan, _backend)
+        vector_bytes = len(nodes[0].embedding) * 4 if nodes and nodes[0].embedding else 0
+        profiler.count("chunks_deduplicated", plan.duplicates)
+        profiler.count("dedup_bytes_avoided", plan.duplicate_bytes + plan.duplicates * vector_bytes)
+
+def embed_table_rows() -> bool:
+    return _table_store is None or settings.tables.embed_rows
+
+def sync_tables():
+    if _table_store is None:
+        return
+    try:
+        access_config = get_access_control_config()
+    except Exception:
+        access_config = {}
+    changes = _table_store.sync_files(settings.domain.domain_path, access_config)
+    if changes["dropped"]:
+        print(f"🗑️ Dropped tables for: {', '.join(changes['dropped'])}")
+
+def ingestion_files(path: str, filenames: list[str] | None = None) -> dict[str, str]:
+    """Files under `path` that are indexed as chunks (tabular files are skipped when rows are not embedded)."""
     if not os.path.exists(path):
         os.makedirs(path)
-        return []
-
-    print(f"📂 Scanning folder: {path}")
-    filenames = sorted(os.listdir(path))
-
-    for filename in filenames:
+        return {}
+    files = {}
+    for filename in sorted(filenames if filenames is not None else os.listdir(path)):
         full_path = os.path.join(path, filename)
-        try:
-            if filename.lower().endswith(".pdf"):
-                documents.append(get_document_from_pdf(full_path))
-                print(f"   - Added PDF: {filename}")
-            elif filename.lower().endswith(".txt"):
-                documents.append(get_document_from_txt(full_path))
-                print(f"   - Added TXT: {filename}")
-            elif filename.lower().endswith(".md"):
-                documents.append(get_document_from_md(full_path))
-                print(f"   - Added MD: {filename}")
-            elif filename.lower().endswith(".docx"):
-                documents.append(get_document_from_docx(full_path))
-                print(f"   - Added DOCX: {filename}")
-            elif filename.lower().endswith(".csv"):
-                documents.append(get_document_from_csv(full_path))
-                print(f"   - Added CSV: {filename}")
-            elif filename.lower().endswith(".xlsx"):
-                documents.append(get_document_from_xlsx(full_path))
-                print(f"   - Added XLSX: {filename}")
-            elif filename.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".gif")):
-                documents.append(get_document_from_image(full_path))
-                print(f"   - Added IMAGE: {filename}")
-        except Exception as e:
-            print(f"   ❌ Error reading file {filename}: {e}")
+        if not os.path.isfile(full_path):
+            continue
+        loader = get_loader(full_path)
+        if loader is None or (loader.tabular and not embed_table_rows()):
+            continue
+        files[filename] = full_path
+    return files
+
+def remove_file_chunks(filename: str):
+    if _dedup is not None:
+        # Chunks are only handed to files at their own level; the others are re-indexed by the next drain
+        detached = _dedup.remove_file(filename, _backend, load_access_config())
+        if detached:
+            reindex_files(detached)
+    _backend.delete_by_file(filename)
+    _catalog.remove_file(filename)
+
+def advance_job(index: VectorStoreIndex, job: dict):
+    """Take one queued file through its remaining stages, batch by batch, checkpointing as it goes."""
+    filename, stage = job["file_name"], job["stage"]
+    batch_size = settings.ingestion.checkpoint_chunks
+    try:
+        if stage == "pending":
+            parse_job(_queue, filename, job["path"])
+            stage = "parsed"
+        if stage == "parsed":
+            # Old chunks go first, so a modified file is not deduplicated against its previous version
+            remove_file_chunks(filename)
+            for batch in _queue.iter_nodes(filename, batch_size):
+                nodes = [node for _, node in batch]
+                plan = deduplicate_nodes(nodes)
+                kept = {node.node_id for node in (plan.kept if plan is not None else nodes)}
+                # Single-model chunking may already have attached pooled chunk embeddings, and a resumed
+                # stage skips the batches it already embedded
+                pending = [(seq, node) for seq, node in batch if node.node_id in kept and node.embedding is None]
+                if pending:
+                    embed_nodes([node for _, node in pending])
+                    _queue.save_embeddings(filename, pending)
+            _queue.finish_stage(filename, "embedded")
+            stage = "embedded"
+        # Clears whatever a crashed insert left behind; the dedup plan is recomputed against the store
+        remove_file_chunks(filename)
+        count = 0
+        for batch in _queue.iter_nodes(filename, batch_size):
+            nodes = [node for _, node in batch]
+            index_nodes(index, nodes)
+            count += len(nodes)
+        _queue.complete(filename, count)
+        print(f"   - Indexed: {filename} ({count} chunks)")
+    except Exception as e:
+        retry = _queue.fail(filename, f"{stage}: {e}")
+        print(f"   ❌ Error processing {filename} ({stage}): {e}" + (" Will retry." if retry else " Giving up."))
+
+@profiler.run("ingest_queue")
+def drain_queue(index: VectorStoreIndex) -> dict[str, str]:
+    """Run queued jobs until none is left; returns the files that failed for good.
+
+    With `ingestion.queue_workers` > 1, parsing runs in that many worker
+    processes while this process embeds and inserts, so the embedding model
+    and the vector store keep a single owner.
+    """
+    _queue.recover()
+    if not _queue.unfinished():
+        return _queue.failed()
+
+    workers = settings.ingestion.queue_workers
+    processes = start_parse_workers(workers, ACCESS_CONTROL_FILE) if workers > 1 else []
+    owner = f"app-{os.getpid()}"
+    try:
+        while True:
+            parsing = any(p.poll() is None for p in processes)
+            if processes and not parsing:
+                # A worker that died mid-job leaves its lease behind
+                _queue.recover()
+                processes = []
+            job = _queue.claim(owner, ("parsed", "embedded") if parsing else None)
+            if job is None:
+                if parsing:
+                    time.sleep(0.5)
+                    continue
+                wait = _queue.next_retry_in()
+                if wait is None:
+                    break
+                print(f"⏳ Next retry in {wait:.0f}s...")
+                time.sleep(wait)
+                continue
+            advance_job(index, job)
+            print(_queue.progress_line())
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+
+    _flat_index.invalidate()
+    failed = _queue.failed()
+    for filename, error in failed.items():
+        print(f"   ❌ Gave up on {filename}: {error}")
+    return failed
+
+def save_state(filenames):
+    """Record processed files in STATE_FILE; failed ones keep their old entry, so the next check retries them."""
+    state = {}
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, 'r') as f:
+            try:
+                state = json.load(f)
+            except json.JSONDecodeError:
+                state = {}
+    current_state = get_current_state(settings.domain.domain_path)
+    failed = _queue.failed()
+    for filename in filenames:
+        if filename in failed:
+            continue
+        if filename in current_state:
+            state[filename] = current_state[filename]
+        else:
+            state.pop(filename, None)
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    with open(STATE_FILE, 'w') as f:
+        json.dump(state, f)
 
-    splitter = get_node_parser()
-    nodes = splitter.get_nodes_from_documents(documents)
-    return nodes
+def resume_ingestion():
+    """Finish the jobs an interrupted update or rebuild left in the queue."""
+    unfinished = _queue.unfinished()
+    if not unfinished:
+        return
+    print(f"⏯️ Resuming {unfinished} unfinished ingestion job(s)...")
+    drain_queue(_index_instance)
+    save_state(_queue.file_names())
 
 def get_current_state(path: str):
     state = {}
@@ -199,10 +384,8 @@ def get_current_state(path: str):
         return state
     for filename in os.listdir(path):
         full_path = os.path.join(path, filename)
-        if os.path.isfile(full_path) and (filename.lower().endswith('.pdf')
-            or filename.lower().endswith('.txt') or filename.lower().endswith('.csv') or filename.lower().endswith('.xlsx')
-            or filename.lower().endswith('.md')) or filename.lower().endswith('.docx') or filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-             state[filename] = os.path.getmtime(full_path)
+        if os.path.isfile(full_path) and is_supported(full_path):
+            state[filename] = os.path.getmtime(full_path)
     return state
 
 def check_for_updates():
@@ -241,98 +424,54 @@ def check_for_updates():
 
     return changes
 
+@profiler.run("update_knowledge_base")
 def update_knowledge_base(changes):
     domain_path = settings.domain.domain_path
-    db_path = settings.vector_store.path
-    collection_name = settings.vector_store.collection_name
-    db = chromadb.PersistentClient(path=db_path)
-    collection = db.get_collection(name=collection_name)
-    files_to_delete = changes['deleted'] + changes['modified']
 
-    for filename in files_to_delete:
+    for filename in changes['deleted']:
         print(f"🗑️ Removing old chunks for: {filename}")
-        collection.delete(where={"file_name": filename})
+        remove_file_chunks(filename)
+        _queue.remove(filename)
+
+    _flat_index.invalidate()
 
     files_to_add = changes['added'] + changes['modified']
 
     if files_to_add:
         print(f"🔄 Processing {len(files_to_add)} new/updated files...")
-        new_documents = []
-
+        queued = ingestion_files(domain_path, files_to_add)
         for filename in files_to_add:
-            full_path = os.path.join(domain_path, filename)
-            try:
-                if filename.lower().endswith(".pdf"):
-                    new_documents.append(get_document_from_pdf(full_path))
-                elif filename.lower().endswith(".txt"):
-                    new_documents.append(get_document_from_txt(full_path))
-                elif filename.lower().endswith(".md"):
-                    new_documents.append(get_document_from_md(full_path))
-                elif filename.lower().endswith(".docx"):
-                    new_documents.append(get_document_from_docx(full_path))
-                elif filename.lower().endswith(".csv"):
-                    new_documents.append(get_document_from_csv(full_path))
-                elif filename.lower().endswith(".xlsx"):
-                    new_documents.append(get_document_from_xlsx(full_path))
-                elif filename.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".gif")):
-                    new_documents.append(get_document_from_image(full_path))
-                print(f"   - Processed: {filename}")
-            except Exception as e:
-                print(f"   ❌ Error reading {filename}: {e}")
-
-        if new_documents:
-             splitter = get_node_parser()
-             nodes = splitter.get_nodes_from_documents(new_documents)
-
-             if nodes:
-                 print(f"📥 Inserting {len(nodes)} chunks into database...")
-                 _index_instance.insert_nodes(nodes)
-             else:
-                 print("⚠️ No content chunks created from documents.")
+            if filename not in queued:
+                remove_file_chunks(filename)
+        # Modified files keep their old chunks until their job reaches the embedding stage
+        _queue.enqueue(queued)
 
-    current_state = get_current_state(domain_path)
-    with open(STATE_FILE, 'w') as f:
-        json.dump(current_state, f)
+    drain_queue(_index_instance)
+    sync_tables()
+    save_state(changes['added'] + changes['modified'] + changes['deleted'])
 
     print("✅ Knowledge base updated!")
 
+@profiler.run("rebuild_knowledge_base")
 def rebuild_knowledge_base():
     print("⚠️  Initiating full knowledge base rebuild...")
     global _index_instance
     _index_instance = None
     gc.collect()
     time.sleep(0.5)
-    db_path = settings.vector_store.path
-    collection_name = settings.vector_store.collection_name
 
     try:
-        db = chromadb.PersistentClient(path=db_path)
-        try:
-            db.delete_collection(name=collection_name)
-            print(f"🗑️  Collection '{collection_name}' deleted via API.")
-        except ValueError:
-            pass
+        _backend.reset()
+        _flat_index.invalidate()
+        _queue.reset()
+        _catalog.reset()
+        if _dedup is not None:
+            _dedup.reset()
+        if _table_store is not None:
+            _table_store.reset()
     except Exception as e:
         print(f"⚠️ API cleanup warning: {e}")
 
-    if os.path.exists(db_path):
-        print("🧹 Cleaning up storage artifacts...")
-        for item in os.listdir(db_path):
-            item_path = os.path.join(db_path, item)
-
-            try:
-                if os.path.isdir(item_path):
-                    shutil.rmtree(item_path)
-                    print(f"   - Removed artifact: {item}")
-
-                elif os.path.isfile(item_path) and not item.endswith(".sqlite3"):
-                     os.remove(item_path)
-
-            except PermissionError:
-                pass
-            except Exception as e:
-                print(f"   ⚠️ Could not remove {item}: {e}")
-
     if os.path.exists(STATE_FILE):
         try:
             os.remove(STATE_FILE)
@@ -343,12 +482,10 @@ def rebuild_knowledge_base():
     print("🔄 Starting re-indexing process...")
     try:
         _index_instance = initialize_index()
+        sync_tables()
 
         try:
-            current_state = get_current_state(settings.domain.domain_path)
-            os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
-            with open(STATE_FILE, 'w') as f:
-                json.dump(current_state, f)
+            save_state(get_current_state(settings.domain.domain_path))
             print("💾 New state file saved.")
         except Exception as e:
             print(f"⚠️ Warning: Could not save state file: {e}")
@@ -357,57 +494,169 @@ def rebuild_knowledge_base():
         print(f"❌ Critical error during indexing: {e}")
 
 def initialize_index():
-    db_path = settings.vector_store.path
-    collection_name = settings.vector_store.collection_name
-    db = chromadb.PersistentClient(path=db_path)
-    hnsw_config = {
-        "hnsw:space": "cosine",
-        "hnsw:construction_ef": 200,
-        "hnsw:M": 64,
-        "hnsw:search_ef": 200
-    }
-    chroma_collection = db.get_or_create_collection(name=collection_name, metadata=hnsw_config)
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-
-    if chroma_collection.count() > 0:
-        print(f"💾 Found existing database ({chroma_collection.count()} chunks). Loading...")
+    vector_store = _backend.vector_store
+    chunk_count = _backend.count()
+
+    if chunk_count > 0:
+        print(f"💾 Found existing database ({chunk_count} chunks, {_backend.name}). Loading...")
         index = VectorStoreIndex.from_vector_store(
             vector_store,
             embed_model=embed_model,
         )
     else:
         print("🆕 Database is empty or not found. Creating index...")
-        documents = get_documents(settings.domain.domain_path)
+        files = ingestion_files(settings.domain.domain_path)
 
-        if not documents:
+        index = VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
+
+        if not files:
             print("⚠️ No documents to index! Please place files in the data/ folder")
-            return VectorStoreIndex.from_documents([], storage_context=storage_context, embed_model=embed_model)
+            return index
 
-        index = VectorStoreIndex.from_documents(
-            documents,
-            storage_context=storage_context,
-            embed_model=embed_model
-        )
+        print(f"📂 Queued {len(files)} files from {settings.domain.domain_path}")
+        _queue.enqueue(files)
+        drain_queue(index)
         print("✅ Indexing complete and saved!")
 
     return index
 
-def initialize_memory():
+def initialize_memory(session_id: str | None = None):
     global _memory
-    if _memory is None:
-        _memory = ChatMemoryBuffer.from_defaults(token_limit=4000)
+    if _memory is None or (session_id and session_id != _memory.session_id):
+        config = settings.memory
+        if _memory is not None:
+            _memory.wait()
+        _memory = SessionMemory.from_defaults(
+            llm=Settings.llm,
+            session_id=session_id or config.session_id,
+            db_path=config.path or os.path.join(settings.vector_store.path, "sessions.sqlite3"),
+            token_limit=config.token_limit,
+            summarize_after=config.summarize_after,
+            keep_recent=config.keep_recent
+        )
     return _memory
 
+def switch_session(session_id: str):
+    return initialize_memory(session_id)
+
+def list_sessions() -> tuple[list[str], str]:
+    """Saved session ids and the active one."""
+    memory = initialize_memory()
+    return memory.list_sessions(), memory.session_id
+
+def export_session(path: str | None = None) -> str:
+    memory = initialize_memory()
+    path = path or f"{memory.session_id}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(memory.export())
+    return path
+
 def reset_chat_history():
     global _memory
     if _memory:
         _memory.reset()
 
+_backend = create_backend(settings.vector_store)
+_flat_index = FlatIndex(
+    os.path.join(settings.vector_store.path, "flat"),
+    dtype=settings.vector_store.flat_dtype
+)
+_dedup = ChunkDeduplicator(
+    os.path.join(settings.vector_store.path, "dedup.sqlite3"), settings.dedup
+) if settings.dedup.enabled else None
+_table_store = TableStore(
+    settings.tables.path or os.path.join(settings.vector_store.path, "tables.sqlite3")
+) if settings.tables.enabled else None
+_queue = IngestQueue.from_settings()
+_catalog = FileCatalog(os.path.join(settings.vector_store.path, "file_catalog.sqlite3"))
+_level_counts: dict[str, int] = {}
+_level_counts_version = -1
+if _catalog.chunk_count() != _backend.count():
+    print("🗂️ Building file catalog...")
+    _catalog.build(_backend)
 _index_instance = initialize_index()
+resume_ingestion()
 _memory = None
+sync_tables()
 sync_access_levels()
 
+def get_backend():
+    return _backend
+
+def get_flat_index() -> FlatIndex | None:
+    if settings.vector_store.flat_search == "never":
+        return None
+    chunk_count = _backend.count()
+    if len(_flat_index) != chunk_count:
+        _flat_index.load()
+    if len(_flat_index) != chunk_count:
+        print(f"🧮 Building flat search mirror for {chunk_count} chunks...")
+        _flat_index.build(_backend)
+    return _flat_index
+
+def use_flat_search(file_filters: list[str], ids: set[str] | None = None) -> bool:
+    mode = settings.vector_store.flat_search
+    if mode == "never":
+        return False
+    if mode == "always" or _backend.count() <= settings.vector_store.flat_max_chunks:
+        return True
+    if ids is not None:
+        # The @file id set is the candidate list; backend metadata filters also cannot reach
+        # chunks shared with the targets but owned by another file
+        shared = _dedup is not None and bool(_dedup.shared_ids(file_filters))
+        return shared or len(ids) <= settings.vector_store.flat_max_filtered
+    # Only build the flat mirror once flat search is actually chosen
+    return access_level_chunk_count(ACCESS_CONTROL_STATUS) <= settings.vector_store.flat_max_filtered
+
+def access_level_chunk_count(level: str) -> int:
+    """Chunks at one access level, counted from the file catalog and cached until it changes."""
+    global _level_counts_version
+    if _level_counts_version != _catalog.version:
+        _level_counts.clear()
+        _level_counts_version = _catalog.version
+    if level not in _level_counts:
+        access_config = load_access_config()
+        files = [f for f in _catalog.file_names() if file_access_level(f, access_config) == level]
+        _level_counts[level] = _catalog.chunk_count(files)
+    return _level_counts[level]
+
+def resolve_file_filters(tokens: list[str]) -> list[Resolution]:
+    """Resolve @tokens (exact name, glob such as `q3_*.pdf`, or prefix) against the file catalog.
+
+    Only files at the current access level are matched or suggested.
+    """
+    access_config = load_access_config()
+    def visible(file_name: str) -> bool:
+        return file_access_level(file_name, access_config) == ACCESS_CONTROL_STATUS
+
+    resolutions = []
+    for token in tokens:
+        resolution = _catalog.resolve(token, visible)
+        if not resolution.files and _table_store is not None:
+            # Tables kept in SQL only have no chunks in the catalog
+            tables = sorted({t["file_name"] for t in _table_store.tables(ACCESS_CONTROL_STATUS)})
+            resolution.files = [f for f in tables if f.lower() == token.lower()] or [
+                f for f in tables if fnmatch.fnmatch(f.lower(), token.lower()) or f.lower().startswith(token.lower())
+            ]
+            if resolution.files:
+                resolution.suggestions = []
+        resolutions.append(resolution)
+    return resolutions
+
+def get_retriever(filters: MetadataFilters, file_filters: list[str]):
+    top_k = settings.vector_store.top_k
+    ids = _catalog.ids(file_filters) if file_filters else None
+    if use_flat_search(file_filters, ids):
+        return FlatRetriever(
+            get_flat_index(),
+            _backend,
+            embed_model,
+            top_k=top_k,
+            access_level=ACCESS_CONTROL_STATUS,
+            ids=ids
+        )
+    return _index_instance.as_retriever(filters=filters, similarity_top_k=top_k)
+
 def get_response(query_text: str, file_filters: list[str] = []):
     if _index_instance is None:
         raise ValueError("Index is not initialized. Run rebuild or check startup.")
@@ -416,6 +665,50 @@ def get_response(query_text: str, file_filters: list[str] = []):
         reset_chat_history()
         return "Chat history cleared."
 
+    trace = metrics.start_trace(query_text)
+    response = answer_from_tables(query_text, file_filters, trace)
+    if response is not None:
+        trace.finish()
+        metrics.record(trace)
+        return response
+
+    with trace.span("build_engine"):
+        chat_engine = build_chat_engine(file_filters, trace)
+    response = chat_engine.chat(query_text)
+    trace.finish()
+    metrics.record(trace)
+    return response
+
+def answer_from_tables(query_text: str, file_filters: list[str], trace=None) -> AgentChatResponse | None:
+    """Answer aggregate questions over visible tables with SQL; None falls back to vector retrieval."""
+    if _table_store is None or not is_aggregate_question(query_text):
+        return None
+    visible = _table_store.tables(ACCESS_CONTROL_STATUS, file_filters or None)
+    tables = visible if file_filters else _table_store.relevant_tables(query_text, visible)
+    if not tables:
+        return None
+
+    memory = initialize_memory()
+    history = "\n".join(f"{m.role.value}: {m.content}" for m in memory.get()[-4:])
+    try:
+        result = answer_with_sql(_table_store, query_text, tables, Settings.llm, settings.tables.max_rows, history, trace)
+    except Exception as e:
+        print(f"⚠️ SQL route failed ({e}), falling back to document search.")
+        return None
+    if result is None:
+        print("⚠️ SQL route found no rows, falling back to document search.")
+        return None
+
+    trace.set("sql_routed", 1)
+    memory.put(ChatMessage(role=MessageRole.USER, content=query_text))
+    memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=result["answer"]))
+    source = TextNode(
+        text=f"{result['sql']}\n{result['result']}",
+        metadata={"file_name": ", ".join(sorted({t["file_name"] for t in tables}))}
+    )
+    return AgentChatResponse(response=result["answer"], source_nodes=[NodeWithScore(node=source, score=1.0)])
+
+def build_chat_engine(file_filters: list[str], trace=None):
     filters_list = [
         MetadataFilter(key="access_level", value=ACCESS_CONTROL_STATUS)
     ]
@@ -435,11 +728,13 @@ def get_response(query_text: str, file_filters: list[str] = []):
         condition=FilterCondition.AND
     )
     memory = initialize_memory()
-    chat_engine = _index_instance.as_chat_engine(
-        chat_mode="condense_plus_context",
+    return RAGChatEngine.create(
+        retriever=get_retriever(filters, file_filters),
+        llm=Settings.llm,
         memory=memory,
-        filters=filters,
-        similarity_top_k=settings.vector_store.top_k,
+        embed_model=embed_model,
+        trace=trace,
+        condense_policy=condense_policy,
         context_prompt=(
             "You are a helpful assistant capable of answering questions about the provided documents.\n"
             "Here are the relevant documents for the context:\n"
@@ -453,8 +748,12 @@ def get_response(query_text: str, file_filters: list[str] = []):
         ),
         verbose=False
     )
-    response = chat_engine.chat(query_text)
-    return response
+
+def get_query_stats() -> dict:
+    stats = {"summary": metrics.summary(), "last": metrics.last_trace}
+    if isinstance(Settings.llm, LLMRouter):
+        stats["llm_router"] = Settings.llm.stats()
+    return stats
 
 if __name__ == "__main__":
     print(get_documents_access_control())
@@ -0,0 +1,219 @@
+import os
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any
+from pydantic import PrivateAttr
+from llama_index.core.llms import ChatMessage, MessageRole, LLM
+from llama_index.core.memory.types import BaseMemory
+from llama_index.core.utils import get_tokenizer
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a user and an assistant.\n"
+    "Keep names, numbers, documents and open questions; drop small talk. Reply with the summary only.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New messages:\n{messages}\n\n"
+    "Updated summary:"
+)
+
+_summary_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+
+
+class SessionMemory(BaseMemory):
+    """Chat memory persisted in SQLite per session id.
+
+    Token counts are computed once per message when it is stored. When the
+    retained turns exceed `summarize_after` tokens, the oldest ones are
+    folded into a rolling summary on a background thread; `get` never
+    waits for it and simply trims to `token_limit` in the meantime.
+    """
+
+    session_id: str
+    db_path: str
+    token_limit: int = 4000
+    summarize_after: int = 3000
+    keep_recent: int = 1500
+
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    _conn: Any = PrivateAttr(default=None)
+    _llm: LLM | None = PrivateAttr(default=None)
+    _tokenizer: Any = PrivateAttr(default=None)
+    _messages: list = PrivateAttr(default_factory=list)  # [(seq, ChatMessage, tokens)]
+    _summary: str = PrivateAttr(default="")
+    _summary_tokens: int = PrivateAttr(default=0)
+    _next_seq: int = PrivateAttr(default=0)
+    _pending: Future | None = PrivateAttr(default=None)
+
+    def __init__(self, llm: LLM | None = None, **data):
+        super().__init__(**data)
+        self._llm = llm
+        self._tokenizer = get_tokenizer()
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT, seq INTEGER, role TEXT, content TEXT, tokens INTEGER, summarized INTEGER DEFAULT 0,
+                PRIMARY KEY (session_id, seq)
+            );
+            CREATE TABLE IF NOT EXISTS summaries (
+                session_id TEXT PRIMARY KEY, summary TEXT, tokens INTEGER
+            );
+            """
+        )
+        self._load()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SessionMemory"
+
+    @classmethod
+    def from_defaults(cls, chat_history: list[ChatMessage] | None = None, llm: LLM | None = None, **kwargs) -> "SessionMemory":
+        memory = cls(llm=llm, **kwargs)
+        if chat_history:
+            memory.set(chat_history)
+        return memory
+
+    def _load(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, role, content, tokens FROM messages WHERE session_id = ? AND summarized = 0 ORDER BY seq",
+                (self.session_id,)
+            ).fetchall()
+            self._messages = [(seq, ChatMessage(role=MessageRole(role), content=content), tokens) for seq, role, content, tokens in rows]
+            last = self._conn.execute("SELECT MAX(seq) FROM messages WHERE session_id = ?", (self.session_id,)).fetchone()[0]
+            self._next_seq = (last or 0) + 1
+            summary = self._conn.execute(
+                "SELECT summary, tokens FROM summaries WHERE session_id = ?", (self.session_id,)
+            ).fetchone()
+            self._summary, self._summary_tokens = summary if summary else ("", 0)
+
+    def _count(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def _summary_message(self) -> list[ChatMessage]:
+        if not self._summary:
+            return []
+        return [ChatMessage(role=MessageRole.SYSTEM, content=f"Summary of the earlier conversation: {self._summary}")]
+
+    def get(self, input: str | None = None, initial_token_count: int = 0, **kwargs) -> list[ChatMessage]:
+        with self._lock:
+            budget = self.token_limit - initial_token_count - self._summary_tokens
+            kept = []
+            for _, message, tokens in reversed(self._messages):
+                if tokens > budget:
+                    break
+                kept.append(message)
+                budget -= tokens
+            kept.reverse()
+            # Never start the window with an orphaned assistant reply
+            while kept and kept[0].role != MessageRole.USER:
+                kept.pop(0)
+            return self._summary_message() + kept
+
+    def get_all(self) -> list[ChatMessage]:
+        with self._lock:
+            return self._summary_message() + [message for _, message, _ in self._messages]
+
+    def put(self, message: ChatMessage) -> None:
+        content = str(message.content or "")
+        tokens = self._count(content)
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._messages.append((seq, message, tokens))
+            self._conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content, tokens) VALUES (?, ?, ?, ?, ?)",
+                (self.session_id, seq, message.role.value, content, tokens)
+            )
+            self._conn.commit()
+        self._maybe_summarize()
+
+    def set(self, messages: list[ChatMessage]) -> None:
+        self.reset()
+        for message in messages:
+            self.put(message)
+
+    def reset(self) -> None:
+        self.wait()
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (self.session_id,))
+            self._conn.execute("DELETE FROM summaries WHERE session_id = ?", (self.session_id,))
+            self._conn.commit()
+            self._messages = []
+            self._summary, self._summary_tokens = "", 0
+
+    @property
+    def retained_tokens(self) -> int:
+        with self._lock:
+            return self._summary_tokens + sum(tokens for _, _, tokens in self._messages)
+
+    def wait(self):
+        """Block until a running background summary finishes (tests, shutdown)."""
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def _maybe_summarize(self):
+        if self._llm is None or self.retained_tokens <= self.summarize_after:
+            return
+        if self._pending is not None and not self._pending.done():
+            return
+        self._pending = _summary_pool.submit(self._summarize)
+
+    def _summarize(self):
+        with self._lock:
+            budget = self.keep_recent
+            split = len(self._messages)
+            for i in range(len(self._messages) - 1, -1, -1):
+                budget -= self._messages[i][2]
+                if budget < 0:
+                    break
+                split = i
+            # Fold whole turns only: the kept window starts at a user message
+            while split < len(self._messages) and self._messages[split][1].role != MessageRole.USER:
+                split += 1
+            old = self._messages[:split]
+            summary = self._summary
+        if not old:
+            return
+
+        transcript = "\n".join(f"{m.role.value}: {m.content}" for _, m, _ in old)
+        try:
+            new_summary = str(self._llm.complete(SUMMARY_PROMPT.format(summary=summary or "(none)", messages=transcript))).strip()
+        except Exception as e:
+            print(f"⚠️ Could not summarize chat history: {e}")
+            return
+
+        folded = [seq for seq, _, _ in old]
+        with self._lock:
+            self._messages = [m for m in self._messages if m[0] not in set(folded)]
+            self._summary, self._summary_tokens = new_summary, self._count(new_summary)
+            self._conn.executemany(
+                "UPDATE messages SET summarized = 1 WHERE session_id = ? AND seq = ?",
+                [(self.session_id, seq) for seq in folded]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (session_id, summary, tokens) VALUES (?, ?, ?)",
+                (self.session_id, self._summary, self._summary_tokens)
+            )
+            self._conn.commit()
+
+    def list_sessions(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT session_id FROM messages ORDER BY session_id").fetchall()
+        return [row[0] for row in rows]
+
+    def export(self) -> str:
+        """The full stored transcript (including messages already folded into the summary) as JSON."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq", (self.session_id,)
+            ).fetchall()
+            summary = self._summary
+        return json.dumps({
+            "session_id": self.session_id,
+            "summary": summary,
+            "messages": [{"role": role, "content": content} for role, content in rows],
+        }, ensure_ascii=False, indent=2)
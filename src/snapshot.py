@@ -0,0 +1,254 @@
+"""Knowledge base snapshots for cold-starting new serving nodes.
+
+    python -m src.snapshot export snapshots/kb-2024-06 --dtype int8
+    python -m src.snapshot import snapshots/kb-2024-06
+
+A snapshot holds the stored chunks (`chunks.jsonl.gz`), their embeddings
+as one columnar `.npy` matrix (float16, or int8 with a per-row scale), the
+dedup/table side stores and `manifest.json`. Importing bulk-loads it into
+the configured vector store without running any model.
+"""
+import os
+import gzip
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import numpy as np
+from llama_index.core.schema import TextNode
+from src.config import settings, VectorStoreConfig
+from src.vector_backends import VectorBackend, create_backend, BATCH_SIZE
+
+SNAPSHOT_VERSION = 1
+DTYPES = ("float16", "int8", "float32")
+CHUNKS_FILE = "chunks.jsonl.gz"
+EMBEDDINGS_FILE = "embeddings.npy"
+SCALES_FILE = "scales.npy"
+MANIFEST_FILE = "manifest.json"
+
+
+def side_stores(config: VectorStoreConfig) -> dict[str, str]:
+    """SQLite stores next to the vector store that a serving node needs besides the chunks.
+
+    `kb_state.json` is left out on purpose: its mtimes describe the exporting
+    machine's files, and the new node records its own on first start.
+    """
+    path = config.path
+    return {
+        "dedup.sqlite3": os.path.join(path, "dedup.sqlite3"),
+        "tables.sqlite3": settings.tables.path or os.path.join(path, "tables.sqlite3"),
+    }
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_store(source: str, target: str):
+    # The backup API gives a consistent copy even while the app has the database open
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Encode float32 rows; int8 uses a symmetric per-row scale."""
+    if dtype != "int8":
+        return vectors.astype(dtype), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def dequantize(rows: np.ndarray, scales: np.ndarray | None) -> np.ndarray:
+    rows = rows.astype(np.float32)
+    return rows * scales[:, None] if scales is not None else rows
+
+
+def export_snapshot(backend: VectorBackend, directory: str, dtype: str = "float16") -> dict:
+    """Write every stored chunk with its embedding to `directory`; returns the manifest."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+    os.makedirs(directory, exist_ok=True)
+    start_time = time.perf_counter()
+    count = backend.count()
+    embeddings = None
+    scales = np.zeros(count, dtype=np.float32) if dtype == "int8" else None
+    written = 0
+
+    with gzip.open(os.path.join(directory, CHUNKS_FILE), "wt", encoding="utf-8") as chunks:
+        batch = []
+
+        def flush():
+            nonlocal embeddings, written
+            vectors = np.array([node.embedding for node in batch], dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.lib.format.open_memmap(
+                    os.path.join(directory, EMBEDDINGS_FILE), mode="w+",
+                    dtype=np.int8 if dtype == "int8" else dtype, shape=(count, vectors.shape[1])
+                )
+            rows, row_scales = quantize(vectors, dtype)
+            embeddings[written:written + len(batch)] = rows
+            if scales is not None:
+                scales[written:written + len(batch)] = row_scales
+            for node in batch:
+                data = node.to_dict()
+                data.pop("embedding", None)
+                chunks.write(json.dumps(data) + "\n")
+            written += len(batch)
+            batch.clear()
+
+        for node in backend.iter_nodes(with_embeddings=True):
+            if written + len(batch) >= count:
+                raise RuntimeError("The vector store changed during export; retry once ingestion has finished.")
+            batch.append(node)
+            if len(batch) >= BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+
+    if embeddings is not None:
+        embeddings.flush()
+        dim = embeddings.shape[1]
+        del embeddings
+    else:
+        dim = 0
+    if written != count:
+        raise RuntimeError(f"Exported {written} of {count} chunks; the vector store changed during export.")
+    if scales is not None:
+        np.save(os.path.join(directory, SCALES_FILE), scales)
+
+    stores = {}
+    for name, source in side_stores(backend.config).items():
+        if os.path.exists(source):
+            _copy_store(source, os.path.join(directory, name))
+            stores[name] = name
+
+    files = [CHUNKS_FILE] + ([EMBEDDINGS_FILE] if count else []) + ([SCALES_FILE] if scales is not None else []) + list(stores)
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "embedding_model": settings.embedding.model_name,
+        "source_backend": backend.name,
+        "collection_name": backend.collection_name,
+        "chunks": count,
+        "dim": dim,
+        "dtype": dtype,
+        "stores": stores,
+        "checksums": {name: _sha256(os.path.join(directory, name)) for name in files},
+        "export_s": round(time.perf_counter() - start_time, 3),
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(directory: str, verify: bool = True) -> dict:
+    with open(os.path.join(directory, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.get('version')} (expected {SNAPSHOT_VERSION})")
+    if verify:
+        for name, checksum in manifest["checksums"].items():
+            if _sha256(os.path.join(directory, name)) != checksum:
+                raise ValueError(f"Checksum mismatch for {name}; the snapshot is incomplete or corrupted")
+    return manifest
+
+
+def iter_snapshot(directory: str, manifest: dict, batch_size: int = BATCH_SIZE):
+    """Yield batches of TextNodes with their dequantized embeddings."""
+    embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r") if manifest["chunks"] else None
+    scales = np.load(os.path.join(directory, SCALES_FILE)) if manifest["dtype"] == "int8" else None
+    offset = 0
+    batch = []
+    with gzip.open(os.path.join(directory, CHUNKS_FILE), "rt", encoding="utf-8") as chunks:
+        for line in chunks:
+            batch.append(TextNode.from_dict(json.loads(line)))
+            if len(batch) >= batch_size:
+                yield _attach(batch, embeddings, scales, offset)
+                offset += len(batch)
+                batch = []
+    if batch:
+        yield _attach(batch, embeddings, scales, offset)
+
+
+def _attach(batch: list[TextNode], embeddings, scales, offset: int) -> list[TextNode]:
+    end = offset + len(batch)
+    vectors = dequantize(np.asarray(embeddings[offset:end]), scales[offset:end] if scales is not None else None)
+    for node, vector in zip(batch, vectors):
+        node.embedding = vector.tolist()
+    return batch
+
+
+def import_snapshot(directory: str, config: VectorStoreConfig | None = None, force: bool = False) -> dict:
+    """Replace the configured vector store (and side stores) with a snapshot. No model is loaded."""
+    config = config or settings.vector_store
+    manifest = read_manifest(directory)
+    if manifest["embedding_model"] != settings.embedding.model_name and not force:
+        raise ValueError(
+            f"Snapshot was embedded with {manifest['embedding_model']}, but embedding.model_name is "
+            f"{settings.embedding.model_name}; queries would not match. Use --force to import anyway."
+        )
+
+    start_time = time.perf_counter()
+    backend = create_backend(config)
+    backend.reset()
+    # Derived from the chunks; the app rebuilds them on first use
+    shutil.rmtree(os.path.join(config.path, "flat"), ignore_errors=True)
+    for derived in ("file_catalog.sqlite3", "file_catalog.sqlite3-journal"):
+        if os.path.exists(os.path.join(config.path, derived)):
+            os.remove(os.path.join(config.path, derived))
+    # Ingestion state of whatever was here before: left in place, resume_ingestion would
+    # re-insert old jobs on top of the snapshot and kb_state.json would hide its files' changes
+    queue_path = settings.ingestion.queue_path or os.path.join(config.path, "ingest_queue.sqlite3")
+    for stale in (queue_path, queue_path + "-journal", queue_path + "-wal", queue_path + "-shm", os.path.join(config.path, "kb_state.json")):
+        if os.path.exists(stale):
+            os.remove(stale)
+    loaded = 0
+    for batch in iter_snapshot(directory, manifest):
+        backend.insert(batch)
+        loaded += len(batch)
+        print(f"   - Loaded {loaded}/{manifest['chunks']} chunks")
+
+    targets = side_stores(config)
+    for name in manifest["stores"]:
+        os.makedirs(os.path.dirname(targets[name]) or ".", exist_ok=True)
+        shutil.copyfile(os.path.join(directory, name), targets[name])
+    if "tables.sqlite3" in manifest["stores"]:
+        from src.table_store import TableStore
+        TableStore(targets["tables.sqlite3"]).mark_imported()
+    return {"chunks": loaded, "backend": backend.name, "import_s": time.perf_counter() - start_time}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Export or import a knowledge base snapshot")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="write the current knowledge base to a snapshot directory")
+    export.add_argument("directory")
+    export.add_argument("--dtype", choices=DTYPES, default="float16")
+    restore = sub.add_parser("import", help="bulk-load a snapshot into the configured vector store")
+    restore.add_argument("directory")
+    restore.add_argument("--force", action="store_true", help="import even if the embedding model differs")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        manifest = export_snapshot(create_backend(settings.vector_store), args.directory, args.dtype)
+        size_mb = sum(os.path.getsize(os.path.join(args.directory, n)) for n in manifest["checksums"]) / (1024 * 1024)
+        print(f"📦 Exported {manifest['chunks']} chunks ({manifest['dtype']}, {size_mb:.1f} MB) to {args.directory} in {manifest['export_s']:.1f}s")
+    else:
+        print(f"📥 Importing snapshot from {args.directory}...")
+        result = import_snapshot(args.directory, force=args.force)
+        print(f"✅ Imported {result['chunks']} chunks into {result['backend']} in {result['import_s']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
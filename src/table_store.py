@@ -0,0 +1,322 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from contextlib import nullcontext
+from llama_index.core.llms import LLM
+from src.doc_parser import DEFAULT_ACCESS_LEVEL, iter_csv_rows, iter_xlsx_rows
+
+TABLE_EXTENSIONS = (".csv", ".xlsx")
+
+# Questions asking for a computed value rather than a passage; words common in prose ("per", "rank",
+# "top 5", "by month") are left out, and a question must also name a table or column to be routed
+AGGREGATE_PATTERN = re.compile(
+    r"\b(total|sum|average|avg|mean|median|count|how many|how much|number of|maximum|minimum|"
+    r"highest|lowest|largest|smallest|group(ed)? by|percentage|sorted by)\b",
+    re.IGNORECASE
+)
+
+STOPWORDS = frozenset(
+    "the and for are was were has have had not but with from this that these those what which who whom whose "
+    "when where why how all any each our your their its his her per into onto over under than then there here "
+    "does did can could should would will shall may might must about between across after before during "
+    "give show list tell".split()
+)
+
+SQL_PROMPT = (
+    "You translate questions into a single SQLite SELECT statement.\n"
+    "Only use the tables and columns below; quote identifiers with double quotes.\n\n"
+    "{schemas}\n\n"
+    "{history}"
+    "Question: {question}\n"
+    "Reply with the SQL statement only."
+)
+
+ANSWER_PROMPT = (
+    "Answer the question using the SQL result below. Keep the answer short and direct, "
+    "use markdown, and mention the numbers exactly as they appear.\n\n"
+    "Question: {question}\n"
+    "SQL: {sql}\n"
+    "Result ({row_count} rows{truncated}):\n{rows}\n\n"
+    "Answer:"
+)
+
+
+def _identifier(name: str, fallback: str) -> str:
+    ident = re.sub(r"\W+", "_", name).strip("_").lower()
+    if not ident:
+        ident = fallback
+    return f"_{ident}" if ident[0].isdigit() else ident
+
+
+def _words(text: str) -> set[str]:
+    return {w for w in re.split(r"[\W_]+", text.lower()) if len(w) > 2 and w not in STOPWORDS}
+
+
+def _mentions(words: set[str], name: str) -> bool:
+    """Every meaningful word of a table or column name appears in the question."""
+    name_words = _words(name)
+    return bool(name_words) and name_words <= words
+
+
+def is_aggregate_question(question: str) -> bool:
+    return AGGREGATE_PATTERN.search(question) is not None
+
+
+def extract_sql(text: str) -> str:
+    match = re.search(r"```(?:sql)?\s*(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    sql = match.group(1) if match else text
+    return sql.strip().rstrip(";").strip()
+
+
+class TableStore:
+    """SQLite side-store holding CSV/XLSX sheets as real tables.
+
+    Every sheet becomes one table; `_tables` records its source file, mtime,
+    original headers, access level and origin ("snapshot" for tables that came
+    with an imported snapshot and were never loaded from a local file). Generated SQL runs on a read-only
+    connection whose authorizer only lets it read the tables the caller may see.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS _tables (
+                table_name TEXT PRIMARY KEY, file_name TEXT, sheet_name TEXT, mtime REAL,
+                columns TEXT, headers TEXT, row_count INTEGER, access_level TEXT, origin TEXT DEFAULT 'local'
+            )
+            """
+        )
+        if "origin" not in [r[1] for r in self._conn.execute("PRAGMA table_info(_tables)")]:
+            self._conn.execute("ALTER TABLE _tables ADD COLUMN origin TEXT DEFAULT 'local'")
+        self._conn.commit()
+
+    def tables(self, access_level: str | None = None, file_names: list[str] | None = None) -> list[dict]:
+        rows = self._conn.execute(
+            "SELECT table_name, file_name, sheet_name, mtime, columns, headers, row_count, access_level FROM _tables ORDER BY table_name"
+        ).fetchall()
+        result = []
+        for table_name, file_name, sheet_name, mtime, columns, headers, row_count, level in rows:
+            if access_level is not None and level != access_level:
+                continue
+            if file_names and file_name not in file_names:
+                continue
+            result.append({
+                "table_name": table_name,
+                "file_name": file_name,
+                "sheet_name": sheet_name,
+                "mtime": mtime,
+                "columns": json.loads(columns),
+                "headers": json.loads(headers),
+                "row_count": row_count,
+                "access_level": level,
+            })
+        return result
+
+    def files(self) -> dict[str, float]:
+        return dict(self._conn.execute("SELECT file_name, MAX(mtime) FROM _tables GROUP BY file_name").fetchall())
+
+    def imported_files(self) -> set[str]:
+        return {r[0] for r in self._conn.execute("SELECT DISTINCT file_name FROM _tables WHERE origin = 'snapshot'")}
+
+    def mark_imported(self):
+        """Flag every table as coming from a snapshot, so a node without the source files keeps them."""
+        with self._lock:
+            self._conn.execute("UPDATE _tables SET origin = 'snapshot'")
+            self._conn.commit()
+
+    def drop_file(self, file_name: str):
+        with self._lock:
+            names = [r[0] for r in self._conn.execute("SELECT table_name FROM _tables WHERE file_name = ?", (file_name,))]
+            for name in names:
+                self._conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            self._conn.execute("DELETE FROM _tables WHERE file_name = ?", (file_name,))
+            self._conn.commit()
+
+    def reset(self):
+        for file_name in list(self.files()):
+            self.drop_file(file_name)
+
+    def _table_name(self, file_name: str, sheet_name: str | None) -> str:
+        base = _identifier(os.path.splitext(file_name)[0], "table")
+        if sheet_name is not None:
+            base += "__" + _identifier(sheet_name, "sheet")
+        name, suffix = base, 2
+        while self._conn.execute("SELECT 1 FROM _tables WHERE table_name = ?", (name,)).fetchone():
+            name, suffix = f"{base}_{suffix}", suffix + 1
+        return name
+
+    def _create(self, file_name: str, sheet_name: str | None, header: list[str], mtime: float, access_level: str) -> tuple[str, int]:
+        table_name = self._table_name(file_name, sheet_name)
+        columns, seen = [], set()
+        for i, h in enumerate(header):
+            column = _identifier(h, f"column_{i + 1}")
+            while column in seen:
+                column += f"_{i + 1}"
+            seen.add(column)
+            columns.append(column)
+        # NUMERIC affinity stores numeric-looking cells as numbers so SUM/AVG/ORDER BY work
+        definitions = ", ".join(f'"{c}" NUMERIC' for c in columns)
+        self._conn.execute(f'CREATE TABLE "{table_name}" ({definitions})')
+        self._conn.execute(
+            "INSERT INTO _tables (table_name, file_name, sheet_name, mtime, columns, headers, row_count, access_level, origin) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0, ?, 'local')",
+            (table_name, file_name, sheet_name, mtime, json.dumps(columns), json.dumps(header), access_level)
+        )
+        return table_name, len(columns)
+
+    def _insert(self, table_name: str, width: int, rows: list[list[str]]):
+        placeholders = ", ".join("?" * width)
+        values = [[(cell if cell != "" else None) for cell in (row + [""] * width)[:width]] for row in rows]
+        self._conn.executemany(f'INSERT INTO "{table_name}" VALUES ({placeholders})', values)
+        self._conn.execute("UPDATE _tables SET row_count = row_count + ? WHERE table_name = ?", (len(rows), table_name))
+
+    def load_file(self, path: str, access_level: str) -> int:
+        """(Re)load every sheet of a CSV/XLSX file; returns the number of rows stored."""
+        file_name = os.path.basename(path)
+        mtime = os.path.getmtime(path)
+        self.drop_file(file_name)
+        total = 0
+        with self._lock:
+            try:
+                current = {}
+                if file_name.lower().endswith(".csv"):
+                    batches = ((None, header, rows) for header, rows in iter_csv_rows(path))
+                else:
+                    batches = iter_xlsx_rows(path)
+                for sheet_name, header, rows in batches:
+                    if sheet_name not in current:
+                        current[sheet_name] = self._create(file_name, sheet_name, header, mtime, access_level)
+                    self._insert(*current[sheet_name], rows)
+                    total += len(rows)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return total
+
+    def sync_files(self, domain_path: str, access_config: dict, default_access: str = DEFAULT_ACCESS_LEVEL) -> dict:
+        """Load new/changed table files and drop deleted ones, by mtime.
+
+        Tables imported with a snapshot are only dropped once their file has
+        been seen in `domain_path`: a serving node started from a snapshot
+        has no raw documents, and SQL-only tables exist nowhere else.
+        """
+        stored = self.files()
+        imported = self.imported_files()
+        current = {}
+        if os.path.exists(domain_path):
+            for filename in os.listdir(domain_path):
+                full_path = os.path.join(domain_path, filename)
+                if os.path.isfile(full_path) and filename.lower().endswith(TABLE_EXTENSIONS):
+                    current[filename] = full_path
+
+        changes = {"loaded": [], "dropped": []}
+        for filename in stored:
+            if filename not in current and filename not in imported:
+                self.drop_file(filename)
+                changes["dropped"].append(filename)
+        seen = [(f,) for f in imported if f in current]
+        if seen:
+            with self._lock:
+                self._conn.executemany("UPDATE _tables SET origin = 'local' WHERE file_name = ?", seen)
+                self._conn.commit()
+        for filename, full_path in sorted(current.items()):
+            if filename in stored and abs(os.path.getmtime(full_path) - stored[filename]) <= 1:
+                continue
+            try:
+                rows = self.load_file(full_path, access_config.get(filename, default_access))
+                changes["loaded"].append(filename)
+                print(f"   - Loaded table: {filename} ({rows} rows)")
+            except Exception as e:
+                print(f"   ❌ Error loading table {filename}: {e}")
+        return changes
+
+    def sync_access_levels(self, access_config: dict, default_access: str = DEFAULT_ACCESS_LEVEL) -> int:
+        updated = 0
+        with self._lock:
+            for file_name, level in self._conn.execute("SELECT DISTINCT file_name, access_level FROM _tables").fetchall():
+                target = access_config.get(file_name, default_access)
+                if target != level:
+                    self._conn.execute("UPDATE _tables SET access_level = ? WHERE file_name = ?", (target, file_name))
+                    updated += 1
+            self._conn.commit()
+        return updated
+
+    def schema_prompt(self, tables: list[dict], sample_rows: int = 3) -> str:
+        parts = []
+        for t in tables:
+            source = t["file_name"] + (f", sheet {t['sheet_name']}" if t["sheet_name"] else "")
+            columns = ", ".join(
+                f'"{c}"' + (f" ({h})" if h and h.lower() != c else "") for c, h in zip(t["columns"], t["headers"])
+            )
+            lines = [f'Table "{t["table_name"]}" from {source}, {t["row_count"]} rows: {columns}']
+            for row in self._conn.execute(f'SELECT * FROM "{t["table_name"]}" LIMIT {sample_rows}'):
+                lines.append("  e.g. " + " | ".join("" if v is None else str(v) for v in row))
+            parts.append("\n".join(lines))
+        return "\n\n".join(parts)
+
+    def relevant_tables(self, question: str, tables: list[dict]) -> list[dict]:
+        """Tables the question names: by file (without extension) or sheet name, or by at least one full column name."""
+        words = _words(question)
+        scored = []
+        for t in tables:
+            columns = sum(_mentions(words, c) or _mentions(words, h) for c, h in zip(t["columns"], t["headers"]))
+            named = _mentions(words, os.path.splitext(t["file_name"])[0]) or bool(t["sheet_name"] and _mentions(words, t["sheet_name"]))
+            if columns or named:
+                scored.append((columns + 2 * named, t))
+        return [t for _, t in sorted(scored, key=lambda x: -x[0])]
+
+    def query(self, sql: str, allowed_tables: set[str], max_rows: int) -> tuple[list[str], list[tuple], bool]:
+        """Run a SELECT on a read-only connection that can only read `allowed_tables`."""
+        def authorizer(action, arg1, arg2, db_name, trigger):
+            if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE):
+                return sqlite3.SQLITE_OK
+            if action == sqlite3.SQLITE_READ:
+                return sqlite3.SQLITE_OK if arg1 in allowed_tables else sqlite3.SQLITE_DENY
+            return sqlite3.SQLITE_DENY
+
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            conn.set_authorizer(authorizer)
+            cursor = conn.execute(sql)
+            rows = cursor.fetchmany(max_rows + 1)
+            columns = [d[0] for d in cursor.description or []]
+        finally:
+            conn.close()
+        return columns, rows[:max_rows], len(rows) > max_rows
+
+
+def answer_with_sql(store: TableStore, question: str, tables: list[dict], llm: LLM, max_rows: int, history: str = "", trace=None) -> dict | None:
+    """Generate SQL for the question over `tables`, run it and phrase the answer.
+
+    Returns None when the query finds nothing (no rows, or only NULLs), so the
+    caller can fall back to document search.
+    """
+    def span(name):
+        return trace.span(name) if trace is not None else nullcontext()
+
+    with span("sql_generation"):
+        prompt = SQL_PROMPT.format(
+            schemas=store.schema_prompt(tables),
+            history=f"Conversation so far:\n{history}\n\n" if history else "",
+            question=question
+        )
+        sql = extract_sql(str(llm.complete(prompt)))
+    with span("sql_execution"):
+        columns, rows, truncated = store.query(sql, {t["table_name"] for t in tables}, max_rows)
+    if trace is not None:
+        trace.set("sql_rows", len(rows))
+    if all(v is None for row in rows for v in row):
+        return None
+
+    rendered = "\n".join([" | ".join(columns)] + [" | ".join("" if v is None else str(v) for v in row) for row in rows])
+    answer = str(llm.complete(ANSWER_PROMPT.format(
+        question=question, sql=sql, row_count=len(rows), truncated=", truncated" if truncated else "", rows=rendered
+    ))).strip()
+    return {"sql": sql, "columns": columns, "rows": rows, "truncated": truncated, "answer": answer, "result": rendered}
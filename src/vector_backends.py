@@ -0,0 +1,1005 @@
+import os
+import re
+import json
+import shutil
+import uuid
+import fnmatch
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator
+from pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+    MetadataFilters,
+    MetadataFilter,
+    FilterOperator,
+    FilterCondition,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+from src.config import VectorStoreConfig, HNSWConfig
+
+BATCH_SIZE = 5000
+# Payload fields the FAISS store keeps as integer codes for vectorized filters
+INDEXED_FIELDS = ("access_level", "file_name")
+COMPACT_MIN_ENTRIES = 10_000
+
+
+def hnsw_metadata(config: HNSWConfig) -> dict:
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:construction_ef": config.construction_ef,
+        "hnsw:M": config.M,
+        "hnsw:search_ef": config.search_ef
+    }
+
+
+def matches_filters(metadata: dict, filters: MetadataFilters | None) -> bool:
+    """Evaluate llama-index metadata filters against a flat metadata dict."""
+    if filters is None or not filters.filters:
+        return True
+
+    results = []
+    for f in filters.filters:
+        if isinstance(f, MetadataFilters):
+            results.append(matches_filters(metadata, f))
+            continue
+        value = metadata.get(f.key)
+        match f.operator:
+            case FilterOperator.EQ:
+                results.append(value == f.value)
+            case FilterOperator.NE:
+                results.append(value != f.value)
+            case FilterOperator.IN:
+                results.append(value in f.value)
+            case FilterOperator.NIN:
+                results.append(value not in f.value)
+            case _:
+                raise ValueError(f"Unsupported filter operator: {f.operator}")
+
+    if filters.condition == FilterCondition.OR:
+        return any(results)
+    return all(results)
+
+
+def _patch_node_content(metadata: dict, patch: dict) -> dict:
+    """Merge a metadata patch, keeping the serialized node in `_node_content` in sync."""
+    merged = {**metadata, **patch}
+    content = merged.get("_node_content")
+    if content:
+        node_content = json.loads(content)
+        node_content.setdefault("metadata", {}).update(patch)
+        merged["_node_content"] = json.dumps(node_content)
+    return merged
+
+
+def _is_segment_dir(name: str) -> bool:
+    # Chroma keeps HNSW segments in UUID-named folders next to chroma.sqlite3
+    try:
+        uuid.UUID(name)
+        return True
+    except ValueError:
+        return False
+
+
+class VectorBackend:
+    """Common interface over the vector stores the knowledge base can live in."""
+
+    name = "base"
+
+    def __init__(self, config: VectorStoreConfig, collection_name: str | None = None):
+        self.config = config
+        self.collection_name = collection_name or config.collection_name
+
+    @property
+    def vector_store(self) -> BasePydanticVectorStore:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def insert(self, nodes: list[BaseNode]):
+        for i in range(0, len(nodes), BATCH_SIZE):
+            self.vector_store.add(nodes[i:i + BATCH_SIZE])
+
+    def delete_by_file(self, file_name: str):
+        raise NotImplementedError
+
+    def delete_ids(self, ids: list[str]):
+        if ids:
+            self.vector_store.delete_nodes(node_ids=ids)
+
+    def iter_nodes(
+        self,
+        file_names: list[str] | None = None,
+        ids: list[str] | None = None,
+        with_embeddings: bool = False
+    ) -> Iterator[BaseNode]:
+        raise NotImplementedError
+
+    def get_nodes(self, **kwargs) -> list[BaseNode]:
+        return list(self.iter_nodes(**kwargs))
+
+    def update_metadata(self, updates: dict[str, dict]):
+        """Apply per-node metadata patches ({node_id: {key: value}}).
+
+        The generic path re-inserts the affected nodes with their stored
+        embeddings, so nothing is re-embedded.
+        """
+        if not updates:
+            return
+        ids = list(updates)
+        for i in range(0, len(ids), BATCH_SIZE):
+            batch = ids[i:i + BATCH_SIZE]
+            nodes = self.get_nodes(ids=batch, with_embeddings=True)
+            for node in nodes:
+                node.metadata.update(updates[node.node_id])
+            self.delete_ids([node.node_id for node in nodes])
+            self.insert(nodes)
+
+    def query(
+        self,
+        embedding: list[float],
+        top_k: int,
+        filters: MetadataFilters | None = None
+    ) -> VectorStoreQueryResult:
+        return self.vector_store.query(
+            VectorStoreQuery(query_embedding=embedding, similarity_top_k=top_k, filters=filters)
+        )
+
+    def reset(self):
+        raise NotImplementedError
+
+    def drop(self):
+        """Remove the collection for good, without leaving an empty one behind."""
+        self.reset()
+
+
+class ChromaBackend(VectorBackend):
+    name = "chroma"
+
+    def __init__(self, config: VectorStoreConfig, collection_name: str | None = None):
+        super().__init__(config, collection_name)
+        import chromadb
+        self._db = chromadb.PersistentClient(path=config.path)
+        self._open()
+
+    def _open(self):
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+        self._collection = self._db.get_or_create_collection(name=self.collection_name, metadata=hnsw_metadata(self.config.hnsw))
+        self._vector_store = ChromaVectorStore(chroma_collection=self._collection)
+
+    @property
+    def vector_store(self) -> BasePydanticVectorStore:
+        return self._vector_store
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def delete_by_file(self, file_name: str):
+        self._collection.delete(where={"file_name": file_name})
+
+    def delete_ids(self, ids: list[str]):
+        for i in range(0, len(ids), BATCH_SIZE):
+            self._collection.delete(ids=ids[i:i + BATCH_SIZE])
+
+    def iter_nodes(self, file_names=None, ids=None, with_embeddings=False):
+        include = ["metadatas", "documents"]
+        if with_embeddings:
+            include.append("embeddings")
+        where = {"file_name": {"$in": file_names}} if file_names else None
+
+        if ids is not None:
+            batches = (dict(ids=ids[i:i + BATCH_SIZE]) for i in range(0, len(ids), BATCH_SIZE))
+        else:
+            batches = (dict(limit=BATCH_SIZE, offset=i) for i in range(0, self.count(), BATCH_SIZE))
+
+        for batch in batches:
+            data = self._collection.get(where=where, include=include, **batch)
+            for i, node_id in enumerate(data["ids"]):
+                node = metadata_dict_to_node(data["metadatas"][i], text=data["documents"][i])
+                node.id_ = node_id
+                if with_embeddings:
+                    node.embedding = list(map(float, data["embeddings"][i]))
+                yield node
+
+    def update_metadata(self, updates: dict[str, dict]):
+        ids = list(updates)
+        for i in range(0, len(ids), BATCH_SIZE):
+            batch = ids[i:i + BATCH_SIZE]
+            data = self._collection.get(ids=batch, include=["metadatas"])
+            metadatas = [
+                _patch_node_content(data["metadatas"][j], updates[node_id])
+                for j, node_id in enumerate(data["ids"])
+            ]
+            self._collection.update(ids=data["ids"], metadatas=metadatas)
+
+    def reset(self):
+        try:
+            self._db.delete_collection(name=self.collection_name)
+            print(f"🗑️  Collection '{self.collection_name}' deleted via API.")
+        except Exception:
+            pass
+
+        db_path = self.config.path
+        if os.path.exists(db_path):
+            print("🧹 Cleaning up storage artifacts...")
+            for item in os.listdir(db_path):
+                item_path = os.path.join(db_path, item)
+                try:
+                    if os.path.isdir(item_path) and _is_segment_dir(item):
+                        shutil.rmtree(item_path)
+                        print(f"   - Removed artifact: {item}")
+                except PermissionError:
+                    pass
+                except Exception as e:
+                    print(f"   ⚠️ Could not remove {item}: {e}")
+
+        self._open()
+
+    def drop(self):
+        try:
+            self._db.delete_collection(name=self.collection_name)
+        except Exception:
+            pass
+
+
+class LanceDBBackend(VectorBackend):
+    name = "lancedb"
+
+    def __init__(self, config: VectorStoreConfig, collection_name: str | None = None):
+        super().__init__(config, collection_name)
+        self._uri = os.path.join(config.path, "lancedb")
+        self._open()
+
+    def _open(self):
+        import lancedb
+        from llama_index.vector_stores.lancedb import LanceDBVectorStore
+        self._db = lancedb.connect(self._uri)
+        self._vector_store = LanceDBVectorStore(uri=self._uri, table_name=self.collection_name)
+
+    def _table(self):
+        if self.collection_name not in self._db.table_names():
+            return None
+        return self._db.open_table(self.collection_name)
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return "'" + str(value).replace("'", "''") + "'"
+
+    @property
+    def vector_store(self) -> BasePydanticVectorStore:
+        return self._vector_store
+
+    def count(self) -> int:
+        table = self._table()
+        return table.count_rows() if table is not None else 0
+
+    def delete_by_file(self, file_name: str):
+        table = self._table()
+        if table is not None:
+            table.delete(f"metadata.file_name = {self._quote(file_name)}")
+
+    def delete_ids(self, ids: list[str]):
+        table = self._table()
+        if table is None or not ids:
+            return
+        for i in range(0, len(ids), BATCH_SIZE):
+            values = ", ".join(self._quote(v) for v in ids[i:i + BATCH_SIZE])
+            table.delete(f"id IN ({values})")
+
+    def iter_nodes(self, file_names=None, ids=None, with_embeddings=False):
+        table = self._table()
+        if table is None:
+            return
+
+        conditions = []
+        if file_names:
+            conditions.append(f"metadata.file_name IN ({', '.join(self._quote(f) for f in file_names)})")
+        if ids is not None:
+            if not ids:
+                return
+            conditions.append(f"id IN ({', '.join(self._quote(v) for v in ids)})")
+
+        columns = ["id", "text", "metadata"] + (["vector"] if with_embeddings else [])
+        query = table.search().select(columns).limit(table.count_rows())
+        if conditions:
+            query = query.where(" AND ".join(conditions))
+
+        for row in query.to_list():
+            node = metadata_dict_to_node(dict(row["metadata"]), text=row["text"])
+            node.id_ = row["id"]
+            if with_embeddings:
+                node.embedding = list(map(float, row["vector"]))
+            yield node
+
+    def reset(self):
+        shutil.rmtree(self._uri, ignore_errors=True)
+        self._open()
+
+    def drop(self):
+        if self.collection_name in self._db.table_names():
+            self._db.drop_table(self.collection_name)
+
+
+class QdrantBackend(VectorBackend):
+    name = "qdrant"
+
+    def __init__(self, config: VectorStoreConfig, collection_name: str | None = None, client=None):
+        super().__init__(config, collection_name)
+        import qdrant_client
+        # Local Qdrant holds a file lock on its folder, so partitions share one client
+        self._client = client or qdrant_client.QdrantClient(path=os.path.join(config.path, "qdrant"))
+        self._open()
+
+    def _open(self):
+        from llama_index.vector_stores.qdrant import QdrantVectorStore
+        self._vector_store = QdrantVectorStore(client=self._client, collection_name=self.collection_name)
+
+    @property
+    def vector_store(self) -> BasePydanticVectorStore:
+        return self._vector_store
+
+    def _exists(self) -> bool:
+        return self._client.collection_exists(self.collection_name)
+
+    def count(self) -> int:
+        if not self._exists():
+            return 0
+        return self._client.count(self.collection_name, exact=True).count
+
+    def delete_by_file(self, file_name: str):
+        from qdrant_client.http import models
+        if not self._exists():
+            return
+        self._client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(filter=models.Filter(must=[
+                models.FieldCondition(key="file_name", match=models.MatchValue(value=file_name))
+            ]))
+        )
+
+    def delete_ids(self, ids: list[str]):
+        from qdrant_client.http import models
+        if ids and self._exists():
+            self._client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=ids)
+            )
+
+    @staticmethod
+    def _point_to_node(point, with_embeddings: bool) -> BaseNode:
+        node = metadata_dict_to_node(point.payload)
+        node.id_ = str(point.id)
+        if with_embeddings:
+            vector = point.vector
+            if isinstance(vector, dict):
+                vector = next(iter(vector.values()))
+            node.embedding = list(map(float, vector))
+        return node
+
+    def iter_nodes(self, file_names=None, ids=None, with_embeddings=False):
+        from qdrant_client.http import models
+        if not self._exists():
+            return
+
+        if ids is not None:
+            for i in range(0, len(ids), BATCH_SIZE):
+                points = self._client.retrieve(
+                    self.collection_name, ids=ids[i:i + BATCH_SIZE],
+                    with_payload=True, with_vectors=with_embeddings
+                )
+                for point in points:
+                    yield self._point_to_node(point, with_embeddings)
+            return
+
+        scroll_filter = None
+        if file_names:
+            scroll_filter = models.Filter(must=[
+                models.FieldCondition(key="file_name", match=models.MatchAny(any=file_names))
+            ])
+        offset = None
+        while True:
+            points, offset = self._client.scroll(
+                self.collection_name, scroll_filter=scroll_filter, limit=BATCH_SIZE,
+                offset=offset, with_payload=True, with_vectors=with_embeddings
+            )
+            for point in points:
+                yield self._point_to_node(point, with_embeddings)
+            if offset is None:
+                break
+
+    def reset(self):
+        if self._exists():
+            self._client.delete_collection(self.collection_name)
+        self._open()
+
+    def drop(self):
+        if self._exists():
+            self._client.delete_collection(self.collection_name)
+
+
+class FaissMetadataVectorStore(BasePydanticVectorStore):
+    """FAISS inner-product index with an append-only payload log.
+
+    The stock llama-index FAISS store cannot filter or delete, which the
+    access-level and `@file` filters rely on, so payloads live next to the
+    index and filters become a FAISS ID selector. Every write appends to
+    `nodes.jsonl` and the vector file instead of rewriting them; the log is
+    compacted once dead entries outnumber live ones. `access_level` and
+    `file_name` are kept as integer code arrays (as in src.flat_index), so
+    filtering on them is a vectorized mask rather than a payload scan.
+    """
+
+    stores_text: bool = True
+    persist_dir: str
+
+    _index: Any = PrivateAttr(default=None)
+    _records: dict[int, dict] = PrivateAttr(default_factory=dict)
+    _ids: dict[str, int] = PrivateAttr(default_factory=dict)
+    _next_id: int = PrivateAttr(default=0)
+    _dim: int | None = PrivateAttr(default=None)
+    _rows: dict[int, int] = PrivateAttr(default_factory=dict)
+    _vectors_file: str = PrivateAttr(default="")
+    _rows_written: int = PrivateAttr(default=0)
+    _log_entries: int = PrivateAttr(default=0)
+    _codes: dict[str, np.ndarray] = PrivateAttr(default_factory=dict)
+    _vocab: dict[str, dict] = PrivateAttr(default_factory=dict)
+
+    def __init__(self, persist_dir: str, **kwargs):
+        super().__init__(persist_dir=persist_dir, **kwargs)
+        self._codes = {field: np.empty(0, dtype=np.int32) for field in INDEXED_FIELDS}
+        self._vocab = {field: {} for field in INDEXED_FIELDS}
+        self._load()
+
+    @property
+    def client(self) -> Any:
+        return self._index
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.persist_dir, "nodes.jsonl")
+
+    def _vectors_path(self, file_name: str | None = None) -> str:
+        return os.path.join(self.persist_dir, file_name or self._vectors_file)
+
+    def _load(self):
+        if os.path.exists(self._log_path):
+            self._replay()
+        elif os.path.exists(os.path.join(self.persist_dir, "nodes.json")):
+            self._load_legacy()
+
+    def _replay(self):
+        import faiss
+        with open(self._log_path, "r") as f:
+            header = json.loads(f.readline())
+            self._dim, self._vectors_file = header["dim"], header["vectors"]
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A write cut short by a crash; everything before it is intact
+                    break
+                self._log_entries += 1
+                if "add" in entry:
+                    int_id = entry["add"]
+                    self._records[int_id] = {"node_id": entry["node_id"], "payload": entry["payload"]}
+                    self._ids[entry["node_id"]] = int_id
+                    self._rows[int_id] = self._rows_written
+                    self._rows_written += 1
+                    self._next_id = max(self._next_id, int_id + 1)
+                elif "update" in entry:
+                    self._records[entry["update"]]["payload"] = entry["payload"]
+                else:
+                    for int_id in entry["remove"]:
+                        record = self._records.pop(int_id)
+                        self._ids.pop(record["node_id"], None)
+                        self._rows.pop(int_id)
+
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self._dim))
+        if self._records:
+            vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode="r").reshape(-1, self._dim)
+            int_ids = np.fromiter(self._rows, dtype=np.int64, count=len(self._rows))
+            rows = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+            for start in range(0, len(rows), BATCH_SIZE):
+                self._index.add_with_ids(
+                    np.ascontiguousarray(vectors[rows[start:start + BATCH_SIZE]]), int_ids[start:start + BATCH_SIZE]
+                )
+            del vectors
+        for int_id, record in self._records.items():
+            self._set_codes(int_id, record["payload"])
+
+    def _load_legacy(self):
+        """Read the older index.faiss + nodes.json layout once and rewrite it as a log."""
+        import faiss
+        index_path = os.path.join(self.persist_dir, "index.faiss")
+        records_path = os.path.join(self.persist_dir, "nodes.json")
+        self._index = faiss.read_index(index_path)
+        self._dim = self._index.d
+        with open(records_path, "r") as f:
+            self._records = {int(k): v for k, v in json.load(f).items()}
+        self._ids = {r["node_id"]: k for k, r in self._records.items()}
+        self._next_id = max(self._records, default=-1) + 1
+        for int_id, record in self._records.items():
+            self._set_codes(int_id, record["payload"])
+        self._compact(vectors_of=lambda ids: np.vstack([self._index.reconstruct(i) for i in ids]))
+        os.remove(index_path)
+        os.remove(records_path)
+
+    def _append(self, entries: list[dict], vectors: np.ndarray | None = None):
+        os.makedirs(self.persist_dir, exist_ok=True)
+        if not os.path.exists(self._log_path):
+            self._vectors_file = "vectors-0.f32"
+            with open(self._log_path, "w") as f:
+                f.write(json.dumps({"dim": self._dim, "vectors": self._vectors_file}) + "\n")
+        if vectors is not None:
+            # Vectors first: a log entry never points past the end of the vector file
+            with open(self._vectors_path(), "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self._log_path, "a") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self._log_entries += len(entries)
+
+    def _maybe_compact(self):
+        if self._log_entries > max(2 * len(self._records), COMPACT_MIN_ENTRIES):
+            self._compact()
+
+    def _compact(self, vectors_of=None):
+        """Rewrite the log and vector file with only the live records."""
+        old_vectors = self._vectors_file
+        generation = int(old_vectors[len("vectors-"):-len(".f32")]) + 1 if old_vectors else 0
+        new_vectors = f"vectors-{generation}.f32"
+        int_ids = list(self._records)
+        if vectors_of is None:
+            source = np.memmap(self._vectors_path(old_vectors), dtype=np.float32, mode="r").reshape(-1, self._dim) \
+                if int_ids else None
+            vectors_of = lambda ids: source[[self._rows[i] for i in ids]]
+
+        os.makedirs(self.persist_dir, exist_ok=True)
+        with open(self._vectors_path(new_vectors), "wb") as f:
+            for start in range(0, len(int_ids), BATCH_SIZE):
+                f.write(np.ascontiguousarray(vectors_of(int_ids[start:start + BATCH_SIZE]), dtype=np.float32).tobytes())
+        tmp_path = self._log_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"dim": self._dim, "vectors": new_vectors}) + "\n")
+            for int_id in int_ids:
+                record = self._records[int_id]
+                f.write(json.dumps({"add": int_id, "node_id": record["node_id"], "payload": record["payload"]}) + "\n")
+        # The log names its vector file, so swapping the log switches both at once
+        os.replace(tmp_path, self._log_path)
+        if old_vectors and old_vectors != new_vectors and os.path.exists(self._vectors_path(old_vectors)):
+            os.remove(self._vectors_path(old_vectors))
+
+        self._vectors_file = new_vectors
+        self._rows = {int_id: row for row, int_id in enumerate(int_ids)}
+        self._rows_written = len(int_ids)
+        self._log_entries = len(int_ids)
+
+    def _set_codes(self, int_id: int, payload: dict | None):
+        """Write the filter codes of one record; `None` marks it removed (-1)."""
+        for field in INDEXED_FIELDS:
+            codes = self._codes[field]
+            if int_id >= len(codes):
+                grown = np.full(max(int_id + 1, 2 * len(codes), 1024), -1, dtype=np.int32)
+                grown[:len(codes)] = codes
+                self._codes[field] = codes = grown
+            if payload is None:
+                codes[int_id] = -1
+            else:
+                vocab = self._vocab[field]
+                codes[int_id] = vocab.setdefault(payload.get(field), len(vocab))
+
+    def _live(self) -> np.ndarray:
+        return self._codes[INDEXED_FIELDS[0]][:self._next_id] >= 0
+
+    def _filter_mask(self, filters: MetadataFilters) -> np.ndarray | None:
+        """Mask over int ids for filters on indexed fields; None when a filter needs the payload scan."""
+        masks = []
+        for f in filters.filters:
+            if isinstance(f, MetadataFilters):
+                mask = self._filter_mask(f)
+                if mask is None:
+                    return None
+            elif f.key in self._codes and f.operator in (FilterOperator.EQ, FilterOperator.NE, FilterOperator.IN, FilterOperator.NIN):
+                codes = self._codes[f.key][:self._next_id]
+                vocab = self._vocab[f.key]
+                values = f.value if f.operator in (FilterOperator.IN, FilterOperator.NIN) else [f.value]
+                mask = np.isin(codes, [vocab[v] for v in values if v in vocab])
+                if f.operator in (FilterOperator.NE, FilterOperator.NIN):
+                    mask = ~mask & (codes >= 0)
+            else:
+                return None
+            masks.append(mask)
+        if not masks:
+            return self._live()
+        if filters.condition == FilterCondition.OR:
+            return np.logical_or.reduce(masks)
+        return np.logical_and.reduce(masks)
+
+    def matching(self, filters: MetadataFilters) -> list[int]:
+        mask = self._filter_mask(filters)
+        if mask is None:
+            return [k for k, r in self._records.items() if matches_filters(r["payload"], filters)]
+        return np.flatnonzero(mask).tolist()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, nodes: list[BaseNode], **kwargs) -> list[str]:
+        import faiss
+        if not nodes:
+            return []
+
+        self.delete_nodes([n.node_id for n in nodes if n.node_id in self._ids])
+        vectors = np.array([n.get_embedding() for n in nodes], dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        if self._index is None:
+            self._dim = vectors.shape[1]
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self._dim))
+
+        int_ids = np.arange(self._next_id, self._next_id + len(nodes), dtype=np.int64)
+        self._next_id += len(nodes)
+        self._index.add_with_ids(vectors, int_ids)
+
+        entries = []
+        for int_id, node in zip(int_ids.tolist(), nodes):
+            payload = node_to_metadata_dict(node, remove_text=False, flat_metadata=True)
+            self._records[int_id] = {"node_id": node.node_id, "payload": payload}
+            self._ids[node.node_id] = int_id
+            self._rows[int_id] = self._rows_written
+            self._rows_written += 1
+            self._set_codes(int_id, payload)
+            entries.append({"add": int_id, "node_id": node.node_id, "payload": payload})
+
+        self._append(entries, vectors)
+        return [n.node_id for n in nodes]
+
+    def _remove(self, int_ids: list[int]):
+        if not int_ids:
+            return
+        self._index.remove_ids(np.array(int_ids, dtype=np.int64))
+        for int_id in int_ids:
+            record = self._records.pop(int_id)
+            self._ids.pop(record["node_id"], None)
+            self._rows.pop(int_id)
+            self._set_codes(int_id, None)
+        self._append([{"remove": int_ids}])
+        self._maybe_compact()
+
+    def delete(self, ref_doc_id: str, **delete_kwargs) -> None:
+        self._remove([k for k, r in self._records.items() if r["payload"].get("ref_doc_id") == ref_doc_id])
+
+    def delete_nodes(self, node_ids: list[str] | None = None, filters: MetadataFilters | None = None, **kwargs) -> None:
+        targets = [self._ids[i] for i in (node_ids or []) if i in self._ids]
+        if filters is not None:
+            targets += self.matching(filters)
+        self._remove(sorted(set(targets)))
+
+    def update_payloads(self, updates: dict[str, dict]):
+        entries = []
+        for node_id, patch in updates.items():
+            int_id = self._ids.get(node_id)
+            if int_id is not None:
+                record = self._records[int_id]
+                record["payload"] = _patch_node_content(record["payload"], patch)
+                self._set_codes(int_id, record["payload"])
+                entries.append({"update": int_id, "payload": record["payload"]})
+        if entries:
+            self._append(entries)
+            self._maybe_compact()
+
+    def get_node(self, int_id: int, with_embedding: bool = False) -> BaseNode:
+        record = self._records[int_id]
+        node = metadata_dict_to_node(record["payload"])
+        node.id_ = record["node_id"]
+        if with_embedding:
+            node.embedding = self._index.reconstruct(int_id).tolist()
+        return node
+
+    def query(self, query: VectorStoreQuery, **kwargs) -> VectorStoreQueryResult:
+        import faiss
+        if self._index is None or not self._records:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        vector = np.array([query.query_embedding], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        params = None
+        if query.filters is not None:
+            allowed = self.matching(query.filters)
+            if not allowed:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.array(allowed, dtype=np.int64)))
+
+        scores, int_ids = self._index.search(vector, query.similarity_top_k, params=params)
+        nodes, similarities, ids = [], [], []
+        for score, int_id in zip(scores[0], int_ids[0]):
+            if int_id < 0:
+                continue
+            node = self.get_node(int(int_id))
+            nodes.append(node)
+            similarities.append(float(score))
+            ids.append(node.node_id)
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
+
+
+class FaissBackend(VectorBackend):
+    name = "faiss"
+
+    def __init__(self, config: VectorStoreConfig, collection_name: str | None = None):
+        super().__init__(config, collection_name)
+        self._dir = os.path.join(config.path, "faiss", self.collection_name)
+        self._vector_store = FaissMetadataVectorStore(persist_dir=self._dir)
+
+    @property
+    def vector_store(self) -> BasePydanticVectorStore:
+        return self._vector_store
+
+    def count(self) -> int:
+        return len(self._vector_store)
+
+    def delete_by_file(self, file_name: str):
+        self._vector_store.delete_nodes(filters=MetadataFilters(filters=[
+            MetadataFilter(key="file_name", value=file_name)
+        ]))
+
+    def iter_nodes(self, file_names=None, ids=None, with_embeddings=False):
+        store = self._vector_store
+        if ids is not None:
+            int_ids = [store._ids[i] for i in ids if i in store._ids]
+        elif file_names:
+            int_ids = store.matching(MetadataFilters(filters=[
+                MetadataFilter(key="file_name", value=list(file_names), operator=FilterOperator.IN)
+            ]))
+        else:
+            int_ids = list(store._records)
+        for int_id in int_ids:
+            if file_names and store._records[int_id]["payload"].get("file_name") not in file_names:
+                continue
+            yield store.get_node(int_id, with_embedding=with_embeddings)
+
+    def update_metadata(self, updates: dict[str, dict]):
+        self._vector_store.update_payloads(updates)
+
+    def reset(self):
+        shutil.rmtree(self._dir, ignore_errors=True)
+        self._vector_store = FaissMetadataVectorStore(persist_dir=self._dir)
+
+
+BACKENDS: dict[str, type[VectorBackend]] = {
+    ChromaBackend.name: ChromaBackend,
+    LanceDBBackend.name: LanceDBBackend,
+    QdrantBackend.name: QdrantBackend,
+    FaissBackend.name: FaissBackend,
+}
+
+
+DEFAULT_PARTITION = "default"
+
+
+def _partition_slug(key: Any) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", str(key)).strip("_") or DEFAULT_PARTITION
+
+
+class PartitionedVectorStore(BasePydanticVectorStore):
+    """llama-index view over a `PartitionedBackend`.
+
+    Adds are routed to the partition owning each node and queries fan out to
+    the partitions their filters can match, so `VectorStoreIndex` and its
+    retrievers work unchanged on top of the shards.
+    """
+
+    stores_text: bool = True
+
+    _backend: Any = PrivateAttr(default=None)
+
+    def __init__(self, backend: "PartitionedBackend", **kwargs):
+        super().__init__(**kwargs)
+        self._backend = backend
+
+    @property
+    def client(self) -> Any:
+        return self._backend
+
+    def add(self, nodes: list[BaseNode], **kwargs) -> list[str]:
+        self._backend.insert(nodes)
+        return [n.node_id for n in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs) -> None:
+        for partition in self._backend.partitions.values():
+            partition.vector_store.delete(ref_doc_id, **delete_kwargs)
+
+    def delete_nodes(self, node_ids: list[str] | None = None, filters: MetadataFilters | None = None, **kwargs) -> None:
+        if filters is None:
+            self._backend.delete_ids(node_ids or [])
+            return
+        for partition in self._backend.partitions.values():
+            partition.vector_store.delete_nodes(node_ids=node_ids, filters=filters, **kwargs)
+
+    def query(self, query: VectorStoreQuery, **kwargs) -> VectorStoreQueryResult:
+        return self._backend.fan_out(query, **kwargs)
+
+
+class PartitionedBackend(VectorBackend):
+    """Shards chunks over one collection per access level or file group.
+
+    Every partition is a regular backend of `config.backend` named
+    `<collection>__<partition>`; the partition list is kept in a small
+    manifest next to the store. A query only visits the partitions its
+    `access_level` / `file_name` filters can match and the per-partition
+    top-k lists are merged by score. Metadata updates that change a node's
+    partition key (access level changes, `file_name` hand-overs) move the
+    node with its stored embedding, so the shards never disagree with the
+    metadata.
+    """
+
+    def __init__(self, config: VectorStoreConfig, collection_name: str | None = None):
+        super().__init__(config, collection_name)
+        self.name = f"{config.backend}, partitioned by {config.partition_by}"
+        self.partitions: dict[str, VectorBackend] = {}
+        self._manifest_path = os.path.join(config.path, f"{self.collection_name}.partitions.json")
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="partition")
+        self._vector_store = PartitionedVectorStore(self)
+
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("partition_by") == config.partition_by:
+                for slug in manifest.get("partitions", []):
+                    self._open_partition(slug)
+            else:
+                print(f"⚠️ Partition layout changed from '{manifest.get('partition_by')}' to '{config.partition_by}'. Starting new partitions.")
+
+    @property
+    def vector_store(self) -> BasePydanticVectorStore:
+        return self._vector_store
+
+    def _save_manifest(self):
+        os.makedirs(self.config.path, exist_ok=True)
+        with open(self._manifest_path, "w") as f:
+            json.dump({"partition_by": self.config.partition_by, "partitions": sorted(self.partitions)}, f)
+
+    def _open_partition(self, slug: str) -> VectorBackend:
+        name = f"{self.collection_name}__{slug}"
+        if self.config.backend == QdrantBackend.name:
+            shared = next((p._client for p in self.partitions.values()), None)
+            backend = QdrantBackend(self.config, name, client=shared)
+        else:
+            backend = BACKENDS[self.config.backend](self.config, name)
+        self.partitions[slug] = backend
+        return backend
+
+    def _partition(self, slug: str) -> VectorBackend:
+        if slug not in self.partitions:
+            self._open_partition(slug)
+            self._save_manifest()
+        return self.partitions[slug]
+
+    @property
+    def key_field(self) -> str:
+        return "access_level" if self.config.partition_by == "access_level" else "file_name"
+
+    def file_group(self, file_name: str | None) -> str:
+        for group, patterns in self.config.file_groups.items():
+            if file_name and any(fnmatch.fnmatch(file_name, p) for p in patterns):
+                return group
+        return DEFAULT_PARTITION
+
+    def partition_of(self, metadata: dict) -> str:
+        value = metadata.get(self.key_field)
+        if self.config.partition_by == "file_group":
+            return _partition_slug(self.file_group(value))
+        return _partition_slug(value if value else DEFAULT_PARTITION)
+
+    def count(self) -> int:
+        return sum(p.count() for p in self.partitions.values())
+
+    def insert(self, nodes: list[BaseNode]):
+        groups: dict[str, list[BaseNode]] = {}
+        for node in nodes:
+            groups.setdefault(self.partition_of(node.metadata), []).append(node)
+        for slug, group in groups.items():
+            self._partition(slug).insert(group)
+
+    def delete_by_file(self, file_name: str):
+        if self.config.partition_by == "file_group":
+            slug = _partition_slug(self.file_group(file_name))
+            targets = [self.partitions[slug]] if slug in self.partitions else []
+        else:
+            targets = list(self.partitions.values())
+        for partition in targets:
+            partition.delete_by_file(file_name)
+
+    def delete_ids(self, ids: list[str]):
+        for partition in self.partitions.values():
+            partition.delete_ids(ids)
+
+    def iter_nodes(self, file_names=None, ids=None, with_embeddings=False):
+        for partition in list(self.partitions.values()):
+            yield from partition.iter_nodes(file_names=file_names, ids=ids, with_embeddings=with_embeddings)
+
+    def update_metadata(self, updates: dict[str, dict]):
+        """Patch nodes in place, moving the ones whose partition key changes."""
+        remaining = dict(updates)
+        for slug, partition in list(self.partitions.items()):
+            if not remaining:
+                break
+            present = [n.node_id for n in partition.iter_nodes(ids=list(remaining))]
+            stay, move = {}, {}
+            for node_id in present:
+                patch = remaining.pop(node_id)
+                moves = self.key_field in patch and self.partition_of(patch) != slug
+                (move if moves else stay)[node_id] = patch
+            if stay:
+                partition.update_metadata(stay)
+            if move:
+                nodes = partition.get_nodes(ids=list(move), with_embeddings=True)
+                for node in nodes:
+                    node.metadata.update(move[node.node_id])
+                partition.delete_ids(list(move))
+                self.insert(nodes)
+
+    def _candidates(self, filters: MetadataFilters | None) -> list[str]:
+        """Partitions a filter can match; only top-level AND conditions narrow the fan-out."""
+        slugs = list(self.partitions)
+        if filters is None or filters.condition == FilterCondition.OR:
+            return slugs
+        for f in filters.filters:
+            if isinstance(f, MetadataFilters) or f.key != self.key_field:
+                continue
+            if f.operator == FilterOperator.EQ:
+                values = [f.value]
+            elif f.operator == FilterOperator.IN:
+                values = list(f.value)
+            else:
+                continue
+            allowed = {self.partition_of({self.key_field: v}) for v in values}
+            slugs = [s for s in slugs if s in allowed]
+        return slugs
+
+    def fan_out(self, query: VectorStoreQuery, **kwargs) -> VectorStoreQueryResult:
+        # Partitions only narrow the fan-out; the full filter (access_level
+        # included) still runs inside each one, since slugs are not injective.
+        slugs = self._candidates(query.filters)
+
+        def run(slug: str) -> VectorStoreQueryResult:
+            partition = self.partitions[slug]
+            if partition.count() == 0:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            return partition.vector_store.query(query, **kwargs)
+
+        if len(slugs) > 1:
+            results = list(self._pool.map(run, slugs))
+        else:
+            results = [run(s) for s in slugs]
+
+        hits = []
+        for result in results:
+            nodes = result.nodes or []
+            for i, node in enumerate(nodes):
+                similarity = result.similarities[i] if result.similarities else 0.0
+                hits.append((similarity, node, result.ids[i] if result.ids else node.node_id))
+        hits.sort(key=lambda h: h[0], reverse=True)
+        hits = hits[:query.similarity_top_k]
+        return VectorStoreQueryResult(
+            nodes=[h[1] for h in hits], similarities=[h[0] for h in hits], ids=[h[2] for h in hits]
+        )
+
+    def reset(self):
+        for partition in self.partitions.values():
+            partition.drop()
+        self.partitions.clear()
+        self._save_manifest()
+
+
+def create_backend(config: VectorStoreConfig, collection_name: str | None = None) -> VectorBackend:
+    if config.partition_by != "none":
+        if config.backend not in BACKENDS:
+            raise ValueError(f"Unsupported vector store backend: {config.backend}")
+        return PartitionedBackend(config, collection_name)
+    try:
+        backend_cls = BACKENDS[config.backend]
+    except KeyError:
+        raise ValueError(f"Unsupported vector store backend: {config.backend}")
+    return backend_cls(config, collection_name)
@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from rich.console import Console
+from rich.table import Table
+from src.config import CaptioningConfig
+from src.image_captioning import CaptioningService
+
+PAGES = 40
+IMAGES_PER_PAGE = 3
+BASE_LATENCY_S = 0.08
+PER_IMAGE_LATENCY_S = 0.02
+PAGES_PER_TASK = 16
+# Minimal valid PNG/JPEG/GIF headers; the service only sniffs the magic bytes
+SAMPLE_IMAGES = [
+    b"\x89PNG\r\n\x1a\n" + bytes(512),
+    b"\xff\xd8\xff\xe0" + bytes(512),
+    b"GIF89a" + bytes(512),
+]
+
+console = Console()
+os.environ.setdefault("GROQ_API_KEY", "mock")
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible chat completions endpoint that captions every image it receives."""
+
+    protocol_version = "HTTP/1.1"
+    stats = {"requests": 0, "connections": set(), "images": 0, "mimes": set()}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        parts = body["messages"][0]["content"]
+        urls = [p["image_url"]["url"] for p in parts if p["type"] == "image_url"]
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["connections"].add(self.client_address)
+            self.stats["images"] += len(urls)
+            self.stats["mimes"].update(re.match(r"data:([^;]+);", u).group(1) for u in urls)
+        time.sleep(BASE_LATENCY_S + PER_IMAGE_LATENCY_S * len(urls))
+
+        captions = [
+            {"image_type": "Picture", "image_name": f"image {i}", "image_description": "A synthetic test image."}
+            for i in range(len(urls))
+        ]
+        content = json.dumps(captions[0] if len(urls) == 1 else {"images": captions})
+        payload = json.dumps({
+            "id": "mock", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def reset_stats():
+    MockGroqHandler.stats = {"requests": 0, "connections": set(), "images": 0, "mimes": set()}
+
+def run_mode(label: str, base_url: str, images_per_request: int, pooled: bool) -> dict:
+    reset_stats()
+    config = CaptioningConfig(provider="groq", images_per_request=images_per_request, base_url=base_url)
+    service = CaptioningService(config)
+    captions = 0
+    start_time = time.perf_counter()
+    for first_page in range(0, PAGES, PAGES_PER_TASK):
+        pages = range(first_page, min(first_page + PAGES_PER_TASK, PAGES))
+        images = [SAMPLE_IMAGES[(page + i) % len(SAMPLE_IMAGES)] for page in pages for i in range(IMAGES_PER_PAGE)]
+        if pooled:
+            # Images of a whole page range are captioned together, as in the PDF extraction workers
+            captions += sum(c is not None for c in service.caption_many(images))
+        else:
+            # Previous behaviour: a fresh client (and connection) for every image
+            for image in images:
+                fresh = CaptioningService(config)
+                captions += fresh.caption_one(image) is not None
+                fresh.close()
+    elapsed = time.perf_counter() - start_time
+    service.close()
+    stats = MockGroqHandler.stats
+    return {
+        "label": label,
+        "seconds": elapsed,
+        "requests": stats["requests"],
+        "connections": len(stats["connections"]),
+        "captions": captions,
+        "mimes": sorted(stats["mimes"]),
+    }
+
+def run_benchmark():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockGroqHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    console.print(
+        f"[bold cyan]🚀 Captioning {PAGES * IMAGES_PER_PAGE} images ({PAGES} pages x {IMAGES_PER_PAGE}, {PAGES_PER_TASK} pages per task) "
+        f"against a mock server ({BASE_LATENCY_S * 1000:.0f} ms + {PER_IMAGE_LATENCY_S * 1000:.0f} ms/image)[/bold cyan]\n"
+    )
+
+    modes = [
+        run_mode("new client per image", base_url, 1, pooled=False),
+        run_mode("pooled, 1 image/request", base_url, 1, pooled=True),
+        run_mode("pooled, 3 images/request", base_url, 3, pooled=True),
+        run_mode("pooled, 5 images/request", base_url, 5, pooled=True),
+    ]
+    server.shutdown()
+
+    table = Table(title="Captioning round trips")
+    table.add_column("Mode", style="bold magenta")
+    table.add_column("Requests", justify="right")
+    table.add_column("TCP connections", justify="right")
+    table.add_column("Captions", justify="right")
+    table.add_column("Wall time (s)", justify="right")
+    table.add_column("Images/s", justify="right")
+    for m in modes:
+        table.add_row(
+            m["label"], str(m["requests"]), str(m["connections"]), str(m["captions"]),
+            f"{m['seconds']:.2f}", f"{m['captions'] / m['seconds']:.1f}"
+        )
+    console.print(table)
+    console.print(f"[dim]MIME types sent: {', '.join(modes[-1]['mimes'])}[/dim]")
+
+if __name__ == "__main__":
+    run_benchmark()
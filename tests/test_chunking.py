@@ -1,21 +1,31 @@
 import os
+import sys
+import time
+import random
 import shutil
+import tempfile
 import chromadb
+import numpy as np
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings, Document, StorageContext
-from llama_index.core.node_parser import SemanticSplitterNodeParser
+from llama_index.core.node_parser import SemanticSplitterNodeParser, SentenceSplitter
+from llama_index.core.schema import MetadataMode
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.cerebras import Cerebras
 from dotenv import load_dotenv
 from src.config import settings
+from src.chunking import StructuralSplitter, split_sentences
+from src.doc_parser import clean_text, get_loader
 
 load_dotenv()
 
 CEREBRAS_API_KEY = os.getenv("CEREBRAS_API_KEY")
-if not CEREBRAS_API_KEY:
-    raise ValueError("CEREBRAS_API_KEY environment variable is not set.")
 
-Settings.llm = Cerebras(model="gpt-oss-120b", api_key=CEREBRAS_API_KEY)
+COMPARE_DOCS = 30
+SECTIONS_PER_DOC = 8
+TOP_K = 5
+SEED = 11
+
 embed_model = HuggingFaceEmbedding(model_name="Snowflake/snowflake-arctic-embed-m-v2.0", trust_remote_code=True)
 
 def get_document_from_pdf(path_to_pdf: str) -> Document:
@@ -58,6 +68,9 @@ def get_documents(path: str):
     return nodes
 
 def test(qeury_text: str = "What did the author do growing up?"):
+    if not CEREBRAS_API_KEY:
+        raise ValueError("CEREBRAS_API_KEY environment variable is not set.")
+    Settings.llm = Cerebras(model="gpt-oss-120b", api_key=CEREBRAS_API_KEY)
     chroma_client = chromadb.EphemeralClient()
     chroma_collection = chroma_client.create_collection("quickstart")
 
@@ -88,5 +101,87 @@ def test(qeury_text: str = "What did the author do growing up?"):
         print("-" * 30)
 
 
+SUBJECTS = [
+    "payroll", "server backups", "customer refunds", "vacation policy", "network security", "office relocation",
+    "supplier contracts", "quality audits", "fire safety", "solar panels", "onboarding", "travel expenses",
+]
+
+def comparison_corpus(folder: str) -> tuple[list[Document], list[tuple[str, str]]]:
+    """Half the files are Markdown with headings, half plain text; every section holds one fact to retrieve.
+
+    The files are written to `folder` and read back through the ingestion
+    loaders, so the splitters see the cleaned text real ingestion produces.
+    Facts are returned cleaned the same way, to find them in chunks.
+    """
+    rng = random.Random(SEED)
+    documents, queries = [], []
+    for d in range(COMPARE_DOCS):
+        structured = d % 2 == 0
+        sections = []
+        for subject in rng.sample(SUBJECTS, SECTIONS_PER_DOC):
+            code = f"{rng.choice(['Atlas', 'Borealis', 'Cobalt', 'Delta'])}-{d}{rng.randint(10, 99)}"
+            fact = f"The {subject} budget for project {code} is {rng.randint(10, 900)} thousand euros."
+            body = " ".join([
+                f"This part covers {subject} for project {code}.",
+                f"The {subject} work is coordinated from the {rng.choice(['Berlin', 'Oslo', 'Lisbon'])} office.",
+                fact,
+                f"Changes to the {subject} process are reviewed every quarter.",
+            ])
+            sections.append(f"## {subject.title()} ({code})\n\n{body}" if structured else body)
+            queries.append((f"What is the {subject} budget for project {code}?", clean_text(fact)))
+        path = os.path.join(folder, f"doc_{d}.{'md' if structured else 'txt'}")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(sections))
+        documents.extend(get_loader(path).load(path))
+    return documents, queries
+
+def compare_strategies():
+    """Chunking throughput against retrieval quality (hit@k, MRR) for each splitter, on one retrieval model."""
+    folder = tempfile.mkdtemp(prefix="compare_chunking_")
+    try:
+        documents, queries = comparison_corpus(folder)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    # As in split_documents, only the structural splitter gets the text with its lines and headings
+    flat_documents = [Document(text=clean_text(d.text), metadata=d.metadata) for d in documents]
+    chunker_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L12-v2")
+    parsers = [
+        ("semantic (MiniLM)", flat_documents, SemanticSplitterNodeParser(
+            buffer_size=1, breakpoint_percentile_threshold=70, sentence_splitter=split_sentences, embed_model=chunker_model
+        )),
+        ("structural", documents, StructuralSplitter(chunk_tokens=settings.chunking.chunk_tokens, sentence_overlap=settings.chunking.sentence_overlap)),
+        ("sentence (512 tok)", flat_documents, SentenceSplitter(chunk_size=512, chunk_overlap=32)),
+    ]
+    query_vectors = np.array([embed_model.get_query_embedding(q) for q, _ in queries], dtype=np.float32)
+    total_chars = sum(len(d.text) for d in documents)
+
+    print(f"\n🚀 CHUNKING STRATEGY COMPARISON")
+    print(f"Documents: {COMPARE_DOCS} ({total_chars / 1000:.0f}k chars) | Queries: {len(queries)} | Top-k: {TOP_K}")
+    print("-" * 96)
+    print(f"{'Strategy':<20} | {'Chunk (s)':<9} | {'Chars/Sec':<10} | {'Chunks':<6} | {'Avg chars':<9} | {f'Hit@{TOP_K}':<6} | {'MRR':<5}")
+    print("-" * 96)
+    for name, parser_documents, parser in parsers:
+        start_t = time.perf_counter()
+        nodes = parser.get_nodes_from_documents(parser_documents)
+        chunk_s = time.perf_counter() - start_t
+
+        matrix = np.array(embed_model.get_text_embedding_batch(
+            [n.get_content(metadata_mode=MetadataMode.EMBED) for n in nodes]
+        ), dtype=np.float32)
+        scores = query_vectors @ matrix.T
+        hits, reciprocal_ranks = 0, []
+        for (_, fact), row in zip(queries, scores):
+            ranked = np.argsort(-row)[:TOP_K]
+            rank = next((r for r, i in enumerate(ranked, 1) if fact in nodes[i].get_content()), None)
+            hits += rank is not None
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+        avg_chars = np.mean([len(n.get_content()) for n in nodes])
+        print(f"{name:<20} | {chunk_s:9.2f} | {total_chars / chunk_s:10.0f} | {len(nodes):<6} | {avg_chars:9.0f} | {hits / len(queries):6.1%} | {np.mean(reciprocal_ranks):.3f}")
+    print("-" * 96)
+
+
 if __name__ == "__main__":
-    test("The planet Mars")
+    if sys.argv[1:] == ["compare"]:
+        compare_strategies()
+    else:
+        test("The planet Mars")
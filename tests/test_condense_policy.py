@@ -0,0 +1,119 @@
+import time
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import TextNode
+from llama_index.core.memory import ChatMemoryBuffer
+from src.benchmark import HashEmbedding, StubLLM
+from src.chat_engine import RAGChatEngine
+from src.condense import CondensePolicy
+from src.config import CondenseConfig
+from src.metrics import QueryTrace
+
+CONDENSE_LATENCY_S = 0.4
+TOP_K = 3
+
+# (user turn, reference standalone question)
+CONVERSATIONS = [
+    [
+        ("How do I reset my corporate password?", "How do I reset my corporate password?"),
+        ("Do I need my 2FA token for it?", "Do I need my 2FA token to reset my corporate password?"),
+        ("What if I am locked out?", "What if I am locked out of my corporate account?"),
+    ],
+    [
+        ("What was the total revenue in Q3 2024?", "What was the total revenue in Q3 2024?"),
+        ("And in Q4?", "What was the total revenue in Q4 2024?"),
+        ("Which region grew the fastest in Q4 2024?", "Which region grew the fastest in Q4 2024?"),
+    ],
+    [
+        ("Summarize the vacation policy for new employees.", "Summarize the vacation policy for new employees."),
+        ("How many days does it allow?", "How many vacation days does the policy allow new employees?"),
+        ("Can unused vacation days roll over to next year?", "Can unused vacation days roll over to next year?"),
+        ("Tell me more", "Tell me more about rolling over unused vacation days."),
+    ],
+    [
+        ("Which database does the backup service use?", "Which database does the backup service use?"),
+        ("How often are database backups taken by the backup service?", "How often are database backups taken by the backup service?"),
+        ("Where are they stored?", "Where are the database backups stored?"),
+    ],
+]
+
+CORPUS = [
+    "To reset your corporate password visit the identity portal and click forgot password.",
+    "A 2FA token is required to reset a corporate password through the portal.",
+    "Locked out accounts are unlocked by the HelpDesk after identity verification.",
+    "Total revenue in Q3 2024 was 12 million dollars.",
+    "Total revenue in Q4 2024 was 15 million dollars driven by the EMEA region.",
+    "EMEA was the fastest growing region in Q4 2024.",
+    "New employees receive 20 vacation days under the vacation policy.",
+    "Unused vacation days can roll over to next year up to a limit of five days.",
+    "The backup service stores snapshots in PostgreSQL and takes database backups every six hours.",
+    "Database backups are stored in an offsite object storage bucket.",
+]
+
+POLICIES = [
+    ("always / remote", CondenseConfig(policy="always", rewriter="remote")),
+    ("auto / remote", CondenseConfig(policy="auto", rewriter="remote")),
+    ("auto / rules", CondenseConfig(policy="auto", rewriter="rules")),
+    ("never", CondenseConfig(policy="never")),
+]
+
+console = Console()
+
+def run_policy(config: CondenseConfig, index: VectorStoreIndex, embed_model) -> dict:
+    rewrites = {turn: reference for conversation in CONVERSATIONS for turn, reference in conversation}
+    llm = StubLLM(latency_s=CONDENSE_LATENCY_S, rewrites=rewrites)
+    retriever = index.as_retriever(similarity_top_k=TOP_K)
+    policy = CondensePolicy(config)
+    condense_times, overlaps, turns = [], [], 0
+
+    for conversation in CONVERSATIONS:
+        memory = ChatMemoryBuffer.from_defaults(token_limit=4000)
+        for turn, reference in conversation:
+            trace = QueryTrace(turn)
+            engine = RAGChatEngine.create(
+                retriever=retriever, llm=llm, memory=memory, embed_model=embed_model,
+                trace=trace, condense_policy=policy
+            )
+            engine.chat(turn)
+            condense_times.append(trace.spans.get("condense", 0.0))
+
+            got = {n.node.node_id for n in retriever.retrieve(engine.last_query)}
+            expected = {n.node.node_id for n in retriever.retrieve(reference)}
+            overlaps.append(len(got & expected) / len(expected))
+            turns += 1
+
+    return {
+        "turns": turns,
+        "condense_calls": llm.condense_calls,
+        "condense_ms_mean": float(np.mean(condense_times)) * 1000,
+        "condense_ms_p95": float(np.percentile(condense_times, 95)) * 1000,
+        "overlap": float(np.mean(overlaps)),
+    }
+
+def run_benchmark():
+    console.print(f"[bold cyan]🚀 Condense policy replay ({sum(map(len, CONVERSATIONS))} turns, stub condense latency {CONDENSE_LATENCY_S}s)[/bold cyan]\n")
+    embed_model = HashEmbedding()
+    index = VectorStoreIndex([TextNode(text=t) for t in CORPUS], embed_model=embed_model)
+
+    table = Table(title="Condense policies")
+    table.add_column("Policy", style="bold magenta")
+    table.add_column("LLM condense calls", justify="right")
+    table.add_column("Condense mean (ms)", justify="right")
+    table.add_column("Condense p95 (ms)", justify="right")
+    table.add_column(f"Retrieval overlap@{TOP_K} vs reference", justify="right")
+
+    for label, config in POLICIES:
+        start_time = time.perf_counter()
+        result = run_policy(config, index, embed_model)
+        console.print(f"[dim]{label}: replay took {time.perf_counter() - start_time:.1f}s[/dim]")
+        table.add_row(
+            label, f"{result['condense_calls']}/{result['turns']}",
+            f"{result['condense_ms_mean']:.1f}", f"{result['condense_ms_p95']:.1f}", f"{result['overlap']:.2f}"
+        )
+
+    console.print(table)
+
+if __name__ == "__main__":
+    run_benchmark()
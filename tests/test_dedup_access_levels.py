@@ -0,0 +1,117 @@
+import os
+import tempfile
+from llama_index.core.schema import TextNode
+from src.config import DedupConfig
+from src.dedup import ChunkDeduplicator, split_sources
+
+TEXT = (
+    "Salary bands for the engineering department are reviewed every March by the compensation committee, "
+    "and changes take effect on the first payroll run of April for all permanent employees."
+)
+
+
+class RecordingBackend:
+    """Collects the metadata patches the deduplicator would write to the vector store."""
+
+    def __init__(self):
+        self.metadata = {}
+
+    def update_metadata(self, updates: dict[str, dict]):
+        for node_id, patch in updates.items():
+            self.metadata.setdefault(node_id, {}).update(patch)
+
+
+def make_node(node_id: str, file_name: str, access_level: str) -> TextNode:
+    return TextNode(text=TEXT, id_=node_id, metadata={"file_name": file_name, "access_level": access_level})
+
+
+def ingest(dedup: ChunkDeduplicator, backend: RecordingBackend, node: TextNode):
+    plan = dedup.plan([node])
+    dedup.commit(plan, backend)
+    return plan
+
+
+def shared_pair(tmp: str) -> tuple[ChunkDeduplicator, RecordingBackend]:
+    """a.txt owns the chunk, b.txt holds a duplicate of it; both private."""
+    dedup = ChunkDeduplicator(os.path.join(tmp, "dedup.sqlite3"), DedupConfig())
+    backend = RecordingBackend()
+    ingest(dedup, backend, make_node("a-0", "a.txt", "private"))
+    plan = ingest(dedup, backend, make_node("b-0", "b.txt", "private"))
+    assert plan.duplicates == 1 and "a-0" in plan.shared
+    assert split_sources(backend.metadata["a-0"]["source_files"]) == ["a.txt", "b.txt"]
+    return dedup, backend
+
+
+def test_source_made_public_is_detached():
+    with tempfile.TemporaryDirectory() as tmp:
+        dedup, backend = shared_pair(tmp)
+        detached = dedup.sync_access_levels({"a.txt": "private", "b.txt": "public"}, backend)
+        assert detached == {"b.txt"}
+        assert split_sources(backend.metadata["a-0"]["source_files"]) == ["a.txt"]
+        assert dedup.shared_ids(["b.txt"]) == set()
+        # Re-indexed at its new level, b.txt gets its own chunk instead of merging into the private one
+        plan = dedup.plan([make_node("b-1", "b.txt", "public")])
+        assert [n.node_id for n in plan.kept] == ["b-1"] and not plan.shared
+
+
+def test_owner_made_public_detaches_private_sources():
+    with tempfile.TemporaryDirectory() as tmp:
+        dedup, backend = shared_pair(tmp)
+        detached = dedup.sync_access_levels({"a.txt": "public", "b.txt": "private"}, backend)
+        # The chunk follows its owner to public; b.txt must not be served from it
+        assert detached == {"b.txt"}
+        assert split_sources(backend.metadata["a-0"]["source_files"]) == ["a.txt"]
+        assert not dedup.plan([make_node("b-1", "b.txt", "private")]).shared
+
+
+def test_unchanged_levels_keep_sharing():
+    with tempfile.TemporaryDirectory() as tmp:
+        dedup, backend = shared_pair(tmp)
+        assert dedup.sync_access_levels({"a.txt": "private", "b.txt": "private"}, backend) == set()
+        assert dedup.shared_ids(["b.txt"]) == {"a-0"}
+
+
+def test_removed_owner_is_not_replaced_by_other_level():
+    with tempfile.TemporaryDirectory() as tmp:
+        dedup, backend = shared_pair(tmp)
+        # b.txt was re-classified but levels were not synced yet when a.txt is removed
+        detached = dedup.remove_file("a.txt", backend, {"a.txt": "private", "b.txt": "public"})
+        assert detached == {"b.txt"}
+        assert "file_name" not in backend.metadata["a-0"]
+        assert dedup.shared_ids(["b.txt"]) == set()
+
+
+def test_removed_owner_hands_over_within_level():
+    with tempfile.TemporaryDirectory() as tmp:
+        dedup, backend = shared_pair(tmp)
+        detached = dedup.remove_file("a.txt", backend, {"a.txt": "private", "b.txt": "private"})
+        assert detached == set()
+        assert backend.metadata["a-0"]["file_name"] == "b.txt"
+
+
+def test_revisions_differing_in_a_number_are_not_merged():
+    with tempfile.TemporaryDirectory() as tmp:
+        dedup = ChunkDeduplicator(os.path.join(tmp, "dedup.sqlite3"), DedupConfig())
+        backend = RecordingBackend()
+        # Long enough that one changed figure keeps the shingle similarity above the default threshold
+        report = " ".join(
+            f"The {topic} policy is reviewed by the {topic} committee and approved by the board each spring."
+            for topic in ["payroll", "backup", "refund", "vacation", "network", "supplier", "audit", "safety", "travel", "hiring"]
+        )
+        old = TextNode(text=f"{report} The travel budget is 120 thousand euros.", id_="v1-0", metadata={"file_name": "v1.txt", "access_level": "private"})
+        new = TextNode(text=f"{report} The travel budget is 125 thousand euros.", id_="v2-0", metadata={"file_name": "v2.txt", "access_level": "private"})
+        assert dedup.similarity(dedup.signature(old.text), dedup.signature(new.text)) >= DedupConfig().threshold
+
+        plan = dedup.plan([old, new])
+        assert plan.duplicates == 0 and len(plan.kept) == 2
+        ingest(dedup, backend, old)
+        plan = dedup.plan([new])
+        assert plan.duplicates == 0 and [n.node_id for n in plan.kept] == ["v2-0"]
+
+
+if __name__ == "__main__":
+    checks = [value for name, value in list(globals().items()) if name.startswith("test_")]
+    for check in checks:
+        check()
+        print(f"✅ {check.__name__}")
+    print(f"\n🎉 {len(checks)} dedup checks passed")
@@ -0,0 +1,108 @@
+import os
+import time
+import uuid
+import shutil
+import numpy as np
+import chromadb
+from src.flat_index import FlatIndex
+
+VECTOR_DIM = 768
+DATASET_SIZES = [1_000, 10_000, 50_000, 100_000, 250_000]
+FILE_COUNT = 200
+TOP_K = 5
+QUERY_COUNT = 20
+TEMP_DIR = "./bench_flat_temp"
+
+def generate_vectors(count, dim):
+    vectors = np.random.rand(count, dim).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / norms
+
+def generate_metadatas(count):
+    return [
+        {"file_name": f"file_{i % FILE_COUNT}.pdf", "access_level": "private" if i % 2 else "public"}
+        for i in range(count)
+    ]
+
+def time_queries(fn, queries):
+    fn(queries[0])
+    start_time = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start_time) / len(queries)
+
+def run_benchmark():
+    print(f"🚀 FLAT vs HNSW CROSSOVER (Dim={VECTOR_DIM}, Top_K={TOP_K}, Files={FILE_COUNT})")
+    print("-" * 100)
+    print(f"{'Items':<8} | {'Filter':<12} | {'Subset':<8} | {'Flat f32 (ms)':<14} | {'Flat f16 (ms)':<14} | {'Chroma (ms)':<12} | {'Recall HNSW':<11}")
+    print("-" * 100)
+
+    chroma_client = chromadb.EphemeralClient()
+    crossovers = {}
+
+    for size in DATASET_SIZES:
+        vectors = generate_vectors(size, VECTOR_DIM)
+        metadatas = generate_metadatas(size)
+        ids = [str(uuid.uuid4()) for _ in range(size)]
+        queries = generate_vectors(QUERY_COUNT, VECTOR_DIM)
+
+        flat32 = FlatIndex(os.path.join(TEMP_DIR, f"f32_{size}"), dtype="float32")
+        flat32.write(ids, vectors, metadatas)
+        flat16 = FlatIndex(os.path.join(TEMP_DIR, f"f16_{size}"), dtype="float16")
+        flat16.write(ids, vectors, metadatas)
+
+        collection_name = f"bench_{size}"
+        try:
+            chroma_client.delete_collection(collection_name)
+        except Exception:
+            pass
+        collection = chroma_client.create_collection(name=collection_name, metadata={"hnsw:space": "cosine"})
+        batch_size = 5000
+        for i in range(0, size, batch_size):
+            collection.add(
+                embeddings=vectors[i:i + batch_size].tolist(),
+                metadatas=metadatas[i:i + batch_size],
+                ids=ids[i:i + batch_size]
+            )
+
+        scenarios = [
+            ("access", "private", None, {"access_level": "private"}),
+            ("access+file", "private", ["file_1.pdf"], {"$and": [
+                {"access_level": "private"}, {"file_name": {"$in": ["file_1.pdf"]}}
+            ]}),
+        ]
+
+        for label, access_level, file_names, where in scenarios:
+            # File filters reach the flat index as chunk id sets, as src.file_catalog resolves them
+            file_ids = {ids[i] for i, m in enumerate(metadatas) if m["file_name"] in file_names} if file_names else None
+            subset = flat32.subset_size(access_level, file_ids)
+            t32 = time_queries(lambda q: flat32.search(q, TOP_K, access_level, file_ids), queries)
+            t16 = time_queries(lambda q: flat16.search(q, TOP_K, access_level, file_ids), queries)
+            t_hnsw = time_queries(
+                lambda q: collection.query(query_embeddings=[q.tolist()], n_results=TOP_K, where=where),
+                queries
+            )
+
+            hits = 0
+            for q in queries:
+                exact, _ = flat32.search(q, TOP_K, access_level, file_ids)
+                approx = collection.query(query_embeddings=[q.tolist()], n_results=TOP_K, where=where)["ids"][0]
+                hits += len(set(exact) & set(approx))
+            recall = hits / (len(queries) * TOP_K)
+
+            if t16 > t_hnsw and label not in crossovers:
+                crossovers[label] = size
+            print(f"{size:<8} | {label:<12} | {subset:<8} | {t32*1000:<14.3f} | {t16*1000:<14.3f} | {t_hnsw*1000:<12.3f} | {recall:<11.3f}")
+
+    print("-" * 100)
+    for label, _, _, _ in scenarios:
+        size = crossovers.get(label)
+        if size:
+            print(f"⚖️  {label}: HNSW overtakes flat float16 search at ~{size} items")
+        else:
+            print(f"⚖️  {label}: flat float16 search stayed faster up to {DATASET_SIZES[-1]} items")
+
+    shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,151 @@
+import json
+import time
+import random
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from rich.console import Console
+from rich.table import Table
+from llama_index.core.llms import ChatMessage, MessageRole
+from src.config import LLMRouterConfig
+from src.llm_router import LLMRouter, create_provider_llm
+
+REQUESTS = 100
+SEED = 5
+# Primary: fast, but one request in ten hits a slow tail; secondary: a little slower, no tail
+PRIMARY_LATENCY_S = (0.04, 0.06)
+PRIMARY_TAIL_S = 1.5
+PRIMARY_TAIL_RATE = 0.1
+SECONDARY_LATENCY_S = (0.07, 0.09)
+# Requests answered with 429 (Retry-After: 1) in the rate-limit scenario
+THROTTLED = range(20, 45)
+
+console = Console()
+
+ROUTER_CONFIG = LLMRouterConfig(
+    enabled=True, hedge_percentile=90.0, hedge_initial_ms=300.0, hedge_min_ms=100.0, min_samples=10,
+    error_cooldown_s=1.0, rate_limit_cooldown_s=1.0, timeout_s=10.0
+)
+
+def make_handler(name: str, latency_s: tuple[float, float], tail_s: float = 0.0, tail_rate: float = 0.0):
+    """OpenAI-compatible chat completions stub with injected delays and switchable 429s."""
+    rng = random.Random(f"{SEED}-{name}")
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        lock = threading.Lock()
+        stats = {"requests": 0, "answered": 0, "throttled": 0}
+        throttle = False
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with self.lock:
+                self.stats["requests"] += 1
+                delay = tail_s if rng.random() < tail_rate else rng.uniform(*latency_s)
+            if StubHandler.throttle:
+                with self.lock:
+                    self.stats["throttled"] += 1
+                self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}}, {"Retry-After": "1"})
+                return
+            time.sleep(delay)
+            payload = {
+                "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": f"answer from {name}"}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 3, "total_tokens": 4},
+            }
+            try:
+                self._send(200, payload)
+                with self.lock:
+                    self.stats["answered"] += 1
+            except (BrokenPipeError, ConnectionResetError):
+                # The router cancelled this request after the other provider answered
+                pass
+
+        def _send(self, status: int, payload: dict, headers: dict | None = None):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return StubHandler
+
+def start_server(handler) -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def run_scenario(label: str, llm, primary, secondary, throttle: bool = False) -> dict:
+    for handler in (primary, secondary):
+        handler.stats = {"requests": 0, "answered": 0, "throttled": 0}
+    samples, errors, winners = [], 0, {}
+    messages = [ChatMessage(role=MessageRole.USER, content="What is the refund policy?")]
+    for i in range(REQUESTS):
+        primary.throttle = throttle and i in THROTTLED
+        start_t = time.perf_counter()
+        try:
+            response = llm.chat(messages)
+            winner = str(response.message.content).rsplit(" ", 1)[-1]
+            winners[winner] = winners.get(winner, 0) + 1
+        except Exception:
+            errors += 1
+        samples.append(time.perf_counter() - start_t)
+    primary.throttle = False
+    stats = llm.stats() if isinstance(llm, LLMRouter) else {"hedges": 0, "failovers": 0, "providers": {}}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+    return {
+        "label": label, "p50": p50, "p95": p95, "p99": p99, "errors": errors, "winners": winners,
+        "hedges": stats["hedges"], "failovers": stats["failovers"],
+        "cancelled": sum(p["cancelled"] for p in stats["providers"].values()),
+    }
+
+def run_benchmark():
+    primary = make_handler("primary", PRIMARY_LATENCY_S, PRIMARY_TAIL_S, PRIMARY_TAIL_RATE)
+    secondary = make_handler("secondary", SECONDARY_LATENCY_S)
+    primary_server, primary_url = start_server(primary)
+    secondary_server, secondary_url = start_server(secondary)
+    console.print(
+        f"[bold cyan]🚀 {REQUESTS} chat requests against stub providers: primary {PRIMARY_LATENCY_S[0] * 1000:.0f}-{PRIMARY_LATENCY_S[1] * 1000:.0f} ms "
+        f"({PRIMARY_TAIL_RATE:.0%} at {PRIMARY_TAIL_S * 1000:.0f} ms), secondary {SECONDARY_LATENCY_S[0] * 1000:.0f}-{SECONDARY_LATENCY_S[1] * 1000:.0f} ms[/bold cyan]\n"
+    )
+
+    def single():
+        return create_provider_llm("cerebras", "stub-model", "stub", primary_url, timeout_s=10.0, max_retries=0)
+
+    def router(hedge: bool):
+        return LLMRouter([
+            ("cerebras", create_provider_llm("cerebras", "stub-model", "stub", primary_url, timeout_s=10.0, max_retries=0)),
+            ("groq", create_provider_llm("groq", "stub-model", "stub", secondary_url, timeout_s=10.0, max_retries=0)),
+        ], ROUTER_CONFIG.model_copy(update={"hedge": hedge}))
+
+    scenarios = [
+        run_scenario("primary only", single(), primary, secondary),
+        run_scenario("router, failover only", router(hedge=False), primary, secondary),
+        run_scenario("router, hedged", router(hedge=True), primary, secondary),
+        run_scenario(f"primary only, {len(THROTTLED)} x 429", single(), primary, secondary, throttle=True),
+        run_scenario(f"router, hedged, {len(THROTTLED)} x 429", router(hedge=True), primary, secondary, throttle=True),
+    ]
+    primary_server.shutdown()
+    secondary_server.shutdown()
+
+    table = Table(title="LLM request latency")
+    table.add_column("Scenario", style="bold magenta")
+    for column in ("p50 (ms)", "p95 (ms)", "p99 (ms)", "Errors", "Hedges", "Failovers", "Cancelled", "Answered by"):
+        table.add_column(column, justify="right")
+    for s in scenarios:
+        table.add_row(
+            s["label"], f"{s['p50']:.0f}", f"{s['p95']:.0f}", f"{s['p99']:.0f}", str(s["errors"]),
+            str(s["hedges"]), str(s["failovers"]), str(s["cancelled"]),
+            ", ".join(f"{k} {v}" for k, v in sorted(s["winners"].items()))
+        )
+    console.print(table)
+    console.print("[dim]Cancelled = in-flight requests the router dropped after the other provider answered first.[/dim]")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,133 @@
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import numpy as np
+from llama_index.core import Document
+from llama_index.core.node_parser import SemanticSplitterNodeParser
+from llama_index.core.schema import MetadataMode
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from src.chunking import CHUNKING_MODEL_NAME, ReusingSemanticSplitter, split_sentences
+from src.profiling import current_rss_mb, peak_rss_mb
+
+RETRIEVAL_MODEL_NAME = "Snowflake/snowflake-arctic-embed-m-v2.0"
+NUM_DOCS = 40
+SECTIONS_PER_DOC = 8
+TOP_K = 5
+SEED = 7
+
+# two_model: MiniLM splits, arctic embeds the chunks (current default)
+# single_recompute: arctic splits and embeds the chunks again
+# single_pooled: arctic splits, chunks keep the pooled sentence-group embeddings
+SETUPS = ["two_model", "single_recompute", "single_pooled"]
+
+SUBJECTS = [
+    "payroll", "server backups", "customer refunds", "vacation policy", "network security", "office relocation",
+    "supplier contracts", "quality audits", "fire safety", "solar panels", "onboarding", "travel expenses",
+    "data retention", "warehouse inventory", "press relations", "laptop procurement",
+]
+CITIES = ["Berlin", "Lisbon", "Oslo", "Madrid", "Warsaw", "Dublin", "Prague", "Vienna"]
+PEOPLE = ["Anna Keller", "Marco Rossi", "Ivan Petrov", "Sara Lind", "Omar Haddad", "Lena Novak", "Tom Reid"]
+
+
+def build_corpus() -> tuple[list[Document], list[tuple[str, str]]]:
+    """Documents made of topical sections; every section carries one fact with a matching question."""
+    rng = random.Random(SEED)
+    documents, queries = [], []
+    for d in range(NUM_DOCS):
+        sections = []
+        for subject in rng.sample(SUBJECTS, SECTIONS_PER_DOC):
+            code = f"{rng.choice(['Atlas', 'Borealis', 'Cobalt', 'Delta', 'Ember', 'Falcon'])}-{d}{rng.randint(10, 99)}"
+            city, person, amount = rng.choice(CITIES), rng.choice(PEOPLE), rng.randint(10, 900)
+            fact = f"The {subject} budget for project {code} is {amount} thousand euros."
+            sentences = [
+                f"This section describes {subject} for project {code}.",
+                f"The {subject} work is coordinated from the {city} office.",
+                fact,
+                f"Questions about {subject} go to {person}.",
+                f"Changes to the {subject} process are reviewed every quarter.",
+            ]
+            sections.append(" ".join(sentences))
+            queries.append((f"What is the {subject} budget for project {code}?", fact))
+        documents.append(Document(text=" ".join(sections), metadata={"file_name": f"doc_{d}.txt"}))
+    return documents, queries
+
+
+def run_setup(setup: str) -> dict:
+    start_t = time.perf_counter()
+    retrieval_model = HuggingFaceEmbedding(
+        model_name=RETRIEVAL_MODEL_NAME, trust_remote_code=True, model_kwargs={"attn_implementation": "sdpa"}
+    )
+    chunking_model = HuggingFaceEmbedding(model_name=CHUNKING_MODEL_NAME) if setup == "two_model" else retrieval_model
+    load_s = time.perf_counter() - start_t
+
+    documents, queries = build_corpus()
+    parser_class = ReusingSemanticSplitter if setup == "single_pooled" else SemanticSplitterNodeParser
+    parser = parser_class(
+        buffer_size=1, breakpoint_percentile_threshold=70, sentence_splitter=split_sentences, embed_model=chunking_model
+    )
+    start_t = time.perf_counter()
+    nodes = parser.get_nodes_from_documents(documents)
+    pending = [node for node in nodes if node.embedding is None]
+    vectors = retrieval_model.get_text_embedding_batch([n.get_content(metadata_mode=MetadataMode.EMBED) for n in pending])
+    for node, vector in zip(pending, vectors):
+        node.embedding = vector
+    ingest_s = time.perf_counter() - start_t
+
+    matrix = np.array([node.embedding for node in nodes], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    hits, reciprocal_ranks = 0, []
+    for question, fact in queries:
+        query = np.asarray(retrieval_model.get_query_embedding(question), dtype=np.float32)
+        ranked = np.argsort(-(matrix @ query))[:TOP_K]
+        rank = next((r for r, i in enumerate(ranked, 1) if fact in nodes[i].get_content()), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    return {
+        "setup": setup,
+        "load_s": load_s,
+        "ingest_s": ingest_s,
+        "rss_mb": current_rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+        "chunks": len(nodes),
+        "reembedded": len(pending),
+        "avg_chunk_chars": float(np.mean([len(n.get_content()) for n in nodes])),
+        "hit_rate": hits / len(queries),
+        "mrr": float(np.mean(reciprocal_ranks)),
+    }
+
+
+def run_benchmark():
+    print(f"\n🚀 SINGLE-MODEL CHUNKING BENCHMARK")
+    print(f"Documents: {NUM_DOCS} x {SECTIONS_PER_DOC} sections | Queries: {NUM_DOCS * SECTIONS_PER_DOC} | Top-k: {TOP_K}")
+    print("-" * 118)
+    print(f"{'Setup':<18} | {'Load (s)':<8} | {'Ingest (s)':<10} | {'RSS (MB)':<8} | {'Peak (MB)':<9} | {'Chunks':<6} | {'Re-embedded':<11} | {f'Hit@{TOP_K}':<6} | {'MRR':<5}")
+    print("-" * 118)
+    for setup in SETUPS:
+        # A fresh interpreter per setup, so resident memory only counts that setup's models
+        output = subprocess.run(
+            [sys.executable, "-m", "tests.test_single_model_chunking", "--setup", setup],
+            capture_output=True, text=True
+        )
+        if output.returncode != 0:
+            print(f"{setup:<18} | ERROR: {output.stderr.strip().splitlines()[-1] if output.stderr.strip() else output.returncode}")
+            continue
+        r = json.loads(output.stdout.strip().splitlines()[-1])
+        print(
+            f"{r['setup']:<18} | {r['load_s']:8.1f} | {r['ingest_s']:10.1f} | {r['rss_mb']:8.0f} | {r['peak_rss_mb']:9.0f} | "
+            f"{r['chunks']:<6} | {r['reembedded']:<11} | {r['hit_rate']:6.1%} | {r['mrr']:.3f}"
+        )
+    print("-" * 118)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--setup", choices=SETUPS)
+    args = parser.parse_args()
+    if args.setup:
+        print(json.dumps(run_setup(args.setup)))
+    else:
+        run_benchmark()
@@ -0,0 +1,112 @@
+import time
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+from llama_index.core import VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import TextNode
+from llama_index.core.memory import ChatMemoryBuffer
+from src.benchmark import HashEmbedding, StubLLM
+from src.chat_engine import RAGChatEngine
+from src.condense import CondensePolicy
+from src.config import CondenseConfig
+from src.metrics import QueryTrace
+
+CONDENSE_LATENCIES_S = [0.1, 0.3, 0.6]
+RETRIEVAL_LATENCY_S = 0.15
+ANSWER_LATENCY_S = 0.05
+TOP_K = 3
+
+# Follow-ups the stub rewrites (speculation misses) and ones it returns
+# unchanged because they are already standalone (speculation hits)
+CONVERSATION = [
+    "How do I reset my corporate password?",
+    "Do I need my 2FA token for it?",
+    "How do I reset my corporate password without a 2FA token?",
+    "What if I am locked out?",
+    "Where can I find the identity portal for password resets?",
+]
+REWRITES = {
+    "Do I need my 2FA token for it?": "Do I need my 2FA token to reset my corporate password?",
+    "What if I am locked out?": "What if I am locked out of my corporate account?",
+}
+CORPUS = [
+    "To reset your corporate password visit the identity portal and click forgot password.",
+    "A 2FA token is required to reset a corporate password through the portal.",
+    "Locked out accounts are unlocked by the HelpDesk after identity verification.",
+    "The identity portal is available at id.portal.com for all employees.",
+    "Password resets without a 2FA token require a call to the HelpDesk.",
+]
+
+console = Console()
+
+class SlowRetriever(BaseRetriever):
+    def __init__(self, inner: BaseRetriever, latency_s: float):
+        self._inner = inner
+        self._latency_s = latency_s
+        super().__init__()
+
+    def _retrieve(self, query_bundle):
+        time.sleep(self._latency_s)
+        return self._inner.retrieve(query_bundle)
+
+def replay(condense_latency_s: float, speculative: bool, retriever, embed_model) -> dict:
+    llm = StubLLM(latency_s=ANSWER_LATENCY_S, condense_latency_s=condense_latency_s, rewrites=REWRITES)
+    policy = CondensePolicy(CondenseConfig(policy="always", rewriter="remote", speculative=speculative))
+    memory = ChatMemoryBuffer.from_defaults(token_limit=4000)
+    ttfts, hits = [], []
+
+    for i, question in enumerate(CONVERSATION):
+        trace = QueryTrace(question)
+        engine = RAGChatEngine.create(
+            retriever=retriever, llm=llm, memory=memory, embed_model=embed_model,
+            trace=trace, condense_policy=policy
+        )
+        start_time = time.perf_counter()
+        response = engine.stream_chat(question)
+        first_token = None
+        for _ in response.response_gen:
+            if first_token is None:
+                first_token = time.perf_counter() - start_time
+        if i > 0:
+            ttfts.append(first_token)
+            if "speculation_hit" in trace.counters:
+                hits.append(trace.counters["speculation_hit"])
+
+    return {
+        "ttft_ms": float(np.mean(ttfts)) * 1000,
+        "ttft_p95_ms": float(np.percentile(ttfts, 95)) * 1000,
+        "hit_rate": float(np.mean(hits)) if hits else None,
+    }
+
+def run_benchmark():
+    console.print(
+        f"[bold cyan]🚀 Speculative retrieval (retrieval {RETRIEVAL_LATENCY_S}s, "
+        f"{len(CONVERSATION) - 1} follow-up turns)[/bold cyan]\n"
+    )
+    embed_model = HashEmbedding()
+    index = VectorStoreIndex([TextNode(text=t) for t in CORPUS], embed_model=embed_model)
+    retriever = SlowRetriever(index.as_retriever(similarity_top_k=TOP_K), RETRIEVAL_LATENCY_S)
+
+    table = Table(title="Follow-up time to first token")
+    table.add_column("Condense latency", justify="right")
+    table.add_column("Sequential TTFT (ms)", justify="right")
+    table.add_column("Speculative TTFT (ms)", justify="right")
+    table.add_column("Speedup", justify="right")
+    table.add_column("Speculation hit rate", justify="right")
+
+    for latency in CONDENSE_LATENCIES_S:
+        sequential = replay(latency, False, retriever, embed_model)
+        speculative = replay(latency, True, retriever, embed_model)
+        table.add_row(
+            f"{latency * 1000:.0f} ms",
+            f"{sequential['ttft_ms']:.0f} (p95 {sequential['ttft_p95_ms']:.0f})",
+            f"{speculative['ttft_ms']:.0f} (p95 {speculative['ttft_p95_ms']:.0f})",
+            f"{sequential['ttft_ms'] / speculative['ttft_ms']:.2f}x",
+            f"{speculative['hit_rate']:.0%}" if speculative["hit_rate"] is not None else "-"
+        )
+
+    console.print(table)
+
+if __name__ == "__main__":
+    run_benchmark()